@@ -40,9 +40,81 @@ DEFAULT_SERVER_HOST = os.environ.get("DOG_SERVER_HOST", "0.0.0.0")
 DEFAULT_SERVER_PORT = int(os.environ.get("DOG_SERVER_PORT", 7777))
 TICKRATE = int(os.environ.get("DOG_TICKRATE", 60))
 SNAPSHOT_RATE = int(os.environ.get("DOG_SNAPSHOT_RATE", 30))
+SNAPSHOT_RATE_MIN = int(os.environ.get("DOG_SNAPSHOT_RATE_MIN", 10))
+SNAPSHOT_RATE_ADAPT_INTERVAL = 0.5  # Seconds between per-client rate adjustments
+SNAPSHOT_RATE_STEP = 2.0  # Hz added per interval while the link keeps up
+SNAPSHOT_RATE_BACKOFF = 0.7  # Rate multiplier on congestion
+SNAPSHOT_LOSS_THRESHOLD = 0.1
+SNAPSHOT_RTT_INFLATION = 0.1  # Seconds above the best RTT that count as queueing
+MAX_CATCHUP_TICKS = 5
+SNAPSHOT_HISTORY_SIZE = 32
+SNAPSHOT_CODEC = os.environ.get("DOG_SNAPSHOT_CODEC", "binary")
+TRACK_BOUNDS_MIN = (-512.0, -64.0, -512.0)
+TRACK_BOUNDS_MAX = (512.0, 192.0, 512.0)
+VELOCITY_QUANTUM = 0.01
+INTEREST_NEAR_RADIUS = 150.0
+INTEREST_CUTOFF = RENDER_DISTANCE
+INTEREST_FAR_INTERVAL = 3
+MAX_PENDING_INPUTS = 8
+INPUT_BUFFER_DEPTH = 2
+INPUT_REDUNDANCY = 6
+INPUT_SEND_RATE = int(os.environ.get("DOG_INPUT_SEND_RATE", 30))
+LAG_COMPENSATION_WINDOW = 1.0
+CAR_CONTACT_RADIUS = 3.0
 MAX_PLAYERS = 8
-INTERPOLATION_DELAY = 0.1
+MAX_ROOMS = int(os.environ.get("DOG_MAX_ROOMS", 64))
+SERVER_WORKERS = int(os.environ.get("DOG_SERVER_WORKERS", 1))
+ROOM_CLAIM_TIMEOUT = 10.0  # Seconds a new room's worker has to create it before reassignment
+SEND_QUEUE_SIZE = 256
+SEND_HIGH_WATER = 8
+SEND_HIGH_WATER_TIMEOUT = 2.0
+NETWORK_TRANSPORT = os.environ.get("DOG_TRANSPORT", "auto")  # auto, udp or websocket
+UDP_ENABLED = os.environ.get("DOG_UDP", "1") != "0"
+UDP_CONNECT_TIMEOUT = 2.0
+UDP_RECEIVE_QUEUE = 256
+UDP_RELIABLE_WINDOW = 64
+UDP_RESEND_INTERVAL = 0.2
+UDP_MAX_RETRIES = 10
+UDP_KEEPALIVE_INTERVAL = 1.0
+UDP_TIMEOUT = 10.0
+UDP_MAX_PENDING_SESSIONS = int(os.environ.get("DOG_UDP_MAX_PENDING", 64))  # Welcomed, unconfirmed
+UDP_COOKIE_LIFETIME = 5.0  # Seconds a HELLO cookie stays valid (up to twice this)
+METRICS_HOST = os.environ.get("DOG_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("DOG_METRICS_PORT", 9777))  # 0 disables the HTTP endpoint
+METRICS_DUMP_PATH = os.environ.get("DOG_METRICS_DUMP", "")  # JSON dump file, empty disables
+METRICS_DUMP_INTERVAL = float(os.environ.get("DOG_METRICS_DUMP_INTERVAL", 10.0))
+METRICS_LAG_INTERVAL = 0.25
+DETERMINISTIC_SIMULATION = os.environ.get("DOG_DETERMINISTIC", "0") == "1"  # Fixed-point rooms
+REPLAY_DIR = os.environ.get("DOG_REPLAY_DIR", "")  # Deterministic room replays, empty disables
+STATE_HASH_HISTORY = 120  # Ticks of state hashes kept per deterministic room
+SESSION_GRACE_PERIOD = float(os.environ.get("DOG_SESSION_GRACE", 20.0))  # 0 removes at once
+RECONNECT_TIMEOUT = 30.0  # Seconds the client keeps trying to resume
+RECONNECT_BACKOFF_MIN = 0.25
+RECONNECT_BACKOFF_MAX = 4.0
+CLOCK_SYNC_INTERVAL = 1.0  # Seconds between clock pings once synchronized
+CLOCK_SYNC_BURST_INTERVAL = 0.1  # Ping interval until the sample window is full
+CLOCK_SYNC_SAMPLES = 8
+CLOCK_STEP_THRESHOLD = 0.25  # Offset error corrected by a jump instead of slewing
+CLOCK_SLEW_RATE = 0.05  # Max offset correction per second while slewing
+INTERPOLATION_DELAY = 0.1  # Starting delay; clients then adapt it to their link
+INTERPOLATION_DELAY_MIN = 0.01
+INTERPOLATION_DELAY_MAX = 0.5
+INTERPOLATION_DELAY_MARGIN = 0.005  # Added to the measured requirement
+INTERPOLATION_DELAY_WINDOW = 150  # Snapshot arrivals the delay is chosen from
+INTERPOLATION_DELAY_MIN_SAMPLES = 10  # Arrivals needed before adapting
+INTERPOLATION_UNDERRUN_TARGET = 0.01  # Share of snapshots allowed to arrive too late
+INTERPOLATION_UNDERRUN_AVERAGING = 5.0  # Seconds the reported underrun rate averages over
+INTERPOLATION_WARP = 0.05  # Max playback speed change while the delay adapts
+SNAPSHOT_BUFFER_SIZE = 32  # Snapshots kept for interpolation on the client
+EXTRAPOLATION_LIMIT = 0.25  # Max seconds remote cars are dead reckoned past the newest snapshot
+ERROR_SMOOTHING_TIME = 0.1  # Time constant for blending out remote car corrections
+ERROR_SNAP_DISTANCE = 5.0  # Corrections larger than this snap instead of blending
+CLIENT_SNAPSHOT_QUEUE = 8  # Decoded snapshots waiting for the game thread; oldest dropped
 PREDICTION_ENABLED = True
+PREDICTION_HISTORY = 128  # Ticks of inputs and predicted states kept for replay
+PREDICTION_TOLERANCE = 0.05  # Position (m) and velocity (m/s) error accepted without replay
+PREDICTION_YAW_TOLERANCE = 1.0  # Degrees
+PREDICTION_SMOOTHING_TIME = 0.1  # Time constant for blending out local corrections
 
 # Input settings
 DEADZONE = 0.1
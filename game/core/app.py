@@ -21,12 +21,14 @@ class GameApp:
         server_host="127.0.0.1",
         server_port=7777,
         offline_mode=False,
+        room_id="",
     ):
         """Initialize the game application."""
         self.player_name = player_name
         self.server_host = server_host
         self.server_port = server_port
         self.offline_mode = offline_mode
+        self.room_id = room_id
 
         # Initialize Ursina
         self.app = Ursina(
@@ -95,21 +97,25 @@ class GameApp:
         # Create world
         self.world = World(track_name)
 
-        # Create race manager
-        self.race_manager = RaceManager(self.world)
-
         # Create camera
         self.camera_rig = CameraRig(self.world.player_car)
 
-        # Create HUD
-        self.hud = HUD(self.race_manager)
-
         # Connect to server if not offline
         if not self.offline_mode:
             self.network_client = NetworkClient(
-                self.server_host, self.server_port, self.player_name, self.world
+                self.server_host,
+                self.server_port,
+                self.player_name,
+                self.world,
+                room_id=self.room_id,
             )
 
+        # Create race manager
+        self.race_manager = RaceManager(self.world, self.network_client)
+
+        # Create HUD
+        self.hud = HUD(self.race_manager, self.network_client)
+
     def pause_game(self):
         """Pause the game."""
         if self.state == "racing":
@@ -0,0 +1,211 @@
+"""Vectorized vehicle simulation for many cars at once.
+
+Car state lives in a structure-of-arrays ``CarBatch`` and ``BatchPhysics``
+applies the same rules as ``game.core.physics.Physics`` to every row in a
+single NumPy pass.
+"""
+
+import numpy as np
+
+from game import config
+
+
+class CarBatch:
+    """Structure-of-arrays store for car state and per-tick inputs."""
+
+    def __init__(self, capacity=16):
+        """Initialize storage for ``capacity`` cars."""
+        self.capacity = 0
+        self.active = np.zeros(0, dtype=bool)
+        self._free = []
+        self._allocate_arrays(capacity)
+
+    def _allocate_arrays(self, capacity):
+        """Grow every array to ``capacity`` rows, keeping existing data."""
+        old = self.capacity
+        self.capacity = capacity
+
+        def grow(name, shape, dtype, fill=0):
+            array = np.full(shape, fill, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+
+        # State
+        grow("position", (capacity, 3), np.float64)
+        grow("yaw", capacity, np.float64)
+        grow("velocity", (capacity, 3), np.float64)
+        grow("is_drifting", capacity, bool)
+        grow("is_on_ground", capacity, bool, True)
+        grow("boost_active", capacity, bool)
+        grow("active", capacity, bool)
+
+        # Inputs for the next step
+        grow("throttle", capacity, np.float64)
+        grow("steer", capacity, np.float64)
+        grow("brake", capacity, bool)
+        grow("handbrake", capacity, bool)
+        grow("boost", capacity, bool)
+
+        self.position[old:, 1] = 1.0
+        # Hand out low slots first
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._free.sort(reverse=True)
+
+    def __len__(self):
+        """Get number of active cars."""
+        return int(self.active.sum())
+
+    def allocate(self, position=(0, 1, 0), yaw=0.0) -> int:
+        """Claim a slot for a new car and return its index."""
+        if not self._free:
+            self._allocate_arrays(max(1, self.capacity * 2))
+
+        slot = self._free.pop()
+        self.reset_slot(slot)
+        self.position[slot] = position
+        self.yaw[slot] = yaw
+        self.active[slot] = True
+        return slot
+
+    def release(self, slot):
+        """Free a slot so it can be reused."""
+        if not self.active[slot]:
+            return
+        self.reset_slot(slot)
+        self.active[slot] = False
+        self._free.append(slot)
+        self._free.sort(reverse=True)
+
+    def reset_slot(self, slot):
+        """Reset a slot to a stationary car at the origin."""
+        self.position[slot] = (0.0, 1.0, 0.0)
+        self.yaw[slot] = 0.0
+        self.velocity[slot] = 0.0
+        self.is_drifting[slot] = False
+        self.is_on_ground[slot] = True
+        self.boost_active[slot] = False
+        self.set_input(slot, 0.0, 0.0, False, False, False)
+
+    def set_input(self, slot, throttle, steer, brake, handbrake, boost):
+        """Set the inputs a car applies on the next step."""
+        self.throttle[slot] = throttle
+        self.steer[slot] = steer
+        self.brake[slot] = brake
+        self.handbrake[slot] = handbrake
+        self.boost[slot] = boost
+
+    def set_car_input(self, slot, inputs):
+        """Set inputs from a ``CarInput``."""
+        self.set_input(
+            slot, inputs.throttle, inputs.steer, inputs.brake, inputs.handbrake, inputs.boost
+        )
+
+    def get_rotation(self, slot):
+        """Get rotation of a car as Euler angles (pitch, yaw, roll)."""
+        return [0.0, float(self.yaw[slot]), 0.0]
+
+
+class BatchPhysics:
+    """Vectorized equivalent of ``Physics`` operating on a ``CarBatch``."""
+
+    def __init__(self):
+        """Initialize physics properties from config."""
+        self.max_speed = config.MAX_SPEED
+        self.acceleration_force = config.ACCELERATION
+        self.brake_force = config.BRAKE_FORCE
+        self.turn_speed = config.TURN_SPEED
+        self.friction = config.FRICTION
+        self.air_resistance = config.AIR_RESISTANCE
+        self.drift_factor = config.DRIFT_FACTOR
+
+    @staticmethod
+    def forward(yaw):
+        """Get unit forward vectors for an array of yaw angles."""
+        rad = np.radians(yaw)
+        return np.stack([np.sin(rad), np.zeros_like(rad), np.cos(rad)], axis=1)
+
+    @staticmethod
+    def right(yaw):
+        """Get unit right vectors for an array of yaw angles."""
+        rad = np.radians(yaw)
+        return np.stack([np.cos(rad), np.zeros_like(rad), -np.sin(rad)], axis=1)
+
+    def step(self, cars: CarBatch, dt: float):
+        """Apply inputs and integrate one step for every active car.
+
+        Only active rows are gathered and written back, so free capacity
+        costs nothing and released slots stay where they were reset.
+        """
+        rows = np.flatnonzero(cars.active)
+        if rows.size == 0:
+            return
+        vel = cars.velocity[rows]
+        pos = cars.position[rows]
+        yaw = cars.yaw[rows]
+        throttle = cars.throttle[rows]
+        steer = cars.steer[rows]
+        boost = cars.boost[rows]
+
+        # Forward/backward acceleration
+        acc = self.forward(yaw) * (throttle * self.acceleration_force)[:, None]
+
+        # Braking
+        speed = np.linalg.norm(vel, axis=1)
+        braking = cars.brake[rows] & (speed > 0)
+        if braking.any():
+            acc[braking] -= vel[braking] / speed[braking, None] * self.brake_force
+
+        # Steering (only when moving), scaled with velocity
+        turning = (speed > 0.1) & (steer != 0)
+        turn = steer * self.turn_speed * dt * np.minimum(1.0, speed / 10.0)
+        yaw += np.where(turning, turn, 0.0)
+
+        # Handbrake (drifting) reduces lateral velocity
+        drifting = cars.handbrake[rows] & (speed > 5)
+        if drifting.any():
+            lateral = self.right(yaw)
+            lateral_speed = np.einsum("ij,ij->i", vel, lateral)
+            scale = np.where(drifting, lateral_speed * (1 - self.drift_factor) * dt, 0.0)
+            vel -= lateral * scale[:, None]
+
+        # Boost
+        if boost.any():
+            boost_force = config.BOOST_MULTIPLIER * self.acceleration_force
+            acc += self.forward(yaw) * (boost * boost_force)[:, None]
+
+        # Apply gravity
+        on_ground = cars.is_on_ground[rows]
+        vel[:, 1] += np.where(on_ground, 0.0, config.GRAVITY * dt)
+
+        # Apply acceleration
+        vel += acc * dt
+
+        # Apply friction and air resistance
+        damping = np.where(on_ground, self.air_resistance * self.friction, self.air_resistance)
+        vel *= damping[:, None]
+
+        # Clamp speed
+        speed = np.linalg.norm(vel, axis=1)
+        too_fast = speed > self.max_speed
+        if too_fast.any():
+            vel[too_fast] *= (self.max_speed / speed[too_fast])[:, None]
+
+        # Update position
+        pos += vel * dt
+
+        # Ground check (simple)
+        grounded = pos[:, 1] < 1
+        pos[grounded, 1] = 1.0
+        vel[grounded, 1] = 0.0
+
+        cars.velocity[rows] = vel
+        cars.position[rows] = pos
+        cars.yaw[rows] = yaw
+        cars.is_drifting[rows] = drifting
+        cars.boost_active[rows] = boost
+        cars.is_on_ground[rows] = grounded
+
+    def get_speed(self, cars: CarBatch):
+        """Get speed of every car."""
+        return np.linalg.norm(cars.velocity, axis=1)
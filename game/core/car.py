@@ -3,6 +3,7 @@
 from ursina import *
 from game import config
 from game.core.physics import Physics
+from game.core.simulation import CarInput
 from game.utils.input_map import InputMap
 
 
@@ -32,7 +33,11 @@ class Car:
         self.boost_active = False
         self.boost_timer = 0.0
 
+        # Set in online play, where client-side prediction moves the car
+        self.predicted = False
+
         # Input handling (only for local player)
+        self.current_input = CarInput()
         if not is_remote:
             self.input_map = InputMap()
         else:
@@ -69,40 +74,28 @@ class Car:
             return  # Remote cars are updated by network sync
 
         # Get input
-        throttle = 0.0
-        steer = 0.0
-        brake = False
-        handbrake = False
-        boost = False
-
-        if self.input_map:
-            if held_keys["w"] or held_keys["up arrow"]:
-                throttle = 1.0
-            if held_keys["s"] or held_keys["down arrow"]:
-                throttle = -1.0
-                brake = True
-            if held_keys["a"] or held_keys["left arrow"]:
-                steer = -1.0
-            if held_keys["d"] or held_keys["right arrow"]:
-                steer = 1.0
-            if held_keys["space"]:
-                handbrake = True
-            if held_keys["left shift"]:
-                boost = True
-
-            # Reset car
-            if held_keys["r"]:
+        car_input = self.read_input()
+        self.current_input = car_input
+
+        # Reset car and apply physics (offline; online the network client does)
+        if not self.predicted:
+            if self.input_map and held_keys["r"]:
                 self.reset()
 
-        # Apply physics
-        self.physics.apply_input(throttle, steer, brake, handbrake, boost)
-        self.physics.update()
+            self.physics.apply_input(
+                car_input.throttle,
+                car_input.steer,
+                car_input.brake,
+                car_input.handbrake,
+                car_input.boost,
+            )
+            self.physics.update()
 
         # Update speed
         self.speed = self.physics.get_speed()
 
         # Update boost
-        if boost and self.boost_timer <= 0:
+        if car_input.boost and self.boost_timer <= 0:
             self.boost_active = True
             self.boost_timer = config.BOOST_DURATION
 
@@ -114,7 +107,28 @@ class Car:
             self.boost_trail.visible = False
 
         # Update effects
-        self.exhaust.visible = throttle > 0
+        self.exhaust.visible = car_input.throttle > 0
+
+    def read_input(self):
+        """Get the control input currently held on the keyboard."""
+        car_input = CarInput()
+        if not self.input_map:
+            return car_input
+
+        if held_keys["w"] or held_keys["up arrow"]:
+            car_input.throttle = 1.0
+        if held_keys["s"] or held_keys["down arrow"]:
+            car_input.throttle = -1.0
+            car_input.brake = True
+        if held_keys["a"] or held_keys["left arrow"]:
+            car_input.steer = -1.0
+        if held_keys["d"] or held_keys["right arrow"]:
+            car_input.steer = 1.0
+        if held_keys["space"]:
+            car_input.handbrake = True
+        if held_keys["left shift"]:
+            car_input.boost = True
+        return car_input
 
     def reset(self):
         """Reset car to spawn position."""
@@ -146,3 +160,9 @@ class Car:
     def set_velocity(self, velocity):
         """Set car velocity (for network sync)."""
         self.physics.velocity = velocity
+
+    def apply_predicted_state(self, position, yaw, velocity):
+        """Show the state predicted by the network client."""
+        self.entity.position = Vec3(*position)
+        self.entity.rotation_y = yaw
+        self.physics.velocity = Vec3(*velocity)
@@ -2,6 +2,7 @@
 
 from ursina import *
 from game import config
+from game.core import layout
 
 
 class CheckpointSystem:
@@ -18,17 +19,7 @@ class CheckpointSystem:
 
     def create_default_checkpoints(self):
         """Create default checkpoint layout."""
-        # Simple oval with 8 checkpoints
-        checkpoint_positions = [
-            Vec3(0, 1, -15),  # Start/Finish
-            Vec3(20, 1, -15),  # Corner 1
-            Vec3(35, 1, 0),  # Side 1
-            Vec3(20, 1, 15),  # Corner 2
-            Vec3(0, 1, 18),  # Far end
-            Vec3(-20, 1, 15),  # Corner 3
-            Vec3(-35, 1, 0),  # Side 2
-            Vec3(-20, 1, -15),  # Corner 4
-        ]
+        checkpoint_positions = [Vec3(*pos) for pos in layout.CHECKPOINT_POSITIONS]
 
         for i, pos in enumerate(checkpoint_positions):
             checkpoint = Checkpoint(i, pos, config.CHECKPOINT_RADIUS)
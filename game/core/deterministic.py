@@ -0,0 +1,491 @@
+"""Deterministic fixed-point vehicle simulation, state hashes and replays.
+
+``HeadlessPhysics`` and ``BatchPhysics`` use floats, so results depend on
+the platform's math library, NumPy's SIMD paths and the step size. This
+module runs the same rules on integers only:
+
+- Lengths, speeds and inputs are Q16.16 fixed point.
+- Yaw is an integer angle with ``TURN`` units per full turn. Sine and
+  cosine come from a table built with integer arithmetic.
+- Every step is one fixed tick; per-tick constants are derived once from
+  ``config``.
+- The simulation owns a seeded xorshift RNG, so any randomized rule
+  replays identically.
+
+Identical inputs therefore give identical states on every machine. A run
+is summarized by a 64-bit state hash per tick, and a ``Replay`` stores
+only joins, leaves and input changes plus periodic hashes to verify
+against.
+"""
+
+import argparse
+import hashlib
+import math
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import msgpack
+
+from game import config
+from game.core.simulation import CarInput, CarState
+
+FRACTION_BITS = 16
+ONE = 1 << FRACTION_BITS
+HALF = ONE >> 1
+
+TURN_BITS = 24
+TURN = 1 << TURN_BITS  # Yaw units per full turn
+SINE_BITS = 12  # Table entries per full turn, as a power of two
+
+REPLAY_VERSION = 1
+REPLAY_HASH_INTERVAL = 60  # Ticks between hashes stored in a replay
+
+
+def to_fixed(value) -> int:
+    """Convert a number to Q16.16, rounding to nearest."""
+    return round(value * ONE)
+
+
+def from_fixed(value: int) -> float:
+    """Convert Q16.16 to a float."""
+    return value / ONE
+
+
+def fixed_mul(a: int, b: int) -> int:
+    """Multiply two Q16.16 numbers, rounding to nearest."""
+    return (a * b + HALF) >> FRACTION_BITS
+
+
+def degrees_to_yaw(degrees) -> int:
+    """Convert degrees to integer yaw units."""
+    return round(degrees * TURN / 360) % TURN
+
+
+def yaw_to_degrees(yaw: int) -> float:
+    """Convert integer yaw units to degrees."""
+    return yaw * 360.0 / TURN
+
+
+def _build_sine_table() -> List[int]:
+    """Build a full-turn Q16.16 sine table with integer arithmetic only."""
+    precision = 1 << 80
+
+    def arctan_inverse(x):
+        # arctan(1/x) as a Taylor series on scaled integers
+        total = term = precision // x
+        n, sign, x_squared = 1, -1, x * x
+        while term:
+            term //= x_squared
+            n += 2
+            total += sign * (term // n)
+            sign = -sign
+        return total
+
+    pi = 4 * (4 * arctan_inverse(5) - arctan_inverse(239))  # Machin's formula
+    size = 1 << SINE_BITS
+    quarter = size // 4
+
+    values = []
+    for k in range(quarter + 1):
+        x = pi * k // (2 * quarter)
+        total = term = x
+        n = 1
+        while term:
+            term = -term * x // precision * x // precision // ((n + 1) * (n + 2))
+            total += term
+            n += 2
+        values.append((total * ONE + precision // 2) // precision)
+
+    table = [0] * size
+    for k in range(size):
+        quadrant, offset = divmod(k, quarter)
+        if quadrant == 0:
+            table[k] = values[offset]
+        elif quadrant == 1:
+            table[k] = values[quarter - offset]
+        elif quadrant == 2:
+            table[k] = -values[offset]
+        else:
+            table[k] = -values[quarter - offset]
+    return table
+
+
+SINE_TABLE = _build_sine_table()
+_SINE_SHIFT = TURN_BITS - SINE_BITS
+_SINE_MASK = (1 << SINE_BITS) - 1
+_QUARTER_TURN = TURN // 4
+
+
+def fixed_sin(yaw: int) -> int:
+    """Get the Q16.16 sine of an integer yaw."""
+    return SINE_TABLE[(yaw >> _SINE_SHIFT) & _SINE_MASK]
+
+
+def fixed_cos(yaw: int) -> int:
+    """Get the Q16.16 cosine of an integer yaw."""
+    return SINE_TABLE[((yaw + _QUARTER_TURN) >> _SINE_SHIFT) & _SINE_MASK]
+
+
+class DeterministicRandom:
+    """Seeded xorshift64* generator whose state is part of the simulation."""
+
+    MASK = (1 << 64) - 1
+
+    def __init__(self, seed=0):
+        """Initialize from ``seed`` (any int; zero is remapped)."""
+        self.state = (seed * 0x9E3779B97F4A7C15 + 1) & self.MASK or 1
+
+    def next_u32(self) -> int:
+        """Get the next 32 random bits."""
+        x = self.state
+        x ^= x >> 12
+        x ^= (x << 25) & self.MASK
+        x ^= x >> 27
+        self.state = x
+        return ((x * 0x2545F4914F6CDD1D) & self.MASK) >> 32
+
+    def randint(self, low, high) -> int:
+        """Get a random int in ``[low, high]``."""
+        return low + self.next_u32() % (high - low + 1)
+
+
+@dataclass
+class FixedInput:
+    """Control inputs quantized to fixed point."""
+
+    throttle: int = 0
+    steer: int = 0
+    brake: bool = False
+    handbrake: bool = False
+    boost: bool = False
+
+    @classmethod
+    def from_input(cls, inputs: CarInput) -> "FixedInput":
+        """Quantize a ``CarInput``, clamping axes to [-1, 1]."""
+        return cls(
+            throttle=max(-ONE, min(ONE, to_fixed(inputs.throttle))),
+            steer=max(-ONE, min(ONE, to_fixed(inputs.steer))),
+            brake=bool(inputs.brake),
+            handbrake=bool(inputs.handbrake),
+            boost=bool(inputs.boost),
+        )
+
+    @property
+    def buttons(self) -> int:
+        """Get brake/handbrake/boost packed into bits."""
+        return int(self.brake) | int(self.handbrake) << 1 | int(self.boost) << 2
+
+    @classmethod
+    def unpack(cls, throttle, steer, buttons) -> "FixedInput":
+        """Build from ``(throttle, steer, buttons)`` as stored in replays."""
+        return cls(throttle, steer, bool(buttons & 1), bool(buttons & 2), bool(buttons & 4))
+
+    def pack(self) -> Tuple[int, int, int]:
+        """Get ``(throttle, steer, buttons)`` for replays."""
+        return self.throttle, self.steer, self.buttons
+
+
+@dataclass
+class FixedCarState:
+    """Car state in fixed point: position and velocity in Q16.16, integer yaw."""
+
+    position: List[int] = field(default_factory=lambda: [0, ONE, 0])
+    velocity: List[int] = field(default_factory=lambda: [0, 0, 0])
+    yaw: int = 0
+    is_drifting: bool = False
+    is_on_ground: bool = True
+    boost_active: bool = False
+
+    STRUCT = struct.Struct("<qqqqqqqB")
+
+    def pack(self) -> bytes:
+        """Get a canonical byte encoding for hashing."""
+        flags = int(self.is_drifting) | int(self.is_on_ground) << 1 | int(self.boost_active) << 2
+        return self.STRUCT.pack(*self.position, *self.velocity, self.yaw, flags)
+
+    def to_car_state(self) -> CarState:
+        """Get a float ``CarState`` view."""
+        return CarState(
+            position=[from_fixed(v) for v in self.position],
+            yaw=yaw_to_degrees(self.yaw),
+            velocity=[from_fixed(v) for v in self.velocity],
+            is_drifting=self.is_drifting,
+            is_on_ground=self.is_on_ground,
+            boost_active=self.boost_active,
+        )
+
+
+class DeterministicPhysics:
+    """Integer-only equivalent of ``HeadlessPhysics`` at a fixed tick rate."""
+
+    def __init__(self, tick_rate=config.TICKRATE):
+        """Derive per-tick fixed-point constants from ``config``."""
+        dt = 1.0 / tick_rate
+        self.tick_rate = tick_rate
+        self.accel = to_fixed(config.ACCELERATION * dt)
+        self.brake = to_fixed(config.BRAKE_FORCE * dt)
+        self.boost = to_fixed(config.BOOST_MULTIPLIER * config.ACCELERATION * dt)
+        self.gravity = to_fixed(config.GRAVITY * dt)
+        self.turn = round(config.TURN_SPEED * dt * TURN / 360)  # Full steer, full speed
+        self.drift = to_fixed((1 - config.DRIFT_FACTOR) * dt)
+        self.damping_ground = to_fixed(config.AIR_RESISTANCE * config.FRICTION)
+        self.damping_air = to_fixed(config.AIR_RESISTANCE)
+        self.max_speed = to_fixed(config.MAX_SPEED)
+        self.turn_full_speed = to_fixed(10.0)
+        self.turn_min_speed = to_fixed(0.1)
+        self.drift_min_speed = to_fixed(5.0)
+
+    @staticmethod
+    def speed(velocity) -> int:
+        """Get the Q16.16 magnitude of a velocity."""
+        vx, vy, vz = velocity
+        return math.isqrt(vx * vx + vy * vy + vz * vz)
+
+    def step(self, state: FixedCarState, inputs: FixedInput):
+        """Apply inputs and integrate one tick, as ``HeadlessPhysics.step``."""
+        vel = state.velocity
+        pos = state.position
+        speed = self.speed(vel)
+        dvx = dvy = dvz = 0
+
+        # Forward/backward acceleration
+        if inputs.throttle:
+            k = fixed_mul(inputs.throttle, self.accel)
+            dvx += fixed_mul(fixed_sin(state.yaw), k)
+            dvz += fixed_mul(fixed_cos(state.yaw), k)
+
+        # Braking
+        if inputs.brake and speed > 0:
+            dvx -= vel[0] * self.brake // speed
+            dvy -= vel[1] * self.brake // speed
+            dvz -= vel[2] * self.brake // speed
+
+        # Steering (only when moving), scaled with velocity
+        if speed > self.turn_min_speed and inputs.steer:
+            factor = min(ONE, speed * ONE // self.turn_full_speed)
+            state.yaw = (state.yaw + (inputs.steer * self.turn * factor >> 32)) % TURN
+
+        # Handbrake (drifting) reduces lateral velocity
+        if inputs.handbrake and speed > self.drift_min_speed:
+            state.is_drifting = True
+            right_x, right_z = fixed_cos(state.yaw), -fixed_sin(state.yaw)
+            lateral = fixed_mul(vel[0], right_x) + fixed_mul(vel[2], right_z)
+            scale = fixed_mul(lateral, self.drift)
+            vel[0] -= fixed_mul(right_x, scale)
+            vel[2] -= fixed_mul(right_z, scale)
+        else:
+            state.is_drifting = False
+
+        # Boost
+        state.boost_active = inputs.boost
+        if inputs.boost:
+            dvx += fixed_mul(fixed_sin(state.yaw), self.boost)
+            dvz += fixed_mul(fixed_cos(state.yaw), self.boost)
+
+        # Gravity and acceleration
+        if not state.is_on_ground:
+            dvy += self.gravity
+        vel[0] += dvx
+        vel[1] += dvy
+        vel[2] += dvz
+
+        # Friction and air resistance
+        damping = self.damping_ground if state.is_on_ground else self.damping_air
+        for i in range(3):
+            vel[i] = fixed_mul(vel[i], damping)
+
+        # Clamp speed
+        speed = self.speed(vel)
+        if speed > self.max_speed:
+            for i in range(3):
+                vel[i] = vel[i] * self.max_speed // speed
+
+        # Update position (dt is exactly one tick)
+        for i in range(3):
+            pos[i] += vel[i] // self.tick_rate
+
+        # Ground check (simple)
+        if pos[1] < ONE:
+            pos[1] = ONE
+            vel[1] = 0
+            state.is_on_ground = True
+        else:
+            state.is_on_ground = False
+
+
+class DeterministicSimulation:
+    """Fixed-point cars keyed by slot, advanced one tick at a time."""
+
+    def __init__(self, seed=0, tick_rate=config.TICKRATE, replay: Optional["Replay"] = None):
+        """Initialize an empty simulation; events are recorded into ``replay`` if given."""
+        self.seed = seed
+        self.tick = 0
+        self.physics = DeterministicPhysics(tick_rate)
+        self.random = DeterministicRandom(seed)
+        self.cars: Dict[int, FixedCarState] = {}
+        self.inputs: Dict[int, FixedInput] = {}
+        self.replay = replay
+
+    def add_car(self, slot: int, position=(0.0, 1.0, 0.0), yaw=0.0) -> FixedCarState:
+        """Place a car in ``slot`` at a float position and yaw in degrees."""
+        state = FixedCarState(
+            position=[to_fixed(float(v)) for v in position], yaw=degrees_to_yaw(float(yaw))
+        )
+        self.add_fixed_car(slot, state)
+        return state
+
+    def add_fixed_car(self, slot: int, state: FixedCarState):
+        """Place a car already in fixed point."""
+        self.cars[slot] = state
+        self.inputs[slot] = FixedInput()
+        if self.replay is not None:
+            self.replay.add(self.tick, slot, state)
+
+    def remove_car(self, slot: int):
+        """Remove the car in ``slot``."""
+        self.cars.pop(slot, None)
+        self.inputs.pop(slot, None)
+        if self.replay is not None:
+            self.replay.remove(self.tick, slot)
+
+    def set_input(self, slot: int, inputs: FixedInput):
+        """Set the input a car applies from the next tick on."""
+        if slot in self.cars and inputs != self.inputs[slot]:
+            self.inputs[slot] = inputs
+            if self.replay is not None:
+                self.replay.input(self.tick, slot, inputs)
+
+    def step(self) -> int:
+        """Advance every car one tick, in slot order, and get the new tick."""
+        for slot in sorted(self.cars):
+            self.physics.step(self.cars[slot], self.inputs[slot])
+        self.tick += 1
+        if self.replay is not None and self.tick % self.replay.hash_interval == 0:
+            self.replay.hashes[self.tick] = self.state_hash()
+        return self.tick
+
+    def state_hash(self) -> int:
+        """Get a 64-bit hash of the tick, RNG and every car's state."""
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(struct.pack("<qQ", self.tick, self.random.state))
+        for slot in sorted(self.cars):
+            digest.update(struct.pack("<H", slot))
+            digest.update(self.cars[slot].pack())
+        return int.from_bytes(digest.digest(), "little")
+
+
+@dataclass
+class Replay:
+    """Inputs-only recording of a deterministic simulation.
+
+    ``events`` holds ``[tick, kind, slot, ...]`` rows applied before that
+    tick is simulated: ``"add"`` with the car's fixed-point position and
+    yaw (joining cars start at rest), ``"input"`` with ``(throttle, steer,
+    buttons)`` whenever a car's input changes, and ``"remove"``. ``hashes`` maps ticks to the
+    state hash the recording produced.
+    """
+
+    seed: int = 0
+    tick_rate: int = config.TICKRATE
+    hash_interval: int = REPLAY_HASH_INTERVAL
+    events: List[list] = field(default_factory=list)
+    hashes: Dict[int, int] = field(default_factory=dict)
+    end_tick: int = 0
+
+    def add(self, tick, slot, state: FixedCarState):
+        """Record a car joining."""
+        self.events.append([tick, "add", slot, list(state.position), state.yaw])
+
+    def remove(self, tick, slot):
+        """Record a car leaving."""
+        self.events.append([tick, "remove", slot])
+
+    def input(self, tick, slot, inputs: FixedInput):
+        """Record a car's input changing."""
+        self.events.append([tick, "input", slot, *inputs.pack()])
+
+    def run(self, until: Optional[int] = None) -> Tuple[DeterministicSimulation, Optional[int]]:
+        """Re-simulate and check hashes.
+
+        Returns the simulation at ``until`` (default: the recorded end)
+        and the first tick whose hash differs from the recording, or None.
+        """
+        until = self.end_tick if until is None else until
+        sim = DeterministicSimulation(self.seed, self.tick_rate)
+        events = iter(self.events)
+        pending = next(events, None)
+        divergence = None
+
+        while sim.tick < until:
+            while pending is not None and pending[0] <= sim.tick:
+                self.apply(sim, pending)
+                pending = next(events, None)
+            tick = sim.step()
+            expected = self.hashes.get(tick)
+            if divergence is None and expected is not None and expected != sim.state_hash():
+                divergence = tick
+        return sim, divergence
+
+    @staticmethod
+    def apply(sim: DeterministicSimulation, event):
+        """Apply one recorded event."""
+        kind, slot = event[1], event[2]
+        if kind == "add":
+            sim.add_fixed_car(slot, FixedCarState(position=list(event[3]), yaw=event[4]))
+        elif kind == "remove":
+            sim.remove_car(slot)
+        elif kind == "input":
+            sim.set_input(slot, FixedInput.unpack(*event[3:6]))
+
+    def to_dict(self):
+        return {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "tick_rate": self.tick_rate,
+            "hash_interval": self.hash_interval,
+            "end_tick": self.end_tick,
+            "events": self.events,
+            "hashes": [[tick, value] for tick, value in sorted(self.hashes.items())],
+        }
+
+    def save(self, path):
+        """Write the replay to ``path`` as msgpack."""
+        with open(path, "wb") as f:
+            f.write(msgpack.packb(self.to_dict()))
+
+    @classmethod
+    def load(cls, path) -> "Replay":
+        """Read a replay written by ``save``."""
+        with open(path, "rb") as f:
+            data = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version {data.get('version')}")
+        return cls(
+            seed=data["seed"],
+            tick_rate=data["tick_rate"],
+            hash_interval=data["hash_interval"],
+            events=data["events"],
+            hashes={tick: value for tick, value in data["hashes"]},
+            end_tick=data["end_tick"],
+        )
+
+
+def main():
+    """Verify a recorded replay by re-simulating it."""
+    parser = argparse.ArgumentParser(description="Dog Go Around - Replay Verifier")
+    parser.add_argument("replay", help="Replay file written by a deterministic room")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    sim, divergence = replay.run()
+    print(
+        f"{len(replay.events)} events, {replay.end_tick} ticks, final hash {sim.state_hash():016x}"
+    )
+    if divergence is not None:
+        raise SystemExit(f"Desync: state hash differs at tick {divergence}")
+    print(f"All {len(replay.hashes)} recorded hashes match")
+
+
+if __name__ == "__main__":
+    main()
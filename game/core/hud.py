@@ -7,9 +7,10 @@ from game import config
 class HUD:
     """Display speedometer, lap counter, position, and timer."""
 
-    def __init__(self, race_manager):
+    def __init__(self, race_manager, network_client=None):
         """Initialize HUD."""
         self.race_manager = race_manager
+        self.network_client = network_client
 
         # Speedometer
         self.speed_text = Text(
@@ -47,6 +48,15 @@ class HUD:
             color=color.white,
         )
 
+        # Network latency (online only)
+        self.network_text = Text(
+            text="",
+            position=(-0.85, 0.45),
+            origin=(0, 0),
+            scale=1,
+            color=color.light_gray,
+        )
+
         # Wrong way indicator
         self.wrong_way_text = Text(
             text="WRONG WAY!",
@@ -93,6 +103,9 @@ class HUD:
         milliseconds = int((race_time % 1) * 1000)
         self.timer_text.text = f"Time: {minutes}:{seconds:02d}.{milliseconds:03d}"
 
+        # Update network latency
+        self.network_text.text = self.get_network_text()
+
         # Update wrong way indicator
         if self.race_manager.is_going_wrong_way():
             self.wrong_way_text.visible = True
@@ -111,6 +124,17 @@ class HUD:
         else:
             self.countdown_text.visible = False
 
+    def get_network_text(self):
+        """Get ping and interpolation delay, or nothing when offline."""
+        client = self.network_client
+        if client and client.reconnecting:
+            return "Reconnecting..."
+        if not client or not client.connected:
+            return ""
+        rtt = client.clock.rtt
+        ping = f"{rtt * 1000:.0f} ms" if rtt is not None else "-"
+        return f"Ping: {ping}  Delay: {client.interpolation_delay * 1000:.0f} ms"
+
     def get_position_suffix(self, position):
         """Get position suffix (st, nd, rd, th)."""
         if position == 1:
@@ -128,6 +152,7 @@ class HUD:
         self.lap_text.enabled = True
         self.position_text.enabled = True
         self.timer_text.enabled = True
+        self.network_text.enabled = True
 
     def hide(self):
         """Hide HUD."""
@@ -135,5 +160,6 @@ class HUD:
         self.lap_text.enabled = False
         self.position_text.enabled = False
         self.timer_text.enabled = False
+        self.network_text.enabled = False
         self.wrong_way_text.visible = False
         self.countdown_text.visible = False
@@ -0,0 +1,27 @@
+"""Headless track layout shared by the client scene and the server referee.
+
+Positions are plain ``(x, y, z)`` tuples so the server can use them without
+Ursina; client systems wrap them in ``Vec3``.
+"""
+
+# Simple oval with 8 checkpoints, in lap order
+CHECKPOINT_POSITIONS = (
+    (0, 1, -15),  # Start/Finish
+    (20, 1, -15),  # Corner 1
+    (35, 1, 0),  # Side 1
+    (20, 1, 15),  # Corner 2
+    (0, 1, 18),  # Far end
+    (-20, 1, 15),  # Corner 3
+    (-35, 1, 0),  # Side 2
+    (-20, 1, -15),  # Corner 4
+)
+
+POWERUP_POSITIONS = (
+    (15, 1, 0),
+    (-15, 1, 0),
+    (0, 1, 10),
+    (0, 1, -10),
+)
+
+POWERUP_RADIUS = 2.0
+POWERUP_RESPAWN_TIME = 10.0
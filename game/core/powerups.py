@@ -2,6 +2,7 @@
 
 from ursina import *
 from game import config
+from game.core import layout
 
 
 class PowerUpSystem:
@@ -11,16 +12,11 @@ class PowerUpSystem:
         """Initialize power-up system."""
         self.powerups = []
         self.spawn_points = []
-        self.respawn_time = 10.0
+        self.respawn_time = layout.POWERUP_RESPAWN_TIME
 
     def create_spawn_points(self):
         """Create power-up spawn points."""
-        positions = [
-            Vec3(15, 1, 0),
-            Vec3(-15, 1, 0),
-            Vec3(0, 1, 10),
-            Vec3(0, 1, -10),
-        ]
+        positions = [Vec3(*pos) for pos in layout.POWERUP_POSITIONS]
 
         for pos in positions:
             spawn = PowerUpSpawn(pos, self.respawn_time)
@@ -31,7 +27,7 @@ class PowerUpSystem:
         for spawn in self.spawn_points:
             spawn.update()
 
-    def check_collision(self, position, radius=2.0):
+    def check_collision(self, position, radius=layout.POWERUP_RADIUS):
         """Check if position collides with any power-up."""
         for spawn in self.spawn_points:
             if spawn.is_active():
@@ -7,10 +7,13 @@ from game import config
 class RaceManager:
     """Controls race flow: countdown, laps, finish, results."""
 
-    def __init__(self, world):
+    def __init__(self, world, network_client=None):
         """Initialize race manager."""
         self.world = world
 
+        # Online, checkpoints and laps are judged by the server
+        self.network_client = network_client
+
         # Race state
         self.state = "countdown"  # countdown, racing, finished
         self.countdown_timer = config.COUNTDOWN_TIME
@@ -44,6 +47,11 @@ class RaceManager:
 
     def update_racing(self):
         """Update during race."""
+        client = self.network_client
+        if client and client.connected:
+            self.apply_race_events(client.take_race_events(), client.player_id)
+            return
+
         # Check checkpoint progress
         if self.world and self.world.track:
             checkpoint_system = self.world.track.checkpoint_system
@@ -61,6 +69,21 @@ class RaceManager:
                     if self.current_lap > self.total_laps:
                         self.finish_race()
 
+    def apply_race_events(self, events, player_id):
+        """Apply the server's checkpoint and lap events for the local player."""
+        for event in events:
+            if event.get("player_id") != player_id or self.state != "racing":
+                continue
+
+            if event["kind"] == "checkpoint" and self.world and self.world.track:
+                checkpoint_system = self.world.track.checkpoint_system
+                count = len(checkpoint_system.checkpoints)
+                checkpoint_system.current_checkpoint = (event["index"] + 1) % count
+            elif event["kind"] == "lap":
+                self.current_lap = event["lap"]
+                if self.current_lap > self.total_laps:
+                    self.finish_race()
+
     def finish_race(self):
         """Finish the race."""
         self.state = "finished"
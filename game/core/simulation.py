@@ -0,0 +1,198 @@
+"""Headless vehicle simulation with explicit time steps.
+
+Mirrors the rules in ``game.core.physics.Physics`` on plain Python state so
+the server (and client-side prediction) can step cars without importing a
+renderer.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import List
+
+from game import config
+
+
+@dataclass
+class CarInput:
+    """Control inputs for one simulation step."""
+
+    throttle: float = 0.0
+    steer: float = 0.0
+    brake: bool = False
+    handbrake: bool = False
+    boost: bool = False
+
+    @classmethod
+    def from_message(cls, data):
+        """Build from an ``InputMessage`` or its dict form."""
+        if isinstance(data, dict):
+            return cls(
+                throttle=data.get("throttle", 0.0),
+                steer=data.get("steer", 0.0),
+                brake=data.get("brake", False),
+                handbrake=data.get("handbrake", False),
+                boost=data.get("boost", False),
+            )
+        return cls(data.throttle, data.steer, data.brake, data.handbrake, data.boost)
+
+
+@dataclass
+class CarState:
+    """Plain car state: position, heading and velocity."""
+
+    position: List[float] = field(default_factory=lambda: [0.0, 1.0, 0.0])
+    yaw: float = 0.0
+    velocity: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
+    acceleration: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
+    is_drifting: bool = False
+    is_on_ground: bool = True
+    boost_active: bool = False
+
+    @property
+    def rotation(self) -> List[float]:
+        """Get rotation as Euler angles (pitch, yaw, roll)."""
+        return [0.0, self.yaw, 0.0]
+
+    def forward(self) -> List[float]:
+        """Get unit forward vector for the current yaw."""
+        rad = math.radians(self.yaw)
+        return [math.sin(rad), 0.0, math.cos(rad)]
+
+    def right(self) -> List[float]:
+        """Get unit right vector for the current yaw."""
+        rad = math.radians(self.yaw)
+        return [math.cos(rad), 0.0, -math.sin(rad)]
+
+    def copy(self) -> "CarState":
+        """Get an independent copy of this state."""
+        return CarState(
+            position=list(self.position),
+            yaw=self.yaw,
+            velocity=list(self.velocity),
+            acceleration=list(self.acceleration),
+            is_drifting=self.is_drifting,
+            is_on_ground=self.is_on_ground,
+            boost_active=self.boost_active,
+        )
+
+
+class HeadlessPhysics:
+    """Renderer-free equivalent of ``Physics`` operating on ``CarState``."""
+
+    def __init__(self):
+        """Initialize physics properties from config."""
+        self.max_speed = config.MAX_SPEED
+        self.acceleration_force = config.ACCELERATION
+        self.brake_force = config.BRAKE_FORCE
+        self.turn_speed = config.TURN_SPEED
+        self.friction = config.FRICTION
+        self.air_resistance = config.AIR_RESISTANCE
+        self.drift_factor = config.DRIFT_FACTOR
+
+    def apply_input(self, state: CarState, inputs: CarInput, dt: float):
+        """Apply input forces, as ``Physics.apply_input``."""
+        acc = state.acceleration
+        vel = state.velocity
+
+        # Forward/backward acceleration
+        if inputs.throttle != 0:
+            fwd = state.forward()
+            scale = inputs.throttle * self.acceleration_force
+            for i in range(3):
+                acc[i] += fwd[i] * scale
+
+        # Braking
+        if inputs.brake:
+            speed = self.get_speed(state)
+            if speed > 0:
+                for i in range(3):
+                    acc[i] -= vel[i] / speed * self.brake_force
+
+        # Steering (only when moving)
+        speed = self.get_speed(state)
+        if speed > 0.1 and inputs.steer != 0:
+            turn_amount = inputs.steer * self.turn_speed * dt
+            # Scale turn speed with velocity
+            turn_amount *= min(1.0, speed / 10.0)
+            state.yaw += turn_amount
+
+        # Handbrake (drifting)
+        if inputs.handbrake and speed > 5:
+            state.is_drifting = True
+            # Reduce lateral friction
+            lateral = state.right()
+            lateral_speed = vel[0] * lateral[0] + vel[1] * lateral[1] + vel[2] * lateral[2]
+            scale = lateral_speed * (1 - self.drift_factor) * dt
+            for i in range(3):
+                vel[i] -= lateral[i] * scale
+        else:
+            state.is_drifting = False
+
+        # Boost
+        if inputs.boost:
+            state.boost_active = True
+            fwd = state.forward()
+            scale = config.BOOST_MULTIPLIER * self.acceleration_force
+            for i in range(3):
+                acc[i] += fwd[i] * scale
+        else:
+            state.boost_active = False
+
+    def update(self, state: CarState, dt: float):
+        """Integrate one step, as ``Physics.update``."""
+        vel = state.velocity
+        acc = state.acceleration
+        pos = state.position
+
+        # Apply gravity
+        if not state.is_on_ground:
+            vel[1] += config.GRAVITY * dt
+
+        # Apply acceleration
+        for i in range(3):
+            vel[i] += acc[i] * dt
+
+        # Apply friction and air resistance
+        damping = self.air_resistance
+        if state.is_on_ground:
+            damping *= self.friction
+        for i in range(3):
+            vel[i] *= damping
+
+        # Clamp speed
+        speed = self.get_speed(state)
+        if speed > self.max_speed:
+            scale = self.max_speed / speed
+            for i in range(3):
+                vel[i] *= scale
+
+        # Update position
+        for i in range(3):
+            pos[i] += vel[i] * dt
+
+        # Ground check (simple)
+        if pos[1] < 1:
+            pos[1] = 1.0
+            vel[1] = 0.0
+            state.is_on_ground = True
+        else:
+            state.is_on_ground = False
+
+        # Reset acceleration
+        state.acceleration = [0.0, 0.0, 0.0]
+
+    def step(self, state: CarState, inputs: CarInput, dt: float):
+        """Apply inputs and integrate one step."""
+        self.apply_input(state, inputs, dt)
+        self.update(state, dt)
+
+    def get_speed(self, state: CarState) -> float:
+        """Get current speed (magnitude of velocity)."""
+        vx, vy, vz = state.velocity
+        return math.sqrt(vx * vx + vy * vy + vz * vz)
+
+    def reset(self, state: CarState):
+        """Reset physics state."""
+        state.velocity = [0.0, 0.0, 0.0]
+        state.acceleration = [0.0, 0.0, 0.0]
+        state.is_drifting = False
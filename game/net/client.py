@@ -1,47 +1,132 @@
-"""Network client for multiplayer connection."""
+"""Network client for multiplayer connection.
+
+Networking runs on its own asyncio loop in a ``NetworkThread``, so socket
+I/O and snapshot decoding never block a frame. The threads share two
+queues: decoded snapshots and other server messages go to the game
+thread, and input packets and pings go to the network thread. Both are
+deques, whose appends and pops are atomic. The snapshot queue is bounded
+and keeps the newest entries if the game thread falls behind. Of the
+input packets queued between flushes only the newest is sent, since each
+packet repeats the inputs before it.
+
+When the connection drops, the client reconnects with exponential backoff
+and presents its session token. The server still holds its car and race
+progress for a grace period, and answers with a full snapshot at once.
+"""
 
 import asyncio
+import random
 import time
+from collections import deque
 from typing import Optional
 import websockets
+from game import config
+from game.core.simulation import CarInput, CarState
+from game.net.clock import ClockSync
+from game.net.delta import SnapshotHistory, apply_delta
+from game.net.interpolation import BufferedSnapshot, SnapshotBuffer
+from game.net.jitter import AdaptiveDelay
+from game.net.state_sync import ClientPrediction
 from game.net.messages import (
     serialize_message,
     deserialize_message,
+    dispatch,
     JoinMessage,
     InputMessage,
 )
+from game.net.network_thread import NetworkThread
+from game.net.transport import connect_datagram
 
 
 class NetworkClient:
     """Network client with input sending and state interpolation."""
 
-    def __init__(self, host, port, player_name, world):
+    def __init__(self, host, port, player_name, world, room_id="", autoconnect=True):
         self.host = host
         self.port = port
         self.player_name = player_name
         self.world = world
+        self.room_id = room_id
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
+        self.transport = config.NETWORK_TRANSPORT
         self.player_id = None
+        self.session_token = ""
         self.connected = False
         self.running = False
-
-        # State interpolation
-        self.server_states = []
-        self.interpolation_delay = 0.1
-
-        # Start connection
-        asyncio.create_task(self.connect())
-
-    async def connect(self):
+        self.reconnecting = False
+
+        # State interpolation on estimated server time; the delay adapts
+        # to how late snapshots arrive
+        self.clock = ClockSync()
+        self.snapshots = SnapshotBuffer()
+        self.delay = AdaptiveDelay()
+        self.snapshot_rate = config.SNAPSHOT_RATE
+        self.snapshot_detail = 2
+
+        # Delta decoding: rebuilt snapshots by sequence number
+        self.snapshot_history = SnapshotHistory()
+        self.last_snapshot_seq = -1
+        self.snapshots_received = 0
+
+        # Binary snapshots identify players by car slot
+        self.codec = config.SNAPSHOT_CODEC
+        self.roster = {}
+
+        # Checkpoint, lap, pickup and contact events judged by the server
+        self.race_events = deque(maxlen=64)
+
+        # Server message type -> handler(data) on the network thread;
+        # everything else is queued for the game thread's handlers
+        self.network_handlers = {
+            "state": self.receive_state,
+            "roster": self.handle_roster,
+            "pong": self.receive_pong,
+        }
+        self.message_handlers = {
+            "joined": self.handle_joined,
+            "state": self.handle_state,
+            "race_event": self.handle_race_event,
+            "snapshot_rate": self.handle_snapshot_rate,
+            "pong": self.handle_pong,
+            "chat": self.handle_chat,
+        }
+
+        # The local car is simulated ahead of the server and reconciled
+        # with the newest authoritative state for it
+        self.prediction = ClientPrediction() if config.PREDICTION_ENABLED else None
+
+        # Queues between the network and game threads
+        self.snapshot_queue = deque(maxlen=config.CLIENT_SNAPSHOT_QUEUE)
+        self.local_state_queue = deque(maxlen=1)
+        self.event_queue = deque()
+        self.outbound = deque()
+        self.flush_pending = False
+
+        # Inputs are sampled once per simulation tick and the last few are
+        # resent in every packet, so a lost packet costs nothing
+        self.input_tick = 0
+        self.input_history = deque(maxlen=config.INPUT_REDUNDANCY)
+        self.next_input_time: Optional[float] = None
+        self.last_sent_tick = 0
+
+        # Start connection (``autoconnect=False`` leaves that to the caller)
+        self.network = NetworkThread()
+        self.network.start()
+        if autoconnect:
+            self.network.submit(self.connect())
+
+    async def connect(self, redirects=0):
         """Connect to server."""
         try:
-            uri = f"ws://{self.host}:{self.port}"
-            print(f"Connecting to {uri}...")
-
-            self.websocket = await websockets.connect(uri)
+            self.websocket = await self.open_transport()
 
             # Send join message
-            join_msg = JoinMessage(player_name=self.player_name)
+            join_msg = JoinMessage(
+                player_name=self.player_name,
+                room_id=self.room_id,
+                codec=self.codec,
+                session_token=self.session_token,
+            )
             await self.websocket.send(serialize_message("join", join_msg))
 
             # Wait for join response
@@ -50,149 +135,388 @@ class NetworkClient:
 
             if message["type"] == "join_response":
                 self.player_id = message["data"]["player_id"]
+                self.room_id = message["data"].get("room_id", self.room_id)
+                self.codec = message["data"].get("codec", "msgpack")
+                self.session_token = message["data"].get("session_token", "")
+                if not message["data"].get("resumed", False):
+                    # A new race numbers its snapshots from scratch
+                    self.snapshot_history = SnapshotHistory()
+                    self.last_snapshot_seq = -1
+                self.event_queue.append({"type": "joined", "data": message["data"]})
                 self.connected = True
                 self.running = True
-                print(f"Connected as {self.player_id}")
+                print(f"Connected as {self.player_id} in room {self.room_id}")
 
                 # Start receive loop
                 asyncio.create_task(self.receive_loop())
 
+            elif message["type"] == "redirect" and redirects < 3:
+                # Another server worker hosts the room; join it there
+                await self.websocket.close()
+                self.port = message["data"]["port"]
+                self.room_id = message["data"]["room_id"]
+                await self.connect(redirects + 1)
+
+            elif message["type"] == "join_error":
+                print(f"Join rejected: {message['data']['reason']}")
+                await self.websocket.close()
+
         except Exception as e:
             print(f"Connection error: {e}")
             self.connected = False
 
+    async def open_transport(self):
+        """Open a datagram session or WebSocket to the server.
+
+        With the ``auto`` transport, UDP is tried first and WebSocket is
+        the fallback when the server does not answer datagrams.
+        """
+        if self.transport in ("auto", "udp"):
+            print(f"Connecting to udp://{self.host}:{self.port}...")
+            try:
+                return await connect_datagram(self.host, self.port)
+            except (OSError, TimeoutError) as e:
+                if self.transport == "udp":
+                    raise
+                print(f"UDP unavailable ({e}), falling back to WebSocket")
+
+        uri = f"ws://{self.host}:{self.port}"
+        print(f"Connecting to {uri}...")
+        return await websockets.connect(uri)
+
     async def receive_loop(self):
-        """Receive messages from server."""
+        """Receive messages from server, reconnecting if the connection drops."""
         try:
             async for message_data in self.websocket:
                 message = deserialize_message(message_data)
                 await self.handle_message(message)
         except Exception as e:
             print(f"Receive error: {e}")
-            self.connected = False
+        self.connected = False
+        if self.running:
+            await self.reconnect()
+
+    async def reconnect(self):
+        """Resume the session, backing off between attempts until the timeout."""
+        self.reconnecting = True
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+        deadline = time.monotonic() + config.RECONNECT_TIMEOUT
+        backoff = config.RECONNECT_BACKOFF_MIN
+        while self.running and not self.connected and time.monotonic() < deadline:
+            # Randomized so clients cut off together don't retry in lockstep
+            wait = random.uniform(backoff / 2, backoff)
+            print(f"Connection lost, reconnecting in {wait:.2f}s")
+            await asyncio.sleep(wait)
+            await self.connect()
+            backoff = min(backoff * 2, config.RECONNECT_BACKOFF_MAX)
+
+        self.reconnecting = False
+        if not self.connected:
+            print("Could not reconnect")
+            self.running = False
 
     async def handle_message(self, message):
-        """Handle message from server."""
-        msg_type = message["type"]
-        msg_data = message["data"]
-
-        if msg_type == "state":
-            # Store state snapshot for interpolation
-            self.server_states.append(
-                {"timestamp": msg_data["timestamp"], "players": msg_data["players"]}
+        """Handle message from server (network thread)."""
+        if message["type"] in self.network_handlers:
+            dispatch(message, self.network_handlers)
+        else:
+            self.event_queue.append(message)
+
+    def receive_state(self, msg_data):
+        """Decode a snapshot and queue it for the game thread (network thread)."""
+        self.snapshots_received += 1
+        players = self.decode_snapshot(msg_data)
+        if players is None:
+            return
+        self.snapshot_queue.append(
+            BufferedSnapshot(
+                msg_data["timestamp"], players, msg_data.get("tick", 0), time.monotonic()
             )
+        )
+        input_tick = msg_data.get("input_tick", -1)
+        if self.prediction and input_tick >= 0:
+            local = next((p for p in players if p["id"] == self.player_id), None)
+            if local is not None:
+                self.local_state_queue.append((input_tick, local))
+
+    def receive_pong(self, msg_data):
+        """Queue a pong stamped with its arrival time (network thread)."""
+        self.event_queue.append(
+            {"type": "pong", "data": {**msg_data, "received": time.monotonic()}}
+        )
 
-            # Keep only recent states
-            if len(self.server_states) > 10:
-                self.server_states.pop(0)
+    def process_inbound(self):
+        """Handle everything the network thread has queued (game thread)."""
+        while self.event_queue:
+            dispatch(self.event_queue.popleft(), self.message_handlers)
+        while self.snapshot_queue:
+            self.handle_state(self.snapshot_queue.popleft())
+        while self.local_state_queue:
+            self.handle_local_state(*self.local_state_queue.popleft())
+
+    def handle_joined(self, msg_data):
+        """Start clock sync afresh for a newly joined server.
+
+        A resumed session keeps its clock, delay and prediction; only the
+        snapshots from before the outage are dropped.
+        """
+        self.snapshots.clear()
+        if msg_data.get("resumed", False):
+            return
+        self.clock.reset()
+        self.delay.reset()
+        if self.prediction:
+            self.prediction.clear()
+            player_car = getattr(self.world, "player_car", None)
+            if player_car is not None:
+                player_car.predicted = True  # Server-authoritative from now on
+
+    def handle_state(self, snapshot: BufferedSnapshot):
+        """Store a decoded state snapshot for interpolation."""
+        self.clock.observe_snapshot(snapshot.timestamp)
+        if self.snapshots.add(snapshot) and snapshot.received is not None:
+            self.delay.on_snapshot(
+                snapshot.timestamp, self.clock.to_server_time(snapshot.received)
+            )
 
-        elif msg_type == "chat":
-            print(f"[Chat] {msg_data['player_name']}: {msg_data['message']}")
+    def handle_local_state(self, input_tick, entity):
+        """Reconcile the local car's prediction with the server's state for it."""
+        flags = entity.get("flags", 0)
+        server_state = CarState(
+            position=list(entity["position"]),
+            yaw=entity["rotation"][1],
+            velocity=list(entity.get("velocity", (0.0, 0.0, 0.0))),
+            is_drifting=bool(flags & 1),
+            is_on_ground=entity["position"][1] <= 1.0 + 1e-3,
+            boost_active=bool(flags & 2),
+        )
+        self.prediction.reconcile(input_tick, server_state)
+
+    @property
+    def interpolation_delay(self) -> float:
+        """Get the current interpolation delay in seconds (for the HUD)."""
+        return self.delay.delay
+
+    def handle_pong(self, msg_data):
+        """Feed a clock sync answer to the server clock estimate."""
+        self.clock.handle_pong(msg_data, now=msg_data.get("received"))
+
+    def handle_roster(self, msg_data):
+        """Merge roster entries so slots of departed players still resolve."""
+        for entry in msg_data["players"]:
+            self.roster[entry["slot"]] = entry
+
+    def handle_snapshot_rate(self, msg_data):
+        """Follow the server's snapshot rate.
+
+        The delay measurements restart, beginning from a delay that keeps
+        as many snapshots buffered as the default does at the full rate.
+        """
+        self.snapshot_rate = max(1, msg_data["rate"])
+        self.snapshot_detail = msg_data.get("detail", 2)
+        self.delay.set_rate(self.snapshot_rate)
+
+    def handle_race_event(self, msg_data):
+        """Queue a race event judged by the server."""
+        self.race_events.append(msg_data)
+
+    def take_race_events(self):
+        """Get and clear the race events received since the last call."""
+        events = list(self.race_events)
+        self.race_events.clear()
+        return events
+
+    def handle_chat(self, msg_data):
+        """Print a chat message."""
+        print(f"[Chat] {msg_data['player_name']}: {msg_data['message']}")
+
+    def decode_snapshot(self, msg_data):
+        """Rebuild a full player list from a (possibly delta) snapshot.
+
+        Returns None for stale snapshots or deltas whose baseline is unknown.
+        """
+        seq = msg_data.get("seq", 0)
+        if seq <= self.last_snapshot_seq:
+            return None
+
+        baseline_seq = msg_data.get("baseline", -1)
+        baseline = None
+        if baseline_seq >= 0:
+            baseline = self.snapshot_history.get(baseline_seq)
+            if baseline is None:
+                return None
+
+        entities = apply_delta(baseline, msg_data["players"], msg_data.get("removed", []))
+        self.snapshot_history.store(seq, entities)
+        self.last_snapshot_seq = seq
+
+        if self.codec == "binary":
+            return self.resolve_slots(entities)
+        return list(entities.values())
+
+    def resolve_slots(self, entities):
+        """Map slot-keyed binary snapshot entities to roster players."""
+        players = []
+        for slot, entity in entities.items():
+            entry = self.roster.get(slot)
+            if entry:
+                players.append({**entity, "id": entry["id"], "name": entry["name"]})
+        return players
 
     def update(self):
         """Update client state (called from game loop)."""
         if not self.connected:
             return
 
-        # Send input to server
+        self.process_inbound()
+
+        # Sample input on simulation ticks and send at the input rate
         if self.world and self.world.player_car:
-            asyncio.create_task(self.send_input())
+            if self.sample_inputs() and self.input_send_due():
+                self.last_sent_tick = self.input_tick
+                self.queue_send("input", self.build_input_message())
+
+        # Keep the server clock estimate fresh
+        if self.clock.ping_due():
+            self.queue_send("ping")
+
+        # Show the local car where the prediction has it
+        if self.prediction and self.prediction.started and self.world and self.world.player_car:
+            position, yaw = self.prediction.display()
+            self.world.player_car.apply_predicted_state(
+                position, yaw, self.prediction.state.velocity
+            )
 
         # Interpolate remote players
         self.interpolate_state()
 
-    async def send_input(self):
-        """Send player input to server."""
-        if not self.websocket or not self.player_id:
-            return
-
-        car = self.world.player_car
-
-        # Get current input state
-        throttle = 0.0
-        steer = 0.0
-        brake = False
-        handbrake = False
-        boost = False
-
-        # This would come from actual input
-        # For now, placeholder
-
-        input_msg = InputMessage(
+    def sample_inputs(self, now=None) -> int:
+        """Record the local car's input for every tick elapsed since the last call.
+
+        Returns the number of ticks sampled.
+        """
+        interval = 1.0 / config.TICKRATE
+        now = time.monotonic() if now is None else now
+        if self.next_input_time is None:
+            self.next_input_time = now
+
+        car_input = getattr(self.world.player_car, "current_input", None) or CarInput()
+        ticks = 0
+        while now >= self.next_input_time and ticks < config.MAX_CATCHUP_TICKS:
+            self.input_tick += 1
+            self.input_history.append((self.input_tick, car_input))
+            if self.prediction:
+                self.prediction.predict(self.input_tick, car_input)
+            self.next_input_time += interval
+            ticks += 1
+
+        if now >= self.next_input_time:
+            # Stalled for too long; don't replay the whole gap
+            self.next_input_time = now + interval
+        return ticks
+
+    def input_send_due(self) -> bool:
+        """Check if enough ticks have been sampled to send an input packet."""
+        ticks_per_packet = max(1, config.TICKRATE // max(1, config.INPUT_SEND_RATE))
+        return self.input_tick - self.last_sent_tick >= ticks_per_packet
+
+    def build_input_message(self) -> InputMessage:
+        """Build an input packet carrying the newest input and its predecessors."""
+        tick, car_input = self.input_history[-1]
+        return InputMessage(
             player_id=self.player_id,
-            throttle=throttle,
-            steer=steer,
-            brake=brake,
-            handbrake=handbrake,
-            boost=boost,
-            timestamp=time.time(),
+            throttle=car_input.throttle,
+            steer=car_input.steer,
+            brake=car_input.brake,
+            handbrake=car_input.handbrake,
+            boost=car_input.boost,
+            timestamp=self.clock.server_time() or 0.0,
+            ack=self.last_snapshot_seq,
+            received=self.snapshots_received,
+            delay=self.interpolation_delay,
+            tick=tick,
+            inputs=[
+                [t, i.throttle, i.steer, i.brake, i.handbrake, i.boost]
+                for t, i in list(self.input_history)[:-1]
+            ],
         )
 
+    def queue_send(self, msg_type, message=None):
+        """Hand a message to the network thread and wake it (game thread)."""
+        self.outbound.append((msg_type, message))
+        if not self.flush_pending:
+            self.flush_pending = True
+            self.network.submit(self.flush_outbound())
+
+    async def flush_outbound(self):
+        """Send queued messages, skipping input packets superseded by newer ones."""
+        # Clear the flag before draining so a message queued meanwhile
+        # either gets drained here or schedules the next flush
+        self.flush_pending = False
+        pending = []
+        while self.outbound:
+            pending.append(self.outbound.popleft())
+
+        newest_input = max((i for i, (t, _) in enumerate(pending) if t == "input"), default=-1)
+        for i, (msg_type, message) in enumerate(pending):
+            if msg_type == "input" and i != newest_input:
+                continue
+            if msg_type == "ping":
+                # Stamped here so queueing delay doesn't count as round trip
+                message = self.clock.build_ping()
+            await self.send_unreliable(msg_type, message)
+
+    async def send_unreliable(self, msg_type, message):
+        """Send an input or ping; both are repeated, so they can be lost."""
+        if not self.websocket or not self.player_id:
+            return
+        send = getattr(self.websocket, "send_unreliable", self.websocket.send)
         try:
-            await self.websocket.send(serialize_message("input", input_msg))
+            await send(serialize_message(msg_type, message))
         except Exception as e:
-            print(f"Error sending input: {e}")
+            print(f"Error sending {msg_type}: {e}")
 
     def interpolate_state(self):
         """Interpolate remote player positions."""
-        if len(self.server_states) < 2:
+        if not self.snapshots or not self.world:
+            return
+
+        server_time = self.clock.server_time()
+        if server_time is None:
+            return
+        underrun = self.snapshots.extrapolating_from is not None
+        delay = self.delay.advance(server_time, underrun)
+        sample = self.snapshots.sample(server_time - delay)
+        if sample is None:
             return
 
-        render_time = time.time() - self.interpolation_delay
-
-        # Find two states to interpolate between
-        for i in range(len(self.server_states) - 1):
-            if (
-                self.server_states[i]["timestamp"]
-                <= render_time
-                <= self.server_states[i + 1]["timestamp"]
-            ):
-
-                state0 = self.server_states[i]
-                state1 = self.server_states[i + 1]
-
-                # Calculate interpolation factor
-                time_diff = state1["timestamp"] - state0["timestamp"]
-                if time_diff > 0:
-                    t = (render_time - state0["timestamp"]) / time_diff
-
-                    # Interpolate each player
-                    for player_data in state1["players"]:
-                        player_id = player_data["id"]
-
-                        # Skip local player
-                        if player_id == self.player_id:
-                            continue
-
-                        # Find corresponding player in previous state
-                        prev_player = next(
-                            (p for p in state0["players"] if p["id"] == player_id), None
-                        )
-
-                        if prev_player and self.world:
-                            # Interpolate position
-                            pos = self.lerp_vec3(
-                                prev_player["position"], player_data["position"], t
-                            )
-
-                            # Update or create remote car
-                            if player_id not in self.world.other_cars:
-                                self.world.add_car(
-                                    player_id, pos, player_data["rotation"]
-                                )
-                            else:
-                                self.world.other_cars[player_id].set_position(pos)
-
-    def lerp_vec3(self, a, b, t):
-        """Linear interpolation between two 3D vectors."""
-        return [
-            a[0] + (b[0] - a[0]) * t,
-            a[1] + (b[1] - a[1]) * t,
-            a[2] + (b[2] - a[2]) * t,
-        ]
-
-    def disconnect(self):
-        """Disconnect from server."""
+        ids, positions, yaws = sample
+        for player_id, pos, yaw in zip(ids, positions.tolist(), yaws.tolist()):
+            # Skip local player
+            if player_id == self.player_id:
+                continue
+
+            # Update or create remote car
+            car = self.world.other_cars.get(player_id)
+            if car is None:
+                self.world.add_car(player_id, pos, (0.0, yaw, 0.0))
+            else:
+                car.set_position(pos)
+                car.set_rotation((0.0, yaw, 0.0))
+
+    def disconnect(self, timeout=1.0):
+        """Disconnect from server and stop the network thread."""
         self.running = False
+        self.connected = False
+        if not self.network.running:
+            return
         if self.websocket:
-            asyncio.create_task(self.websocket.close())
+            try:
+                self.network.submit(self.websocket.close()).result(timeout)
+            except Exception as e:
+                print(f"Error closing connection: {e}")
+        self.network.stop(timeout)
@@ -0,0 +1,112 @@
+"""Client estimate of the server clock.
+
+Server time is the server's monotonic clock: snapshot timestamps are the
+scheduled time of their tick on it. Clients ping with their own clock
+reading ``t0``; the server answers with its clock ``t1``; the client
+receives the answer at ``t3``. Each exchange gives a round trip
+``t3 - t0`` and an offset ``t1 - (t0 + t3) / 2`` whose error is at most
+half the round trip, so the sample with the lowest round trip in a recent
+window is trusted. The clock slews toward that offset gradually, so
+estimated server time keeps moving forward smoothly, and only jumps when
+the error is large (first sync, or a reconnect to another server).
+"""
+
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from game import config
+from game.net.messages import PingMessage
+
+
+class ClockSync:
+    """Filtered server clock offset and round-trip estimate."""
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        samples=config.CLOCK_SYNC_SAMPLES,
+    ):
+        """Initialize unsynchronized, reading local time from ``clock``."""
+        self.clock = clock
+        self.samples = deque(maxlen=samples)  # (rtt, offset)
+        self.offset: Optional[float] = None  # Server time minus local time
+        self.target_offset = 0.0
+        self.rtt: Optional[float] = None
+        self.last_slew: Optional[float] = None
+        self.next_ping = 0.0
+
+    @property
+    def synced(self) -> bool:
+        """Check if at least one ping has been answered."""
+        return bool(self.samples)
+
+    def reset(self):
+        """Forget every estimate, e.g. after connecting to another server."""
+        self.samples.clear()
+        self.offset = None
+        self.target_offset = 0.0
+        self.rtt = None
+        self.last_slew = None
+        self.next_ping = 0.0
+
+    def ping_due(self, now=None) -> bool:
+        """Check if a ping should be sent; pings are rapid until the window fills."""
+        now = self.clock() if now is None else now
+        if now < self.next_ping:
+            return False
+        full = len(self.samples) == self.samples.maxlen
+        interval = config.CLOCK_SYNC_INTERVAL if full else config.CLOCK_SYNC_BURST_INTERVAL
+        self.next_ping = now + interval
+        return True
+
+    def build_ping(self) -> PingMessage:
+        """Build a ping stamped with the local clock."""
+        return PingMessage(client_time=self.clock())
+
+    def handle_pong(self, msg_data, now=None):
+        """Add the sample from a pong and retarget the offset."""
+        now = self.clock() if now is None else now
+        sent = msg_data["client_time"]
+        rtt = now - sent
+        if rtt < 0:
+            return
+        self.samples.append((rtt, msg_data["server_time"] - (sent + now) / 2))
+
+        self.rtt, self.target_offset = min(self.samples)
+        if (
+            self.offset is None
+            or abs(self.target_offset - self.offset) > config.CLOCK_STEP_THRESHOLD
+        ):
+            self.offset = self.target_offset
+            self.last_slew = now
+
+    def observe_snapshot(self, server_time, now=None):
+        """Seed a rough offset from a snapshot until the first pong arrives.
+
+        The seed runs late by the one-way latency; pongs correct it.
+        """
+        if self.offset is None:
+            now = self.clock() if now is None else now
+            self.offset = self.target_offset = server_time - now
+            self.last_slew = now
+
+    def to_server_time(self, local_time) -> Optional[float]:
+        """Convert a local clock reading with the current offset, without slewing."""
+        if self.offset is None:
+            return None
+        return local_time + self.offset
+
+    def server_time(self, now=None) -> Optional[float]:
+        """Get the estimated server time, or None before any estimate."""
+        now = self.clock() if now is None else now
+        if self.offset is None:
+            return None
+
+        # Slew toward the target so estimated time never jumps or runs backwards
+        elapsed = max(0.0, now - self.last_slew)
+        self.last_slew = now
+        step = elapsed * config.CLOCK_SLEW_RATE
+        error = self.target_offset - self.offset
+        self.offset += max(-step, min(step, error))
+        return now + self.offset
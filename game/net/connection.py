@@ -0,0 +1,152 @@
+"""Per-client outbound queues with backpressure."""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from game import config
+
+
+class ClientConnection:
+    """Outbound side of a client connection.
+
+    Messages are queued without awaiting the socket and a dedicated writer
+    task drains them, so a slow client never holds up the game tick.
+    Reliable messages (chat, results, lobby updates) are always delivered
+    in order. Snapshots are droppable: only the newest unsent one is kept.
+    A client whose backlog stays above the high-water mark for too long is
+    disconnected.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        max_queue=config.SEND_QUEUE_SIZE,
+        high_water=config.SEND_HIGH_WATER,
+        high_water_timeout=config.SEND_HIGH_WATER_TIMEOUT,
+        metrics=None,
+    ):
+        """Initialize queues for ``websocket``."""
+        self.websocket = websocket
+        self.metrics = metrics
+        self.label = ""  # Player ID once joined, used to label metrics
+        # Datagram sessions send snapshots unreliably; WebSockets have one channel
+        self.send_droppable = getattr(websocket, "send_unreliable", websocket.send)
+        self.max_queue = max_queue
+        self.high_water = high_water
+        self.high_water_timeout = high_water_timeout
+
+        self.reliable = deque()
+        self.snapshot: Optional[bytes] = None
+        self.superseded = 0  # Snapshots replaced since the last successful send
+        self.closed = False
+        self.close_reason = ""
+
+        # Statistics
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.dropped_snapshots = 0
+
+        self._high_water_since: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def backlog(self) -> int:
+        """Get how far behind the writer is, in messages."""
+        return len(self.reliable) + (1 if self.snapshot is not None else 0) + self.superseded
+
+    def start(self):
+        """Start the writer task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    def send(self, data: bytes, droppable=False) -> bool:
+        """Queue a message without waiting for the socket.
+
+        Returns False if the connection is closed (or was just closed for
+        falling too far behind).
+        """
+        if self.closed:
+            return False
+
+        if droppable:
+            if self.snapshot is not None:
+                self.snapshot = None
+                self.superseded += 1
+                self.dropped_snapshots += 1
+            self.snapshot = data
+        else:
+            if len(self.reliable) >= self.max_queue:
+                self.close("send queue overflow")
+                return False
+            self.reliable.append(data)
+
+        self._check_high_water()
+        if self.closed:
+            return False
+
+        self._wakeup.set()
+        return True
+
+    def _check_high_water(self):
+        """Disconnect clients that stay over the high-water mark."""
+        if self.backlog <= self.high_water:
+            self._high_water_since = None
+            return
+
+        now = time.monotonic()
+        if self._high_water_since is None:
+            self._high_water_since = now
+        elif now - self._high_water_since >= self.high_water_timeout:
+            self.close("send queue over high-water mark")
+
+    async def _writer(self):
+        """Drain queued messages to the socket."""
+        try:
+            while not self.closed:
+                if self.reliable:
+                    data = self.reliable.popleft()
+                    await self.websocket.send(data)
+                elif self.snapshot is not None:
+                    data = self.snapshot
+                    self.snapshot = None
+                    await self.send_droppable(data)
+                else:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                self.sent_messages += 1
+                self.sent_bytes += len(data)
+                self.superseded = 0
+                if self.metrics and self.label:
+                    self.metrics.record_sent(self.label, data)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if not self.closed:
+                self.close(f"send failed: {e}")
+
+    async def flush(self, timeout=1.0):
+        """Wait until everything queued has been written (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while self.backlog and not self.closed and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    def close(self, reason=""):
+        """Stop the writer and close the socket."""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self.reliable.clear()
+        self.snapshot = None
+
+        if reason:
+            print(f"Closing connection {self.websocket.remote_address}: {reason}")
+
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        asyncio.ensure_future(self.websocket.close())
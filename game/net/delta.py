@@ -0,0 +1,115 @@
+"""Delta compression of state snapshots against acknowledged baselines.
+
+A snapshot is a map of entity id to entity fields. The server remembers what
+it sent each client under a sequence number; once the client acks a
+sequence, later snapshots only carry the entities and fields that changed
+since that baseline. Clients keep the same history so they can rebuild the
+full state from any delta whose baseline they acked.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from game import config
+
+Entities = Dict[str, Dict[str, Any]]
+
+
+class SnapshotHistory:
+    """Bounded map of snapshot sequence number to entity state."""
+
+    def __init__(self, size=config.SNAPSHOT_HISTORY_SIZE):
+        """Initialize an empty history holding up to ``size`` snapshots."""
+        self.size = size
+        self.snapshots: "OrderedDict[int, Entities]" = OrderedDict()
+
+    def __len__(self):
+        """Get number of stored snapshots."""
+        return len(self.snapshots)
+
+    def store(self, seq: int, entities: Entities):
+        """Record the state sent (or received) as ``seq``."""
+        self.snapshots[seq] = entities
+        while len(self.snapshots) > self.size:
+            self.snapshots.popitem(last=False)
+
+    def get(self, seq: int) -> Optional[Entities]:
+        """Get the state for ``seq`` if it is still in the window."""
+        return self.snapshots.get(seq)
+
+    def latest_seq(self) -> int:
+        """Get the newest stored sequence number, or -1."""
+        return next(reversed(self.snapshots), -1)
+
+    def clear(self):
+        """Forget all snapshots."""
+        self.snapshots.clear()
+
+
+def index_entities(players: List[Dict[str, Any]]) -> Entities:
+    """Index a snapshot's player list by id."""
+    return {player["id"]: player for player in players}
+
+
+def encode_delta(
+    baseline: Optional[Entities], current: Entities, cache: Optional[Dict[tuple, tuple]] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Encode ``current`` against ``baseline``.
+
+    Returns ``(players, removed)``: entities that are new or changed, each
+    holding its id plus only the fields that differ, and the ids of entities
+    that are gone. Without a baseline every entity is sent in full.
+
+    Entity dicts are shared between clients' views, so when encoding for
+    many clients in one pass, ``cache`` memoizes per-entity diffs by the
+    identity of the (baseline, current) dict pair.
+    """
+    if baseline is None:
+        return list(current.values()), []
+
+    players = []
+    for entity_id, entity in current.items():
+        base = baseline.get(entity_id)
+        if base is entity:
+            continue
+        if base is None:
+            players.append(entity)
+            continue
+
+        key = (id(base), id(entity))
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            changed = cached[2]
+        else:
+            changed = {k: v for k, v in entity.items() if base.get(k) != v}
+            if changed:
+                changed["id"] = entity_id
+            if cache is not None:
+                # Hold the pair so their ids cannot be reused mid-pass
+                cache[key] = (base, entity, changed)
+        if changed:
+            players.append(changed)
+
+    removed = [entity_id for entity_id in baseline if entity_id not in current]
+    return players, removed
+
+
+def apply_delta(
+    baseline: Optional[Entities], players: List[Dict[str, Any]], removed: List[str]
+) -> Entities:
+    """Rebuild the full entity state from a baseline and a delta."""
+    entities = {}
+    if baseline:
+        removed_ids = set(removed)
+        entities = {
+            entity_id: entity
+            for entity_id, entity in baseline.items()
+            if entity_id not in removed_ids
+        }
+
+    for changed in players:
+        entity_id = changed["id"]
+        base = entities.get(entity_id)
+        entities[entity_id] = {**base, **changed} if base else dict(changed)
+
+    return entities
@@ -0,0 +1,123 @@
+"""Per-player input jitter buffer.
+
+Clients stamp every input with the client tick it was sampled on and send
+the last few inputs in each packet, so the server sees most ticks several
+times. The buffer drops duplicates and stale ticks, holds a small backlog
+to absorb network jitter and hands the simulation exactly one input per
+tick, repeating the last one when the client's input runs dry.
+"""
+
+from typing import Dict, Optional
+
+from game import config
+from game.core.simulation import CarInput
+
+
+class InputJitterBuffer:
+    """Tick-ordered input queue consumed once per simulation tick."""
+
+    def __init__(self, size=config.MAX_PENDING_INPUTS, depth=config.INPUT_BUFFER_DEPTH):
+        """Initialize an empty buffer holding up to ``size`` ticks."""
+        self.size = size
+        self.depth = min(depth, size)
+        self.inputs: Dict[int, CarInput] = {}
+        self.last_input = CarInput()
+        self.last_tick = -1  # Client tick of the input consumed last
+        self.newest_tick = -1  # Highest client tick received
+        self.started = False
+        self.prefill_ticks = 0
+
+        # Statistics
+        self.received = 0
+        self.duplicates = 0
+        self.late = 0
+        self.underruns = 0
+        self.overflows = 0
+
+    def __len__(self):
+        """Get number of buffered inputs."""
+        return len(self.inputs)
+
+    def push(self, tick: Optional[int], car_input: CarInput) -> bool:
+        """Buffer the input sampled on client ``tick``.
+
+        Returns False for duplicates and for ticks already simulated. A tick
+        of None (an unstamped input) is queued after the newest one.
+        """
+        if tick is None:
+            tick = max(self.newest_tick, self.last_tick) + 1
+
+        if tick in self.inputs:
+            self.duplicates += 1
+            return False
+        if tick <= self.last_tick:
+            # Either a redundant copy of a consumed input or one that
+            # arrived after its tick was simulated with a repeat
+            if self.last_tick - tick > self.size * 4:
+                # Client restarted its tick counter
+                self.reset()
+            else:
+                self.late += 1
+                return False
+
+        self.inputs[tick] = car_input
+        self.newest_tick = max(self.newest_tick, tick)
+        self.received += 1
+
+        # Keep latency bounded if the client runs ahead of the server
+        while len(self.inputs) > self.size:
+            oldest = min(self.inputs)
+            del self.inputs[oldest]
+            self.last_tick = max(self.last_tick, oldest)
+            self.overflows += 1
+
+        return True
+
+    def pop(self) -> CarInput:
+        """Get the input to simulate this tick (repeats the last on underrun)."""
+        if not self.started:
+            # Build up the jitter backlog before consuming, but never hold
+            # a trickle of inputs back for longer than the backlog would
+            if not self.inputs:
+                return self.last_input
+            self.prefill_ticks += 1
+            if len(self.inputs) < self.depth and self.prefill_ticks < self.depth:
+                return self.last_input
+            self.started = True
+            self.prefill_ticks = 0
+            self.last_tick = min(self.inputs) - 1
+
+        if not self.inputs:
+            # Inputs stopped arriving; rebuffer before consuming again
+            self.started = False
+            self.underruns += 1
+            return self.last_input
+
+        tick = self.last_tick + 1
+        self.last_tick = tick
+        car_input = self.inputs.pop(tick, None)
+        if car_input is None:
+            # Lost in every redundant copy; later ticks are already here
+            self.underruns += 1
+            return self.last_input
+
+        self.last_input = car_input
+        return car_input
+
+    def release(self):
+        """Let go of the controls: drop queued inputs and repeat a neutral one.
+
+        The tick history is kept, so a resumed client's inputs carry on.
+        """
+        self.inputs.clear()
+        self.last_input = CarInput()
+        self.started = False
+        self.prefill_ticks = 0
+
+    def reset(self):
+        """Forget buffered inputs and tick history."""
+        self.inputs.clear()
+        self.last_tick = -1
+        self.newest_tick = -1
+        self.started = False
+        self.prefill_ticks = 0
@@ -0,0 +1,153 @@
+"""Spatial interest management for per-client snapshot filtering."""
+
+import math
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from game import config
+from game.net.rate_control import DETAIL_FULL
+
+
+class SpatialGrid:
+    """Uniform grid over the XZ plane bucketing entity ids by position."""
+
+    def __init__(self, cell_size=config.INTEREST_NEAR_RADIUS):
+        """Initialize an empty grid."""
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.positions = np.zeros((0, 3))
+
+    def rebuild(self, ids: List[str], positions: np.ndarray):
+        """Re-bucket every entity from its current position."""
+        self.cells.clear()
+        self.ids = ids
+        self.rows = {entity_id: row for row, entity_id in enumerate(ids)}
+        self.positions = positions
+
+        if not ids:
+            return
+
+        cells = np.floor(positions[:, [0, 2]] / self.cell_size).astype(np.int64)
+        for entity_id, (cx, cz) in zip(ids, cells.tolist()):
+            self.cells[(cx, cz)].append(entity_id)
+
+    def query(self, position, radius) -> List[str]:
+        """Get ids in every cell overlapping a circle (a superset of the circle)."""
+        x, z = position[0], position[2]
+        reach = math.ceil(radius / self.cell_size)
+        cx = math.floor(x / self.cell_size)
+        cz = math.floor(z / self.cell_size)
+
+        found = []
+        if (2 * reach + 1) ** 2 > len(self.cells):
+            # Wide queries over a sparse grid visit the occupied cells instead
+            for (bx, bz), bucket in self.cells.items():
+                if abs(bx - cx) <= reach and abs(bz - cz) <= reach:
+                    found.extend(bucket)
+            return found
+
+        for dx in range(-reach, reach + 1):
+            for dz in range(-reach, reach + 1):
+                bucket = self.cells.get((cx + dx, cz + dz))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+
+class InterestManager:
+    """Decides which entities each client hears about, and how often.
+
+    Entities within ``near_radius`` of the viewer are sent in every
+    snapshot. Entities out to ``cutoff`` are refreshed every
+    ``far_interval`` snapshots (staggered per viewer) and otherwise carried
+    over unchanged from the last view sent, less often for viewers whose
+    snapshot rate lowered their detail level. Entities beyond the cutoff
+    are removed from the client's view until they come back into range.
+    """
+
+    def __init__(
+        self,
+        near_radius=config.INTEREST_NEAR_RADIUS,
+        cutoff=config.INTEREST_CUTOFF,
+        far_interval=config.INTEREST_FAR_INTERVAL,
+    ):
+        """Initialize relevance radii and rates."""
+        self.near_radius = near_radius
+        self.cutoff = cutoff
+        self.far_interval = max(1, far_interval)
+        self.grid = SpatialGrid(max(1.0, near_radius))
+
+    def update(self, players):
+        """Rebuild the spatial index from the room's players."""
+        players = list(players)
+        ids = [player.id for player in players]
+        if players:
+            cars = players[0].cars
+            positions = cars.position[[player.slot for player in players]]
+        else:
+            positions = np.zeros((0, 3))
+        self.grid.rebuild(ids, positions)
+
+    def near(self, position) -> Set[str]:
+        """Get ids within the full-rate radius of ``position``."""
+        candidates = self.grid.query(position, self.near_radius)
+        if not candidates:
+            return set()
+
+        rows = [self.grid.rows[entity_id] for entity_id in candidates]
+        offsets = self.grid.positions[rows] - np.asarray(position)
+        within = np.einsum("ij,ij->i", offsets, offsets) <= self.near_radius**2
+        return {entity_id for entity_id, keep in zip(candidates, within.tolist()) if keep}
+
+    def in_range(self, position) -> Set[str]:
+        """Get ids within the cutoff distance of ``position``."""
+        candidates = self.grid.query(position, self.cutoff)
+        if not candidates:
+            return set()
+
+        rows = [self.grid.rows[entity_id] for entity_id in candidates]
+        offsets = self.grid.positions[rows] - np.asarray(position)
+        within = np.einsum("ij,ij->i", offsets, offsets) <= self.cutoff**2
+        return {entity_id for entity_id, keep in zip(candidates, within.tolist()) if keep}
+
+    def far_update_due(self, viewer, snapshot_count) -> bool:
+        """Check if a viewer's distant entities are refreshed this snapshot.
+
+        Viewers on reduced detail (weak links) refresh them less often.
+        """
+        interval = self.far_interval * (1 + DETAIL_FULL - viewer.rate.detail)
+        return (snapshot_count + viewer.slot) % interval == 0
+
+    def build_view(self, viewer, baseline, current, snapshot_count):
+        """Build the entity state a viewer should hold after this snapshot.
+
+        ``baseline`` is the viewer's acked view (or None) and ``current``
+        the room's full entity state. The result feeds ``encode_delta``.
+
+        Far entities are carried from the newest view sent rather than the
+        baseline: acks trail sends, and a refresh the client has not acked
+        yet must not be rolled back to the older baseline state.
+        """
+        position = viewer.position
+
+        if baseline is None or self.far_update_due(viewer, snapshot_count):
+            # Refresh everything in range, drop everything beyond the cutoff
+            visible = self.in_range(position)
+            visible.add(viewer.id)
+            return {entity_id: current[entity_id] for entity_id in visible if entity_id in current}
+
+        # Keep far entities at their last sent state, refresh nearby ones
+        history = viewer.snapshot_history
+        sent = history.get(history.latest_seq())
+        if sent is None:
+            sent = baseline
+        view = {entity_id: entity for entity_id, entity in sent.items() if entity_id in current}
+        for entity_id in self.near(position):
+            if entity_id in current:
+                view[entity_id] = current[entity_id]
+        view[viewer.id] = current[viewer.id]
+        return view
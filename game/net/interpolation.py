@@ -0,0 +1,240 @@
+"""Client-side snapshot buffer for interpolating remote cars.
+
+Each snapshot is stored as arrays indexed by row, plus an id-to-row map,
+so a frame does not walk player dicts. The two snapshots around the render
+time are found by bisection on their server timestamps. Rows are aligned
+once per snapshot pair (30 times a second, not every frame), so each frame
+moves every remote car with a handful of NumPy operations.
+
+Between snapshots, positions follow a cubic Hermite curve with the
+velocities the server sends as tangents, and yaw does the same with the
+yaw rate between consecutive snapshots. Past the newest snapshot (a late
+or lost packet) cars are dead reckoned from it for at most
+``EXTRAPOLATION_LIMIT`` seconds. When real data replaces a guess, the
+difference becomes a per-car visual offset that decays over
+``ERROR_SMOOTHING_TIME``, so cars glide back instead of snapping.
+"""
+
+import bisect
+import math
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game import config
+
+
+def wrap_degrees(angle):
+    """Wrap angles (scalar or array) to [-180, 180)."""
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+class BufferedSnapshot:
+    """One decoded snapshot's players as id-indexed arrays."""
+
+    __slots__ = (
+        "timestamp",
+        "tick",
+        "received",
+        "ids",
+        "index",
+        "position",
+        "yaw",
+        "velocity",
+        "yaw_rate",
+    )
+
+    def __init__(self, timestamp: float, players: Sequence[dict], tick=0, received=None):
+        """Convert decoded player dicts to arrays; ``received`` is the local arrival time."""
+        self.timestamp = timestamp
+        self.tick = tick
+        self.received = received
+        self.ids: List[str] = [p["id"] for p in players]
+        self.index: Dict[str, int] = {player_id: row for row, player_id in enumerate(self.ids)}
+        count = len(players)
+        self.position = np.array([p["position"] for p in players], dtype=np.float64).reshape(
+            count, 3
+        )
+        self.yaw = np.array([p["rotation"][1] for p in players], dtype=np.float64)
+        self.velocity = np.array(
+            [p.get("velocity", (0.0, 0.0, 0.0)) for p in players], dtype=np.float64
+        ).reshape(count, 3)
+        self.yaw_rate = np.zeros(count)  # Degrees per second, set once buffered
+
+    def extrapolate(self, render_time, limit=config.EXTRAPOLATION_LIMIT):
+        """Dead reckon positions and yaws to ``render_time``, at most ``limit`` ahead."""
+        dt = min(render_time - self.timestamp, limit)
+        return self.position + self.velocity * dt, self.yaw + self.yaw_rate * dt
+
+
+def match_rows(index: Dict[str, int], ids: List[str]):
+    """Get the ``ids`` also in ``index``, their rows there and their rows in ``ids``."""
+    common, rows_old, rows = [], [], []
+    for row, player_id in enumerate(ids):
+        previous = index.get(player_id)
+        if previous is not None:
+            common.append(player_id)
+            rows_old.append(previous)
+            rows.append(row)
+    return common, np.array(rows_old, int), np.array(rows, int)
+
+
+class SnapshotBuffer:
+    """Recent snapshots ordered by server time."""
+
+    def __init__(
+        self,
+        capacity=config.SNAPSHOT_BUFFER_SIZE,
+        extrapolation_limit=config.EXTRAPOLATION_LIMIT,
+        smoothing_time=config.ERROR_SMOOTHING_TIME,
+        snap_distance=config.ERROR_SNAP_DISTANCE,
+    ):
+        """Initialize an empty buffer keeping the newest ``capacity`` snapshots."""
+        self.snapshots = deque(maxlen=capacity)
+        self.times = deque(maxlen=capacity)
+        self.pair = None  # (older, newer, ids, rows in older, rows in newer)
+        self.extrapolation_limit = extrapolation_limit
+        self.smoothing_time = smoothing_time
+        self.snap_distance = snap_distance
+
+        # Snapshot the previous frame dead reckoned from, if any
+        self.extrapolating_from: Optional[BufferedSnapshot] = None
+
+        # Visual error per car (x, y, z, yaw), rows following ``error_ids``
+        self.error_ids: List[str] = []
+        self.error_index: Dict[str, int] = {}
+        self.error = np.zeros((0, 4))
+        self.last_render_time: Optional[float] = None
+
+    def __len__(self):
+        """Get number of buffered snapshots."""
+        return len(self.snapshots)
+
+    def add(self, snapshot: BufferedSnapshot) -> bool:
+        """Append a snapshot; ones not newer than the last are dropped."""
+        if self.times and snapshot.timestamp <= self.times[-1]:
+            return False
+        if self.snapshots:
+            # Yaw rate from the previous snapshot drives yaw tangents and dead reckoning
+            previous = self.snapshots[-1]
+            _, rows_previous, rows = match_rows(previous.index, snapshot.ids)
+            turn = wrap_degrees(snapshot.yaw[rows] - previous.yaw[rows_previous])
+            snapshot.yaw_rate[rows] = turn / (snapshot.timestamp - previous.timestamp)
+        self.snapshots.append(snapshot)
+        self.times.append(snapshot.timestamp)
+        return True
+
+    def clear(self):
+        """Drop every snapshot and correction."""
+        self.snapshots.clear()
+        self.times.clear()
+        self.pair = None
+        self.extrapolating_from = None
+        self.error_ids = []
+        self.error_index = {}
+        self.error = np.zeros((0, 4))
+        self.last_render_time = None
+
+    def bracket(self, render_time) -> Optional[Tuple[BufferedSnapshot, BufferedSnapshot, float]]:
+        """Get the snapshots around ``render_time`` and the fraction between them.
+
+        Returns None when ``render_time`` is outside the buffered span.
+        """
+        if len(self.times) < 2 or not self.times[0] <= render_time <= self.times[-1]:
+            return None
+        i = min(bisect.bisect_right(self.times, render_time), len(self.times) - 1)
+        older, newer = self.snapshots[i - 1], self.snapshots[i]
+        return older, newer, (render_time - older.timestamp) / (newer.timestamp - older.timestamp)
+
+    def align(self, older: BufferedSnapshot, newer: BufferedSnapshot):
+        """Get ids present in both snapshots and their rows in each (cached per pair)."""
+        if not (self.pair and self.pair[0] is older and self.pair[1] is newer):
+            self.pair = (older, newer, *match_rows(older.index, newer.ids))
+        return self.pair[2:]
+
+    def hermite(self, older: BufferedSnapshot, newer: BufferedSnapshot, t):
+        """Get ids, positions and yaws on the Hermite curves between two snapshots."""
+        ids, rows_older, rows_newer = self.align(older, newer)
+        span = newer.timestamp - older.timestamp
+        t2 = t * t
+        t3 = t2 * t
+        h00 = 2 * t3 - 3 * t2 + 1
+        h10 = (t3 - 2 * t2 + t) * span
+        h01 = 3 * t2 - 2 * t3
+        h11 = (t3 - t2) * span
+
+        positions = (
+            h00 * older.position[rows_older]
+            + h10 * older.velocity[rows_older]
+            + h01 * newer.position[rows_newer]
+            + h11 * newer.velocity[rows_newer]
+        )
+        yaw = older.yaw[rows_older]
+        turn = wrap_degrees(newer.yaw[rows_newer] - yaw)  # The short way round
+        yaws = (
+            yaw + h10 * older.yaw_rate[rows_older] + h01 * turn + h11 * newer.yaw_rate[rows_newer]
+        )
+        return ids, positions, yaws
+
+    def sample(self, render_time) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+        """Get every remote car's displayed position and yaw at ``render_time``.
+
+        Inside the buffered span cars present on both sides follow the
+        Hermite curves; past the newest snapshot they are dead reckoned;
+        before the oldest they hold still. Returns ``(ids, positions,
+        yaws)`` with one row per id, or None when nothing is buffered.
+        """
+        if not self.snapshots:
+            return None
+
+        basis = None
+        found = self.bracket(render_time)
+        if found is not None:
+            ids, positions, yaws = self.hermite(*found)
+        elif render_time > self.times[-1]:
+            basis = self.snapshots[-1]
+            ids = basis.ids
+            positions, yaws = basis.extrapolate(render_time, self.extrapolation_limit)
+        else:
+            first = self.snapshots[0]
+            ids, positions, yaws = first.ids, first.position, first.yaw
+
+        self.realign_error(ids)
+        previous = self.extrapolating_from
+        if previous is not None and previous is not basis:
+            self.add_error(previous, render_time, ids, positions, yaws)
+        self.extrapolating_from = basis
+
+        if self.last_render_time is not None and render_time > self.last_render_time:
+            self.error *= math.exp(-(render_time - self.last_render_time) / self.smoothing_time)
+        self.last_render_time = render_time
+        return ids, positions + self.error[:, :3], yaws + self.error[:, 3]
+
+    def add_error(self, previous: BufferedSnapshot, render_time, ids, positions, yaws):
+        """Keep cars where the replaced guess from ``previous`` showed them.
+
+        Errors beyond ``snap_distance`` (respawns, teleports) snap instead.
+        """
+        guessed_positions, guessed_yaws = previous.extrapolate(
+            render_time, self.extrapolation_limit
+        )
+        _, rows_previous, rows = match_rows(previous.index, ids)
+        error = guessed_positions[rows_previous] - positions[rows]
+        error_yaw = wrap_degrees(guessed_yaws[rows_previous] - yaws[rows])
+        keep = np.linalg.norm(error, axis=1) <= self.snap_distance
+        self.error[rows[keep], :3] += error[keep]
+        self.error[rows[keep], 3] += error_yaw[keep]
+
+    def realign_error(self, ids: List[str]):
+        """Re-order the error rows to follow ``ids``, dropping departed cars."""
+        if ids is self.error_ids:
+            return
+        index = {player_id: row for row, player_id in enumerate(ids)}
+        error = np.zeros((len(ids), 4))
+        if self.error.any():
+            _, rows_old, rows = match_rows(self.error_index, ids)
+            error[rows] = self.error[rows_old]
+        self.error_ids = ids
+        self.error_index = index
+        self.error = error
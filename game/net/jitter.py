@@ -0,0 +1,122 @@
+"""Adaptive interpolation delay for the client's snapshot buffer.
+
+Remote cars are drawn at ``server time - delay``. They run out of buffered
+snapshots (an underrun, bridged by dead reckoning) whenever the render
+time passes the newest snapshot before the next one arrives. A snapshot
+stamped ``T`` that arrives at server time ``A``, after a previous one
+stamped ``T - gap``, was therefore only on time if ``delay >= (A - T) +
+gap``. Each arrival gives one such requirement. The delay is the quantile
+of recent requirements that leaves the target share of arrivals late.
+Jitter, loss (which widens the gap) and the snapshot rate are all
+accounted for without modelling them separately.
+
+Delay changes are applied by running playback slightly faster or slower
+(``INTERPOLATION_WARP``), never by jumping.
+"""
+
+import math
+from collections import deque
+from typing import Optional
+
+from game import config
+
+
+class AdaptiveDelay:
+    """Picks the smallest interpolation delay that keeps underruns rare."""
+
+    def __init__(
+        self,
+        target_underrun=config.INTERPOLATION_UNDERRUN_TARGET,
+        window=config.INTERPOLATION_DELAY_WINDOW,
+        min_delay=config.INTERPOLATION_DELAY_MIN,
+        max_delay=config.INTERPOLATION_DELAY_MAX,
+        warp=config.INTERPOLATION_WARP,
+    ):
+        """Initialize at the configured fixed delay until samples arrive."""
+        self.target_underrun = target_underrun
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.warp = warp
+        self.rate = config.SNAPSHOT_RATE
+        self.fallback = config.INTERPOLATION_DELAY
+        self.target = self.fallback
+        self.delay = self.fallback
+
+        # Delay each recent arrival needed, and recent snapshot timestamps
+        self.required = deque(maxlen=window)
+        self.timestamps = deque(maxlen=window)
+        self.last_age: Optional[float] = None
+
+        # Link estimates for the HUD and metrics
+        self.jitter = 0.0  # Mean deviation of arrival age between snapshots
+        self.loss = 0.0
+        self.underrun_rate = 0.0  # Share of render time spent dead reckoning
+        self.last_render: Optional[float] = None
+
+    def set_rate(self, rate):
+        """Follow a server change of the snapshot rate.
+
+        The requirements are kept, since the rate controller may change the
+        rate more often than enough new ones arrive; those measured at the
+        new rate replace them as they come. Loss is measured afresh from
+        the newest snapshot.
+        """
+        rate = max(1, rate)
+        if rate == self.rate:
+            return
+        self.rate = rate
+        self.fallback = config.INTERPOLATION_DELAY * config.SNAPSHOT_RATE / rate
+        while len(self.timestamps) > 1:
+            self.timestamps.popleft()
+        self.retarget()
+
+    def on_snapshot(self, timestamp, arrival):
+        """Record a snapshot stamped ``timestamp`` that arrived at server time ``arrival``."""
+        if self.timestamps and timestamp <= self.timestamps[-1]:
+            return
+        age = arrival - timestamp
+        if self.timestamps:
+            self.required.append(age + timestamp - self.timestamps[-1])
+            self.jitter += (abs(age - self.last_age) - self.jitter) / 16
+        self.timestamps.append(timestamp)
+        self.last_age = age
+
+        span = self.timestamps[-1] - self.timestamps[0]
+        if span > 0:
+            expected = span * self.rate
+            self.loss = max(0.0, 1.0 - (len(self.timestamps) - 1) / expected)
+        self.retarget()
+
+    def retarget(self):
+        """Pick the target delay from the recent requirements."""
+        if len(self.required) < config.INTERPOLATION_DELAY_MIN_SAMPLES:
+            target = self.fallback
+        else:
+            ordered = sorted(self.required)
+            rank = math.ceil((1.0 - self.target_underrun) * len(ordered)) - 1
+            target = ordered[max(0, rank)] + config.INTERPOLATION_DELAY_MARGIN
+        self.target = max(self.min_delay, min(self.max_delay, target))
+
+    def advance(self, server_time, underrun=False) -> float:
+        """Move the delay toward the target and get the delay for this frame.
+
+        ``underrun`` tells whether the previous frame was dead reckoned.
+        """
+        if self.last_render is not None:
+            dt = max(0.0, server_time - self.last_render)
+            step = self.warp * dt
+            self.delay += max(-step, min(step, self.target - self.delay))
+            weight = min(1.0, dt / config.INTERPOLATION_UNDERRUN_AVERAGING)
+            self.underrun_rate += (float(underrun) - self.underrun_rate) * weight
+        self.last_render = server_time
+        return self.delay
+
+    def reset(self):
+        """Forget every measurement, e.g. after joining another server."""
+        self.required.clear()
+        self.timestamps.clear()
+        self.last_age = None
+        self.last_render = None
+        self.jitter = self.loss = self.underrun_rate = 0.0
+        self.retarget()
+        self.delay = self.target
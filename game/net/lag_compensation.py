@@ -0,0 +1,115 @@
+"""Per-tick car position history for lag-compensated hit checks.
+
+Clients render other cars in the past: the newest snapshot they hold, minus
+the interpolation delay. To judge what a client could see, the server keeps
+every car slot's position for the last ``LAG_COMPENSATION_WINDOW`` seconds
+in a fixed NumPy ring and rewinds to the client's view tick.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from game import config
+
+# How far behind the newest acked snapshot clients render remote cars
+INTERPOLATION_TICKS = round(config.INTERPOLATION_DELAY * config.TICKRATE)
+
+
+class StateHistory:
+    """Ring buffer of car slot positions, one row per simulation tick."""
+
+    def __init__(
+        self,
+        size=round(config.LAG_COMPENSATION_WINDOW * config.TICKRATE),
+        slots=config.MAX_PLAYERS,
+    ):
+        """Initialize an empty history of ``size`` ticks."""
+        self.size = max(2, size)
+        self.ticks = np.full(self.size, -1, dtype=np.int64)
+        self.positions = np.zeros((self.size, slots, 3), dtype=np.float32)
+        self.active = np.zeros((self.size, slots), dtype=bool)
+        self.first_tick = -1
+        self.newest_tick = -1
+
+    def __len__(self):
+        """Get number of recorded ticks still in the window."""
+        return int(np.count_nonzero(self.ticks >= 0))
+
+    @property
+    def oldest_tick(self) -> int:
+        """Get the oldest tick still held, or -1."""
+        if self.newest_tick < 0:
+            return -1
+        return max(self.newest_tick - self.size + 1, self.first_tick)
+
+    def record(self, tick: int, cars):
+        """Record every slot's position after simulating ``tick``."""
+        if cars.capacity > self.positions.shape[1]:
+            self._grow(cars.capacity)
+
+        row = tick % self.size
+        count = cars.capacity
+        self.ticks[row] = tick
+        self.positions[row, :count] = cars.position
+        self.positions[row, count:] = 0.0
+        self.active[row, :count] = cars.active
+        self.active[row, count:] = False
+        if self.first_tick < 0:
+            self.first_tick = tick
+        self.newest_tick = tick
+
+    def _grow(self, slots):
+        """Widen the history to ``slots`` car slots."""
+        positions = np.zeros((self.size, slots, 3), dtype=np.float32)
+        active = np.zeros((self.size, slots), dtype=bool)
+        old = self.positions.shape[1]
+        positions[:, :old] = self.positions
+        active[:, :old] = self.active
+        self.positions = positions
+        self.active = active
+
+    def clamp(self, tick: int) -> int:
+        """Clamp ``tick`` into the recorded window."""
+        return min(max(tick, self.oldest_tick), self.newest_tick)
+
+    def row(self, tick: int) -> Optional[int]:
+        """Get the ring row holding ``tick``, if it is still recorded."""
+        row = tick % self.size
+        if tick < 0 or self.ticks[row] != tick:
+            return None
+        return row
+
+    def rewind(self, tick: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get ``(positions, active)`` of every slot at ``tick`` (clamped to the window)."""
+        row = self.row(self.clamp(tick))
+        if row is None:
+            slots = self.positions.shape[1]
+            return np.zeros((slots, 3), dtype=np.float32), np.zeros(slots, dtype=bool)
+        return self.positions[row], self.active[row]
+
+    def segment(self, tick: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get ``(start, end, active)`` positions of every slot across ``tick``.
+
+        ``start`` is the position after the previous tick (or ``end`` if that
+        tick is not recorded), so fast cars cannot skip over small targets.
+        """
+        end, active = self.rewind(tick)
+        row = self.row(tick - 1)
+        if row is None:
+            return end, end, active
+        start = np.where(self.active[row][:, None], self.positions[row], end)
+        return start, end, active
+
+
+def segment_hits_sphere(start, end, center, radius) -> np.ndarray:
+    """Check which segments ``start[i] -> end[i]`` pass within ``radius`` of ``center``."""
+    start = np.asarray(start, dtype=np.float64)
+    direction = np.asarray(end, dtype=np.float64) - start
+    offset = np.asarray(center, dtype=np.float64) - start
+
+    length_sq = (direction * direction).sum(axis=-1)
+    t = (offset * direction).sum(axis=-1) / np.where(length_sq > 0, length_sq, 1.0)
+    np.clip(t, 0.0, 1.0, out=t)
+    miss = direction * t[..., None] - offset
+    return (miss * miss).sum(axis=-1) < radius**2
@@ -0,0 +1,598 @@
+"""Headless bot clients for load-testing a game server on localhost.
+
+Each bot speaks the real client protocol: it joins a room (following
+redirects), samples a scripted input every tick, sends the newest inputs
+redundantly at the input send rate and decodes every snapshot, acking it
+so the server keeps delta-encoding. Bots run in one or more processes and
+record, inside a shared measurement window:
+
+- snapshot inter-arrival times, for jitter
+- input-to-snapshot latency: from sending an input tick until a snapshot
+  reports that tick as simulated (``input_tick``)
+- bytes and messages in and out
+
+Server CPU time, tick durations and bytes sent come from the server's
+metrics endpoint, scraped at both ends of the window.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import time
+import urllib.request
+import zlib
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import websockets
+
+from game import config
+from game.core.simulation import CarInput
+from game.net.delta import SnapshotHistory, apply_delta
+from game.net.messages import InputMessage, JoinMessage, deserialize_message, serialize_message
+from game.net.supervisor import worker_port
+from game.net.transport import connect_datagram
+
+LINGER = 1.0
+RESULTS_TIMEOUT = 10.0  # Seconds after the bots leave for their processes to report
+
+
+class BotClient:
+    """One scripted headless client."""
+
+    def __init__(
+        self,
+        host,
+        port,
+        name,
+        room_id="",
+        transport=config.NETWORK_TRANSPORT,
+        codec=config.SNAPSHOT_CODEC,
+        input_rate=config.INPUT_SEND_RATE,
+        window=(0.0, math.inf),
+    ):
+        """Initialize a bot that records samples during wall-clock ``window``."""
+        self.host = host
+        self.port = port
+        self.name = name
+        self.room_id = room_id
+        self.transport = transport
+        self.codec = codec
+        self.ticks_per_packet = max(1, config.TICKRATE // max(1, input_rate))
+        self.window_start, self.window_end = window
+        self.socket = None
+        self.player_id: Optional[str] = None
+        self.error = ""
+
+        # Inputs are stamped with a client tick and resent redundantly
+        self.input_tick = 0
+        self.input_history = deque(maxlen=config.INPUT_REDUNDANCY)
+        self.sent_at = deque()  # (tick, monotonic time first sent)
+        self.phase = (zlib.crc32(name.encode()) % 628) / 100.0
+
+        # Delta decoding
+        self.snapshot_history = SnapshotHistory()
+        self.last_snapshot_seq = -1
+        self.received = 0
+        self.last_input_tick = -1
+        self.last_arrival: Optional[float] = None
+
+        # Samples and counters
+        self.interarrivals: List[float] = []
+        self.latencies: List[float] = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.snapshots = 0
+        self.redirects = 0
+
+    def in_window(self) -> bool:
+        """Check if samples taken now belong to the measurement window."""
+        return self.window_start <= time.time() < self.window_end
+
+    async def connect(self) -> bool:
+        """Open a transport and join, following worker redirects."""
+        try:
+            for _ in range(4):
+                self.socket = await self.open_transport()
+                join = JoinMessage(player_name=self.name, room_id=self.room_id, codec=self.codec)
+                await self.socket.send(serialize_message("join", join))
+                message = deserialize_message(await asyncio.wait_for(self.socket.recv(), 5.0))
+
+                if message["type"] == "join_response":
+                    self.player_id = message["data"]["player_id"]
+                    return True
+                await self.socket.close()
+                if message["type"] != "redirect":
+                    self.error = message["data"].get("reason", message["type"])
+                    return False
+                self.port = message["data"]["port"]
+                self.room_id = message["data"]["room_id"]
+                self.redirects += 1
+            self.error = "too many redirects"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        return False
+
+    async def open_transport(self):
+        """Open a datagram session or WebSocket, like the game client."""
+        if self.transport in ("auto", "udp"):
+            try:
+                return await connect_datagram(self.host, self.port)
+            except (OSError, TimeoutError):
+                if self.transport == "udp":
+                    raise
+        return await websockets.connect(f"ws://{self.host}:{self.port}")
+
+    def script(self, tick) -> CarInput:
+        """Get the scripted input for ``tick``: full throttle, weaving, periodic boosts."""
+        t = tick / config.TICKRATE
+        return CarInput(
+            throttle=1.0,
+            steer=0.6 * math.sin(0.5 * t + self.phase),
+            boost=(t + self.phase) % 8.0 < 1.0,
+        )
+
+    def build_input_message(self) -> InputMessage:
+        """Build an input packet carrying the newest input and its predecessors."""
+        tick, car_input = self.input_history[-1]
+        return InputMessage(
+            player_id=self.player_id,
+            throttle=car_input.throttle,
+            steer=car_input.steer,
+            brake=car_input.brake,
+            handbrake=car_input.handbrake,
+            boost=car_input.boost,
+            timestamp=time.time(),
+            ack=self.last_snapshot_seq,
+            received=self.received,
+            tick=tick,
+            inputs=[
+                [t, i.throttle, i.steer, i.brake, i.handbrake, i.boost]
+                for t, i in list(self.input_history)[:-1]
+            ],
+        )
+
+    async def input_loop(self):
+        """Sample one input per tick and send every ``ticks_per_packet`` ticks."""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / config.TICKRATE
+        send = getattr(self.socket, "send_unreliable", self.socket.send)
+        next_time = loop.time()
+        last_sent_tick = 0
+
+        while True:
+            now = loop.time()
+            ticks = 0
+            while now >= next_time and ticks < config.MAX_CATCHUP_TICKS:
+                self.input_tick += 1
+                self.input_history.append((self.input_tick, self.script(self.input_tick)))
+                next_time += interval
+                ticks += 1
+            if now >= next_time:
+                next_time = now + interval
+
+            if self.input_tick - last_sent_tick >= self.ticks_per_packet:
+                data = serialize_message("input", self.build_input_message())
+                await send(data)
+                sent = time.monotonic()
+                for tick in range(last_sent_tick + 1, self.input_tick + 1):
+                    self.sent_at.append((tick, sent))
+                last_sent_tick = self.input_tick
+                if self.in_window():
+                    self.bytes_out += len(data)
+                    self.messages_out += 1
+
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+    async def receive_loop(self):
+        """Decode every message from the server."""
+        async for data in self.socket:
+            now = time.monotonic()
+            recording = self.in_window()
+            if recording:
+                self.bytes_in += len(data)
+                self.messages_in += 1
+
+            message = deserialize_message(data)
+            if message["type"] == "state":
+                self.handle_state(message["data"], now, recording)
+
+    def handle_state(self, msg_data, now, recording):
+        """Rebuild the snapshot, ack it and sample arrival timing and input latency."""
+        seq = msg_data.get("seq", 0)
+        if seq <= self.last_snapshot_seq:
+            return
+        self.received += 1
+        baseline_seq = msg_data.get("baseline", -1)
+        baseline = None
+        if baseline_seq >= 0:
+            baseline = self.snapshot_history.get(baseline_seq)
+            if baseline is None:
+                return
+        entities = apply_delta(baseline, msg_data["players"], msg_data.get("removed", []))
+        self.snapshot_history.store(seq, entities)
+        self.last_snapshot_seq = seq
+
+        if recording:
+            self.snapshots += 1
+            if self.last_arrival is not None:
+                self.interarrivals.append(now - self.last_arrival)
+        self.last_arrival = now
+
+        input_tick = msg_data.get("input_tick", -1)
+        if input_tick > self.last_input_tick:
+            self.last_input_tick = input_tick
+            sent = None
+            while self.sent_at and self.sent_at[0][0] <= input_tick:
+                sent = self.sent_at.popleft()[1]
+            if sent is not None and recording:
+                self.latencies.append(now - sent)
+
+    async def run(self, until):
+        """Join, then play until wall-clock time ``until``."""
+        if not await self.connect():
+            return
+        tasks = [
+            asyncio.create_task(self.input_loop()),
+            asyncio.create_task(self.receive_loop()),
+        ]
+        try:
+            remaining = until - time.time()
+            done, _ = await asyncio.wait(tasks, timeout=max(0.0, remaining))
+            for task in done:
+                if task.exception() and not self.error:
+                    self.error = f"{type(task.exception()).__name__}: {task.exception()}"
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.socket.close()
+
+    def results(self) -> Dict[str, Any]:
+        """Get this bot's samples and counters."""
+        return {
+            "name": self.name,
+            "joined": self.player_id is not None,
+            "error": self.error,
+            "redirects": self.redirects,
+            "interarrivals": self.interarrivals,
+            "latencies": self.latencies,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "snapshots": self.snapshots,
+        }
+
+
+async def run_bots(host, port, bots: List[Dict[str, Any]], options: Dict[str, Any]):
+    """Run ``bots`` (name, room and start time each) and get their results."""
+
+    async def start(spec):
+        await asyncio.sleep(max(0.0, spec["start"] - time.time()))
+        bot = BotClient(
+            host,
+            port,
+            spec["name"],
+            spec["room"],
+            transport=options["transport"],
+            codec=options["codec"],
+            input_rate=options["input_rate"],
+            window=(options["window_start"], options["window_end"]),
+        )
+        # Stay connected past the window so the final scrape sees every bot
+        await bot.run(options["window_end"] + LINGER)
+        return bot.results()
+
+    return await asyncio.gather(*(start(spec) for spec in bots))
+
+
+def bot_process(index, host, port, bots, options, results):
+    """Process entry point: run a share of the bots and report their results."""
+    results.put((index, asyncio.run(run_bots(host, port, bots, options))))
+
+
+def collect_results(workers, shards, results, deadline) -> List[Dict[str, Any]]:
+    """Gather each bot process's results, reporting shards that never arrive as errors.
+
+    Processes still running at ``deadline`` are terminated.
+    """
+    reported: Dict[int, List[Dict[str, Any]]] = {}
+    while len(reported) < len(workers) and time.time() < deadline:
+        try:
+            index, shard = results.get(timeout=min(0.5, max(0.01, deadline - time.time())))
+            reported[index] = shard
+        except queue.Empty:
+            silent = [p for i, p in enumerate(workers) if i not in reported]
+            if all(process.exitcode is not None for process in silent):
+                break
+
+    bot_results = []
+    for index, process in enumerate(workers):
+        process.join(timeout=max(0.0, deadline - time.time()))
+        timed_out = process.exitcode is None
+        if timed_out:
+            process.terminate()
+            process.join()
+
+        if index in reported:
+            bot_results.extend(reported[index])
+            continue
+        if timed_out:
+            error = f"bot process {index} did not report in time"
+        else:
+            error = f"bot process {index} exited with code {process.exitcode}"
+        bot_results.extend(
+            {"name": spec["name"], "joined": False, "error": error} for spec in shards[index]
+        )
+    return bot_results
+
+
+def scrape(endpoint, timeout=2.0) -> Optional[Dict[str, Any]]:
+    """Fetch ``/metrics.json`` from a server metrics endpoint."""
+    try:
+        with urllib.request.urlopen(f"http://{endpoint}/metrics.json", timeout=timeout) as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def metric_sum(snapshot, name, key="sum") -> float:
+    """Sum every series of a counter or gauge, or get a histogram's ``key``."""
+    metric = snapshot["metrics"].get(name, [])
+    if isinstance(metric, dict):
+        return metric[key]
+    return sum(series["value"] for series in metric)
+
+
+def percentiles(samples, points=(50, 95, 99)) -> Dict[str, float]:
+    """Get percentiles and the max of ``samples`` in milliseconds."""
+    if not samples:
+        return {}
+    array = np.asarray(samples) * 1000.0
+    result = {f"p{p}": float(v) for p, v in zip(points, np.percentile(array, points))}
+    result["max"] = float(array.max())
+    return result
+
+
+def summarize(bot_results, before, after, duration) -> Dict[str, Any]:
+    """Aggregate bot results and server metric deltas into a report."""
+    joined = [r for r in bot_results if r["joined"]]
+    interarrivals = [v for r in joined for v in r["interarrivals"]]
+    latencies = [v for r in joined for v in r["latencies"]]
+    errors: Dict[str, int] = {}
+    for r in bot_results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    report: Dict[str, Any] = {
+        "bots": len(bot_results),
+        "joined": len(joined),
+        "redirects": sum(r["redirects"] for r in joined),
+        "errors": errors,
+        "duration": duration,
+        "snapshots_per_bot_per_second": (
+            sum(r["snapshots"] for r in joined) / len(joined) / duration if joined else 0.0
+        ),
+        "snapshot_interarrival_ms": percentiles(interarrivals),
+        "snapshot_jitter_ms": float(np.std(interarrivals) * 1000.0) if interarrivals else 0.0,
+        "input_latency_ms": percentiles(latencies),
+        "client_bytes_in_per_second": sum(r["bytes_in"] for r in joined) / duration,
+        "client_bytes_out_per_second": sum(r["bytes_out"] for r in joined) / duration,
+    }
+    if interarrivals:
+        report["snapshot_interarrival_ms"]["mean"] = float(np.mean(interarrivals) * 1000.0)
+
+    pairs = [(b, a) for b, a in zip(before, after) if b and a]
+    if pairs:
+        elapsed = sum(a["time"] - b["time"] for b, a in pairs) / len(pairs)
+
+        def delta(name, key="sum"):
+            return sum(metric_sum(a, name, key) - metric_sum(b, name, key) for b, a in pairs)
+
+        ticks = delta("dog_tick_duration_seconds", "count")
+        report["server"] = {
+            "workers": len(pairs),
+            "cpu_percent": 100.0 * delta("dog_process_cpu_seconds_total") / elapsed,
+            "mean_tick_ms": 1000.0 * delta("dog_tick_duration_seconds") / ticks if ticks else 0.0,
+            "tick_overruns": delta("dog_tick_overruns_total"),
+            "ticks_dropped": delta("dog_tick_dropped_total"),
+            "bytes_out_per_second": delta("dog_message_sent_bytes_total") / elapsed,
+            "bytes_in_per_second": delta("dog_message_received_bytes_total") / elapsed,
+            "rooms": sum(metric_sum(a, "dog_rooms") for _, a in pairs),
+            "players": sum(metric_sum(a, "dog_players") for _, a in pairs),
+        }
+    return report
+
+
+def print_report(report):
+    """Print a load-test report."""
+
+    def spread(values):
+        return " ".join(f"{k} {v:.1f}" for k, v in values.items()) or "n/a"
+
+    print(f"Bots joined: {report['joined']}/{report['bots']} (redirects {report['redirects']})")
+    for error, count in report["errors"].items():
+        print(f"  {count} x {error}")
+    print(f"Snapshots per bot: {report['snapshots_per_bot_per_second']:.1f}/s")
+    print(f"Snapshot inter-arrival (ms): {spread(report['snapshot_interarrival_ms'])}")
+    print(f"Snapshot jitter (stdev, ms): {report['snapshot_jitter_ms']:.2f}")
+    print(f"Input-to-snapshot latency (ms): {spread(report['input_latency_ms'])}")
+    print(
+        f"Client traffic: {report['client_bytes_in_per_second'] / 1024:.1f} KiB/s in, "
+        f"{report['client_bytes_out_per_second'] / 1024:.1f} KiB/s out"
+    )
+    server = report.get("server")
+    if server:
+        print(
+            f"Server ({server['workers']} worker(s), {server['rooms']:.0f} rooms, "
+            f"{server['players']:.0f} players): CPU {server['cpu_percent']:.1f}%, "
+            f"mean tick {server['mean_tick_ms']:.3f}ms, overruns {server['tick_overruns']:.0f}, "
+            f"dropped ticks {server['ticks_dropped']:.0f}"
+        )
+        print(
+            f"Server traffic: {server['bytes_out_per_second'] / 1024:.1f} KiB/s out, "
+            f"{server['bytes_in_per_second'] / 1024:.1f} KiB/s in"
+        )
+    else:
+        print("Server metrics unavailable (pass --metrics or --spawn-server)")
+
+
+def spawn_server(host, port, workers, metrics_port, quiet=True) -> subprocess.Popen:
+    """Start a server subprocess with its metrics endpoint on ``metrics_port``."""
+    env = dict(os.environ, DOG_METRICS_HOST=host, DOG_METRICS_PORT=str(metrics_port))
+    return subprocess.Popen(
+        [sys.executable, "-m", "game.net.server"]
+        + ["--host", host, "--port", str(port), "--workers", str(workers)],
+        env=env,
+        stdout=subprocess.DEVNULL if quiet else None,
+    )
+
+
+def wait_for_endpoints(endpoints, timeout=15.0) -> bool:
+    """Wait until every metrics endpoint answers."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(scrape(endpoint, 0.5) for endpoint in endpoints):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def run_load_test(args) -> Dict[str, Any]:
+    """Run the load test described by parsed command-line ``args``."""
+    server = None
+    endpoints = list(args.metrics)
+    if args.spawn_server:
+        server = spawn_server(
+            args.host, args.port, args.workers, args.metrics_port, not args.verbose
+        )
+        if args.workers == 1:
+            endpoints = [f"{args.host}:{args.metrics_port}"]
+        else:
+            workers = args.workers or os.cpu_count() or 1
+            endpoints = [f"{args.host}:{worker_port(args.metrics_port, i)}" for i in range(workers)]
+        if not wait_for_endpoints(endpoints):
+            server.terminate()
+            raise SystemExit("Server did not start")
+
+    try:
+        start = time.time() + 0.5
+        window_start = start + args.ramp + args.warmup
+        window_end = window_start + args.duration
+        options = {
+            "transport": args.transport,
+            "codec": args.codec,
+            "input_rate": args.input_rate,
+            "window_start": window_start,
+            "window_end": window_end,
+        }
+        specs = [
+            {
+                "name": f"bot_{i}",
+                "room": f"load-{i // args.room_size}" if args.room_size else "",
+                "start": start + args.ramp * i / max(1, args.bots),
+            }
+            for i in range(args.bots)
+        ]
+
+        processes = max(1, min(args.processes, args.bots))
+        shards = [specs[i::processes] for i in range(processes)]
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=bot_process,
+                args=(i, args.host, args.port, shards[i], options, results),
+            )
+            for i in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        print(
+            f"{args.bots} bots in {processes} process(es) against {args.host}:{args.port}, "
+            f"measuring for {args.duration:.0f}s after {args.ramp + args.warmup:.0f}s"
+        )
+
+        time.sleep(max(0.0, window_start - time.time()))
+        before = [scrape(endpoint) for endpoint in endpoints]
+        time.sleep(max(0.0, window_end - time.time()))
+        after = [scrape(endpoint) for endpoint in endpoints]
+
+        deadline = window_end + LINGER + RESULTS_TIMEOUT
+        bot_results = collect_results(workers, shards, results, deadline)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    return summarize(bot_results, before, after, args.duration)
+
+
+def main():
+    """Main entry point for the load tester."""
+    parser = argparse.ArgumentParser(description="Dog Go Around - Server Load Test")
+    parser.add_argument("--host", default="127.0.0.1", help="Server host address")
+    parser.add_argument("--port", type=int, default=config.DEFAULT_SERVER_PORT, help="Server port")
+    parser.add_argument("--bots", type=int, default=32, help="Number of bot clients")
+    parser.add_argument("--processes", type=int, default=1, help="Bot client processes")
+    parser.add_argument(
+        "--room-size",
+        type=int,
+        default=config.MAX_PLAYERS,
+        help="Bots per named room (0 = let the server place them)",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds to stagger joins over")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds before measuring")
+    parser.add_argument(
+        "--transport",
+        default=config.NETWORK_TRANSPORT,
+        choices=("auto", "udp", "websocket"),
+        help="Bot transport",
+    )
+    parser.add_argument(
+        "--codec", default=config.SNAPSHOT_CODEC, choices=("binary", "msgpack"), help="Codec"
+    )
+    parser.add_argument(
+        "--input-rate", type=int, default=config.INPUT_SEND_RATE, help="Input packets per second"
+    )
+    parser.add_argument(
+        "--metrics",
+        action="append",
+        default=[],
+        metavar="HOST:PORT",
+        help="Server metrics endpoint to scrape (repeat for each worker)",
+    )
+    parser.add_argument(
+        "--spawn-server", action="store_true", help="Start a server subprocess for the run"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Workers for --spawn-server (0 = one per CPU)"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=config.METRICS_PORT or 9777,
+        help="Metrics port for --spawn-server",
+    )
+    parser.add_argument("--json", default="", help="Also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+
+    args = parser.parse_args()
+    report = run_load_test(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
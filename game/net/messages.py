@@ -1,8 +1,20 @@
 """Network message definitions."""
 
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import copy
+import dataclasses
+import operator
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import msgpack
+import numpy as np
+from game import config
+
+# Snapshot encodings a client can pick at join
+SNAPSHOT_CODECS = ("msgpack", "binary")
+
+# First byte of binary snapshot frames; 0xC1 is never used by msgpack
+BINARY_SNAPSHOT_MARKER = 0xC1
 
 
 @dataclass
@@ -11,9 +23,18 @@ class JoinMessage:
 
     player_name: str
     version: str = "0.1.0"
+    room_id: str = ""
+    codec: str = "msgpack"
+    session_token: str = ""  # Resumes a held session instead of joining afresh
 
     def to_dict(self):
-        return {"player_name": self.player_name, "version": self.version}
+        return {
+            "player_name": self.player_name,
+            "version": self.version,
+            "room_id": self.room_id,
+            "codec": self.codec,
+            "session_token": self.session_token,
+        }
 
 
 @dataclass
@@ -27,6 +48,13 @@ class InputMessage:
     handbrake: bool
     boost: bool
     timestamp: float
+    ack: int = -1
+    tick: int = -1
+    # Recent inputs resent for redundancy, oldest first:
+    # [tick, throttle, steer, brake, handbrake, boost]
+    inputs: List[List[Any]] = field(default_factory=list)
+    received: int = -1  # Snapshots received so far, for the server's loss estimate
+    delay: float = -1.0  # Client's interpolation delay in seconds, for lag compensation
 
     def to_dict(self):
         return {
@@ -37,18 +65,45 @@ class InputMessage:
             "handbrake": self.handbrake,
             "boost": self.boost,
             "timestamp": self.timestamp,
+            "ack": self.ack,
+            "tick": self.tick,
+            "inputs": self.inputs,
+            "received": self.received,
+            "delay": self.delay,
         }
 
 
 @dataclass
 class StateSnapshot:
-    """Game state snapshot."""
+    """Game state snapshot.
+
+    ``timestamp`` is the scheduled time of ``tick`` on the server's
+    monotonic clock, which clients track with ``ClockSync``.
+
+    With ``baseline`` set, ``players`` only holds entities (and fields) that
+    changed since snapshot ``baseline`` and ``removed`` lists departed ids;
+    ``baseline == -1`` marks a full snapshot. ``input_tick`` is the newest
+    client input tick the recipient's car has simulated (-1 before any).
+    """
 
     timestamp: float
     players: List[Dict[str, Any]]
+    tick: int = 0
+    seq: int = 0
+    baseline: int = -1
+    removed: List[str] = field(default_factory=list)
+    input_tick: int = -1
 
     def to_dict(self):
-        return {"timestamp": self.timestamp, "players": self.players}
+        return {
+            "timestamp": self.timestamp,
+            "players": self.players,
+            "tick": self.tick,
+            "seq": self.seq,
+            "baseline": self.baseline,
+            "removed": self.removed,
+            "input_tick": self.input_tick,
+        }
 
 
 @dataclass
@@ -93,15 +148,610 @@ class LobbyStateMessage:
         }
 
 
+@dataclass
+class JoinResponseMessage:
+    """Join accepted: the player's id, room, car slot, snapshot codec and session."""
+
+    player_id: str
+    room_id: str
+    slot: int
+    codec: str = "msgpack"
+    session_token: str = ""
+    resumed: bool = False  # An existing session was picked up again
+
+    def to_dict(self):
+        return {
+            "player_id": self.player_id,
+            "room_id": self.room_id,
+            "slot": self.slot,
+            "codec": self.codec,
+            "session_token": self.session_token,
+            "resumed": self.resumed,
+        }
+
+
+@dataclass
+class JoinErrorMessage:
+    """Join rejected."""
+
+    reason: str
+
+    def to_dict(self):
+        return {"reason": self.reason}
+
+
+@dataclass
+class RedirectMessage:
+    """Join again on another server worker."""
+
+    port: int
+    room_id: str
+
+    def to_dict(self):
+        return {"port": self.port, "room_id": self.room_id}
+
+
+@dataclass
+class RosterMessage:
+    """Slot-to-player mapping used by binary snapshots."""
+
+    players: List[Dict[str, Any]]
+
+    def to_dict(self):
+        return {"players": self.players}
+
+
+@dataclass
+class ReadyMessage:
+    """Lobby ready toggle."""
+
+    ready: bool = False
+
+    def to_dict(self):
+        return {"ready": self.ready}
+
+
+@dataclass
+class SnapshotRateMessage:
+    """Snapshot rate and detail level the server currently sends this client."""
+
+    rate: int
+    detail: int = 2
+
+    def to_dict(self):
+        return {"rate": self.rate, "detail": self.detail}
+
+
+@dataclass
+class PingMessage:
+    """Clock sync request stamped with the client's clock."""
+
+    client_time: float
+
+    def to_dict(self):
+        return {"client_time": self.client_time}
+
+
+@dataclass
+class PongMessage:
+    """Clock sync answer: the ping's client time and the server's clock and tick."""
+
+    client_time: float
+    server_time: float
+    tick: int = 0
+
+    def to_dict(self):
+        return {
+            "client_time": self.client_time,
+            "server_time": self.server_time,
+            "tick": self.tick,
+        }
+
+
+class BinarySnapshotCodec:
+    """Quantized fixed-layout encoding of ``StateSnapshot``.
+
+    Layout (little-endian): a header, then per-entity slot and field-mask
+    bytes, removed slots, and one packed array per field holding values
+    only for entities whose mask has that field's bit. Player ids travel as
+    the small integer car slot assigned at join; clients map them back
+    through the room roster.
+
+    Quantization: position as uint16 per axis across the track bounds
+    (~1.6cm on a 1km track), yaw as uint16 over a full turn, velocity as
+    int16 in ``VELOCITY_QUANTUM`` steps, lap/checkpoint as uint8 and the
+    drift/boost flags bit-packed into one byte.
+
+    Values are quantized into a ``WireTable`` of structured rows, so
+    encoding only gathers the rows of the entities present and writes each
+    field's masked column out with ``tobytes()``. With one table shared
+    across a send pass, encoding costs less than msgpack does.
+    """
+
+    HEADER = struct.Struct("<BBIIidHHi")
+    # The header split around ``input_tick``, which differs per recipient
+    HEAD = struct.Struct("<BBIIidHH")
+    INPUT_TICK = struct.Struct("<i")
+    VERSION = 2
+
+    # Field mask bits
+    POSITION = 0x01
+    YAW = 0x02
+    VELOCITY = 0x04
+    LAP = 0x08
+    CHECKPOINT = 0x10
+    FLAGS = 0x20
+
+    def __init__(
+        self,
+        bounds_min=config.TRACK_BOUNDS_MIN,
+        bounds_max=config.TRACK_BOUNDS_MAX,
+        velocity_quantum=config.VELOCITY_QUANTUM,
+    ):
+        """Initialize quantization ranges."""
+        self.origin = np.asarray(bounds_min, dtype=np.float64)
+        extent = np.asarray(bounds_max, dtype=np.float64) - self.origin
+        self.position_step = extent / 65535.0
+        self.velocity_quantum = velocity_quantum
+
+        # (snapshot key, mask bit, wire dtype, values per entity)
+        self.fields = [
+            ("position", self.POSITION, "<u2", 3),
+            ("rotation", self.YAW, "<u2", 1),
+            ("velocity", self.VELOCITY, "<i2", 3),
+            ("lap", self.LAP, "u1", 1),
+            ("checkpoint", self.CHECKPOINT, "u1", 1),
+            ("flags", self.FLAGS, "u1", 1),
+        ]
+        self.bits = {key: bit for key, bit, _dtype, _width in self.fields}
+        self.wire_dtype = np.dtype(
+            [
+                (key, dtype, (width,)) if width > 1 else (key, dtype)
+                for key, _bit, dtype, width in self.fields
+            ]
+        )
+
+    def quantize(self, position, yaw, velocity, lap, checkpoint, flags) -> np.ndarray:
+        """Convert per-field value arrays to structured wire rows."""
+        values = np.empty(len(yaw), dtype=self.wire_dtype)
+        position = np.rint((position - self.origin) / self.position_step)
+        values["position"] = np.clip(position, 0, 65535)
+        values["rotation"] = np.rint(np.mod(yaw, 360.0) * (65536 / 360.0)) % 65536
+        values["velocity"] = np.clip(np.rint(velocity / self.velocity_quantum), -32768, 32767)
+        values["lap"] = np.clip(lap, 0, 255)
+        values["checkpoint"] = np.clip(checkpoint, 0, 255)
+        values["flags"] = np.clip(flags, 0, 255)
+        return values
+
+    def quantize_cars(self, cars, slots, laps, checkpoints) -> np.ndarray:
+        """Quantize the state of ``CarBatch`` rows ``slots`` in one pass."""
+        slots = np.asarray(slots, dtype=np.intp)
+        flags = cars.is_drifting[slots].astype(np.uint8) | cars.boost_active[slots] << 1
+        return self.quantize(
+            cars.position[slots],
+            cars.yaw[slots],
+            cars.velocity[slots],
+            np.asarray(laps),
+            np.asarray(checkpoints),
+            flags,
+        )
+
+    def quantize_entities(self, entities: List[Dict[str, Any]]) -> np.ndarray:
+        """Quantize entity dicts' own values (fields an entity lacks as zero)."""
+
+        def column(key, default):
+            return np.array([entity.get(key, default) for entity in entities], np.float64)
+
+        zero = (0.0, 0.0, 0.0)
+        return self.quantize(
+            column("position", zero),
+            column("rotation", zero)[:, 1],
+            column("velocity", zero),
+            column("lap", 0),
+            column("checkpoint", 0),
+            column("flags", 0),
+        )
+
+    def dequantize(self, key, array):
+        """Convert wire integers back to field values."""
+        if key == "position":
+            return (array * self.position_step + self.origin).tolist()
+        if key == "rotation":
+            yaw = array * (360.0 / 65536)
+            return [[0.0, y, 0.0] for y in yaw.tolist()]
+        if key == "velocity":
+            return (array * self.velocity_quantum).tolist()
+        return array.tolist()
+
+    def encode(
+        self,
+        snapshot: "StateSnapshot",
+        slots: Dict[str, int],
+        view=None,
+        table=None,
+        versions=None,
+    ) -> bytes:
+        """Encode a snapshot, mapping player ids to slots with ``slots``."""
+        head, tail = self.encode_frame(snapshot, slots, view, table, versions)
+        return b"".join((head, self.INPUT_TICK.pack(snapshot.input_tick), tail))
+
+    def encode_frame(
+        self,
+        snapshot: "StateSnapshot",
+        slots: Dict[str, int],
+        view: Optional[Dict[str, Dict[str, Any]]] = None,
+        table: Optional["WireTable"] = None,
+        versions: Optional[Dict[str, Tuple[int, int]]] = None,
+    ) -> Tuple[bytes, bytes]:
+        """Encode a snapshot as the bytes before and after its ``input_tick``.
+
+        ``view`` maps ids to the full entity dicts the (possibly partial)
+        entries of ``snapshot.players`` were taken from, and ``versions``
+        maps ids to the snapshot seqs of the baseline and view states each
+        entry is the difference of, under which ``table`` keeps the send
+        pass's quantized rows. Without them the entries are quantized on
+        their own.
+        """
+        players = snapshot.players
+        if table is None or versions is None:
+            table = WireTable(self)
+            versions = {entry["id"]: (-1, snapshot.seq) for entry in players}
+        entries = table.lookup(players, view, versions, slots)
+        masks = table.masks[entries]
+        values = table.values[table.rows[entries]]
+        removed = bytes(slots[r] for r in snapshot.removed if r in slots)
+
+        # Fields every entry carries are written whole, others masked
+        union = int(np.bitwise_or.reduce(masks)) if len(masks) else 0
+        common = int(np.bitwise_and.reduce(masks)) if len(masks) else 0
+        sections = []
+        for key, bit in self.bits.items():
+            if bit & common:
+                sections.append(values[key].tobytes())
+            elif bit & union:
+                sections.append(values[key][(masks & bit).astype(bool)].tobytes())
+
+        head = self.HEAD.pack(
+            BINARY_SNAPSHOT_MARKER,
+            self.VERSION,
+            snapshot.tick,
+            snapshot.seq,
+            snapshot.baseline,
+            snapshot.timestamp,
+            len(players),
+            len(removed),
+        )
+        slot_array = table.slots[entries]
+        return head, b"".join([slot_array.tobytes(), masks.tobytes(), removed] + sections)
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        """Decode to the ``StateSnapshot.to_dict()`` form, with slots as ids."""
+        marker, version, tick, seq, baseline, timestamp, count, removed_count, input_tick = (
+            self.HEADER.unpack_from(data)
+        )
+        if marker != BINARY_SNAPSHOT_MARKER or version != self.VERSION:
+            raise ValueError("Not a binary snapshot")
+
+        offset = self.HEADER.size
+        slot_array = np.frombuffer(data, np.uint8, count, offset)
+        offset += count
+        masks = np.frombuffer(data, np.uint8, count, offset)
+        offset += count
+        removed = np.frombuffer(data, np.uint8, removed_count, offset)
+        offset += removed_count
+
+        players = [{"id": slot} for slot in slot_array.tolist()]
+
+        for key, bit, dtype, width in self.fields:
+            present = np.flatnonzero(masks & bit)
+            if not len(present):
+                continue
+            array = np.frombuffer(data, dtype, len(present) * width, offset)
+            offset += array.nbytes
+            if width > 1:
+                array = array.reshape(-1, width)
+            for i, value in zip(present.tolist(), self.dequantize(key, array)):
+                players[i][key] = value
+
+        return {
+            "timestamp": timestamp,
+            "players": players,
+            "tick": tick,
+            "seq": seq,
+            "baseline": baseline,
+            "removed": removed.tolist(),
+            "input_tick": input_tick,
+        }
+
+
+class WireTable:
+    """Quantized wire rows of entity states, shared by the encodes of a send pass.
+
+    Entity states are keyed by ``(entity id, snapshot seq)`` of the snapshot
+    they were taken from, and delta entries by ``(entity id, baseline seq,
+    seq)``, which fixes the fields that changed. Each entry is stored with
+    its slot, field mask and the row of the full state it came from, so an
+    encode gathers everything with array indexing and a state is quantized
+    once however many clients' views include it. The room adds its current
+    state straight from the car arrays; states carried over from older
+    snapshots are quantized on first lookup.
+    """
+
+    def __init__(self, codec: BinarySnapshotCodec):
+        """Initialize an empty table."""
+        self.codec = codec
+        self.source_rows: Dict[Tuple[str, int], int] = {}
+        self.entry_index: Dict[Tuple[str, int, int], int] = {}
+        self.values = np.zeros(0, dtype=codec.wire_dtype)
+        self.slots = np.zeros(0, dtype=np.uint8)
+        self.masks = np.zeros(0, dtype=np.uint8)
+        self.rows = np.zeros(0, dtype=np.intp)
+
+    def add(self, keys: List[Tuple[str, int]], values: np.ndarray):
+        """Add quantized rows ``values`` for the entity states ``keys``."""
+        start = len(self.values)
+        self.source_rows.update((key, row) for row, key in enumerate(keys, start))
+        self.values = np.concatenate([self.values, values])
+
+    def add_cars(self, keys, cars, slots, laps, checkpoints):
+        """Add rows for entity states ``keys`` holding the state of car ``slots``."""
+        self.add(keys, self.codec.quantize_cars(cars, slots, laps, checkpoints))
+
+    def lookup(self, entries, view, versions, slots) -> np.ndarray:
+        """Get the index of each entry, adding the ones not seen yet."""
+        index = self.entry_index
+        keys = [(entry["id"], *versions[entry["id"]]) for entry in entries]
+        try:
+            return np.fromiter(map(index.__getitem__, keys), np.intp, len(keys))
+        except KeyError:
+            pass
+
+        new = {key: entry for key, entry in zip(keys, entries) if key not in index}
+        sources = {
+            (entity_id, version): view[entity_id] if view is not None else entry
+            for (entity_id, _base, version), entry in new.items()
+        }
+        unknown = [key for key in sources if key not in self.source_rows]
+        if unknown:
+            states = [sources[key] for key in unknown]
+            self.add(unknown, self.codec.quantize_entities(states))
+
+        bits = self.codec.bits
+        index.update((key, i) for i, key in enumerate(new, len(self.rows)))
+        self.slots = np.concatenate(
+            [self.slots, np.array([slots[entity_id] for entity_id, _, _ in new], np.uint8)]
+        )
+        self.masks = np.concatenate(
+            [
+                self.masks,
+                np.array([sum(bits.get(k, 0) for k in e) for e in new.values()], np.uint8),
+            ]
+        )
+        self.rows = np.concatenate(
+            [
+                self.rows,
+                np.array([self.source_rows[key[0], key[2]] for key in new], np.intp),
+            ]
+        )
+        return np.fromiter(map(index.__getitem__, keys), np.intp, len(keys))
+
+
+binary_snapshot_codec = BinarySnapshotCodec()
+
+
+class MessageSchema:
+    """Wire layout of one message type: its id and positional field order.
+
+    Encoders and the decoder are closures built once over the field tuple,
+    so no per-field lookup of the layout runs per message.
+    """
+
+    def __init__(self, type_id: int, name: str, fields: Tuple[str, ...], defaults: Dict[str, Any]):
+        """Initialize and build the codec functions."""
+        self.type_id = type_id
+        self.name = name
+        self.fields = fields
+        self.defaults = [defaults.get(name) for name in fields]
+        self.encode_object, self.encode_dict, self.decode = self._compile()
+
+    def _compile(self):
+        """Build ``encode_object``, ``encode_dict`` and ``decode`` for this layout."""
+        type_id, name, fields = self.type_id, self.name, self.fields
+        packb = msgpack.packb
+
+        if not fields:
+            # Free-form payload after the id
+            def encode_object(m):
+                return packb([type_id, m.to_dict()])
+
+            def encode_dict(m):
+                return packb([type_id, m])
+
+            def decode(v):
+                return {"type": name, "data": v[1]}
+
+            return encode_object, encode_dict, decode
+
+        if len(fields) == 1:
+            get_value = operator.attrgetter(fields[0])
+
+            def get_values(m):
+                return (get_value(m),)
+
+        else:
+            get_values = operator.attrgetter(*fields)
+        with_defaults = list(zip(fields, self.defaults))
+
+        def encode_object(m):
+            return packb([type_id, *get_values(m)])
+
+        def encode_dict(m):
+            return packb([type_id, *[m.get(key, default) for key, default in with_defaults]])
+
+        def decode(v):
+            return {"type": name, "data": dict(zip(fields, v[1:]))}
+
+        return encode_object, encode_dict, decode
+
+    def pad(self, values: List[Any]) -> List[Any]:
+        """Fill in trailing fields missing from an older peer's message."""
+        missing = len(self.fields) + 1 - len(values)
+        return list(values) + [copy.copy(d) for d in self.defaults[len(self.defaults) - missing :]]
+
+
+class MessageRegistry:
+    """Message types by name and by one-byte id.
+
+    Registered messages travel as msgpack arrays ``[type_id, field, ...]``
+    in schema order instead of ``{"type": name, "data": {...}}``. Types
+    registered without fields carry a free-form payload after the id.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.by_name: Dict[str, MessageSchema] = {}
+        self.by_id: Dict[int, MessageSchema] = {}
+
+    def register(self, type_id: int, name: str, cls=None, fields: Optional[Tuple[str, ...]] = None):
+        """Register ``name`` under ``type_id``, taking fields from dataclass ``cls``."""
+        if not 0 <= type_id <= 0x7F:
+            raise ValueError(f"Message type id {type_id} is not a positive fixint")
+        if type_id in self.by_id or name in self.by_name:
+            raise ValueError(f"Message {name} ({type_id}) is already registered")
+
+        defaults: Dict[str, Any] = {}
+        if cls is not None:
+            fields = tuple(f.name for f in dataclasses.fields(cls))
+            for f in dataclasses.fields(cls):
+                if f.default is not dataclasses.MISSING:
+                    defaults[f.name] = f.default
+                elif f.default_factory is not dataclasses.MISSING:
+                    defaults[f.name] = f.default_factory()
+
+        schema = MessageSchema(type_id, name, tuple(fields or ()), defaults)
+        self.by_name[name] = schema
+        self.by_id[type_id] = schema
+        return schema
+
+    def encode(self, name: str, message: Any) -> bytes:
+        """Serialize ``message`` as registered type ``name``."""
+        schema = self.by_name.get(name)
+        if schema is None:
+            # Unregistered types keep the self-describing keyed form
+            data = message.to_dict() if hasattr(message, "to_dict") else message
+            return msgpack.packb({"type": name, "data": data})
+        if isinstance(message, dict):
+            return schema.encode_dict(message)
+        return schema.encode_object(message)
+
+    def peek_type(self, data: bytes) -> str:
+        """Get a serialized message's type name without decoding it."""
+        if not data:
+            return "unknown"
+        first = data[0]
+        if first == BINARY_SNAPSHOT_MARKER:
+            return "state"
+        # fixarray or array16 header, then the positive fixint type id
+        if 0x91 <= first <= 0x9F:
+            type_id = data[1] if len(data) > 1 else -1
+        elif first == 0xDC:
+            type_id = data[3] if len(data) > 3 else -1
+        else:
+            return "keyed"
+        schema = self.by_id.get(type_id)
+        return schema.name if schema else "unknown"
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        """Deserialize to ``{"type": name, "data": payload}``."""
+        values = msgpack.unpackb(data, raw=False)
+        if values.__class__ is dict:
+            return values
+        schema = self.by_id[values[0]]
+        if len(values) <= len(schema.fields):
+            values = schema.pad(values)
+        return schema.decode(values)
+
+
+def dispatch(message: Dict[str, Any], handlers: Dict[str, Callable], *args):
+    """Call the handler registered for a decoded message's type, if any."""
+    handler = handlers.get(message["type"])
+    if handler is not None:
+        return handler(*args, message["data"])
+    return None
+
+
+registry = MessageRegistry()
+registry.register(1, "join", JoinMessage)
+registry.register(2, "join_response", JoinResponseMessage)
+registry.register(3, "join_error", JoinErrorMessage)
+registry.register(4, "redirect", RedirectMessage)
+registry.register(5, "input", InputMessage)
+registry.register(6, "state", StateSnapshot)
+registry.register(7, "chat", ChatMessage)
+registry.register(8, "results", ResultsMessage)
+registry.register(9, "lobby_state", LobbyStateMessage)
+registry.register(10, "roster", RosterMessage)
+registry.register(11, "ready", ReadyMessage)
+registry.register(12, "race_event")
+registry.register(13, "snapshot_rate", SnapshotRateMessage)
+registry.register(14, "ping", PingMessage)
+registry.register(15, "pong", PongMessage)
+
+
 def serialize_message(message_type: str, message: Any) -> bytes:
     """Serialize a message to bytes."""
-    data = {
-        "type": message_type,
-        "data": message.to_dict() if hasattr(message, "to_dict") else message,
-    }
-    return msgpack.packb(data)
+    return registry.encode(message_type, message)
+
+
+def serialize_snapshot(
+    snapshot: StateSnapshot, codec="msgpack", slots=None, view=None, table=None, versions=None
+) -> bytes:
+    """Serialize a state snapshot with the codec chosen at join.
+
+    ``view``, ``table`` and ``versions`` let binary encodes reuse a send
+    pass's quantized rows (see ``BinarySnapshotCodec.encode_frame``).
+    """
+    if codec == "binary":
+        return binary_snapshot_codec.encode(snapshot, slots, view, table, versions)
+    return serialize_message("state", snapshot)
+
+
+class SnapshotFrame:
+    """A serialized snapshot missing only its recipient's ``input_tick``.
+
+    Recipients whose views delta-encode identically share one frame.
+    """
+
+    def __init__(self, head: bytes, tail: bytes, pack_tick: Callable[[int], bytes]):
+        """Initialize from the bytes around the input tick and its packer."""
+        self.head = head
+        self.tail = tail
+        self.pack_tick = pack_tick
+
+    def finish(self, input_tick: int) -> bytes:
+        """Get the serialized snapshot for a recipient."""
+        return b"".join((self.head, self.pack_tick(input_tick), self.tail))
+
+
+def encode_snapshot_frame(
+    snapshot: StateSnapshot, codec="msgpack", slots=None, view=None, table=None, versions=None
+) -> SnapshotFrame:
+    """Serialize a state snapshot as a ``SnapshotFrame`` (see ``serialize_snapshot``)."""
+    if codec == "binary":
+        head, tail = binary_snapshot_codec.encode_frame(snapshot, slots, view, table, versions)
+        return SnapshotFrame(head, tail, binary_snapshot_codec.INPUT_TICK.pack)
+
+    # The registered positional layout, whose last field is ``input_tick``
+    schema = registry.by_name["state"]
+    values = [schema.type_id] + [getattr(snapshot, name) for name in schema.fields[:-1]]
+    head = msgpack.Packer().pack_array_header(len(values) + 1)
+    return SnapshotFrame(head + b"".join(map(msgpack.packb, values)), b"", msgpack.packb)
 
 
 def deserialize_message(data: bytes) -> Dict[str, Any]:
     """Deserialize bytes to message."""
-    return msgpack.unpackb(data, raw=False)
+    if not data:
+        raise ValueError("Empty message")
+    if data[0] == BINARY_SNAPSHOT_MARKER:
+        return {"type": "state", "data": binary_snapshot_codec.decode(data)}
+    return registry.decode(data)
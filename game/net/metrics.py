@@ -0,0 +1,471 @@
+"""Server metrics: counters, gauges and histograms with two exporters.
+
+Metrics are exposed over a small local HTTP endpoint in the Prometheus
+text format (``/metrics``, or ``/metrics.json`` for the same data as
+JSON) and can be dumped to a JSON file periodically. Everything is
+implemented on the standard library so the server needs no extra
+dependency to be scraped.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from game import config
+from game.net.messages import registry
+
+Labels = Tuple[str, ...]
+
+TICK_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.004, 0.008, 0.0167, 0.033, 0.1)
+ENCODE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class Metric:
+    """Named metric with optional label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels: Labels = ()):
+        """Initialize the metric."""
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        """Get ``(suffix, label_values, value)`` samples."""
+        return ()
+
+    def to_json(self):
+        """Get a JSON-friendly view of the current values."""
+        return [
+            {"labels": dict(zip(self.labels, values)), "value": value}
+            for _, values, value in self.samples()
+        ]
+
+
+class Counter(Metric):
+    """Monotonic counter, one value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels: Labels = ()):
+        """Initialize at zero."""
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount=1.0, labels: Labels = ()):
+        """Add ``amount`` to the series for ``labels``."""
+        self.values[labels] += amount
+
+    def remove(self, label_index, value):
+        """Drop every series whose label at ``label_index`` equals ``value``."""
+        for labels in [labels for labels in self.values if labels[label_index] == value]:
+            del self.values[labels]
+
+    def samples(self):
+        """Get one sample per label set."""
+        return [("", labels, value) for labels, value in list(self.values.items())]
+
+
+class Gauge(Metric):
+    """Value read from a callback at collection time.
+
+    The callback returns a number, or a ``{label_values: number}`` dict
+    for labelled gauges.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read: Callable, labels: Labels = ()):
+        """Initialize with the callback that reads the current value."""
+        super().__init__(name, help_text, labels)
+        self.read = read
+
+    def samples(self):
+        """Get the current value(s)."""
+        value = self.read()
+        if isinstance(value, dict):
+            return [("", labels, v) for labels, v in value.items()]
+        return [("", (), value)]
+
+
+class CallbackCounter(Gauge):
+    """Monotonic count kept elsewhere and read at collection time."""
+
+    kind = "counter"
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram of observed values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        """Initialize empty buckets with the given upper bounds."""
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """Get cumulative bucket counts plus sum and count."""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("_bucket", (format_bound(bound),), total))
+        result.append(("_sum", (), self.sum))
+        result.append(("_count", (), self.count))
+        return result
+
+    def to_json(self):
+        """Get buckets, sum, count and mean."""
+        return {
+            "buckets": {
+                le[0]: value for suffix, le, value in self.samples() if suffix == "_bucket"
+            },
+            "sum": self.sum,
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+        }
+
+
+def format_bound(bound) -> str:
+    """Format a bucket bound the way Prometheus expects."""
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def format_value(value) -> str:
+    """Format a sample value without losing precision on large counts."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def escape_label(value) -> str:
+    """Escape a label value for the text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self, prefix="dog_", const_labels: Optional[Dict[str, str]] = None):
+        """Initialize an empty registry."""
+        self.prefix = prefix
+        self.const_labels = const_labels or {}
+        self.metrics: List[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        """Register a metric."""
+        self.metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            name = self.prefix + metric.name
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, values, value in metric.samples():
+                names = ("le",) if suffix == "_bucket" else metric.labels
+                pairs = list(self.const_labels.items()) + list(zip(names, values))
+                label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}{suffix}{label_text} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """Get every metric as a JSON-friendly dict."""
+        return {
+            "time": time.time(),
+            "labels": self.const_labels,
+            "metrics": {self.prefix + m.name: m.to_json() for m in self.metrics},
+        }
+
+
+class ServerMetrics:
+    """The metrics a ``NetworkServer`` reports."""
+
+    def __init__(self, server):
+        """Create metrics reading live values from ``server``."""
+        self.server = server
+        const_labels = {}
+        if server.worker_index is not None:
+            const_labels["worker"] = str(server.worker_index)
+        self.registry = MetricsRegistry(const_labels=const_labels)
+        add = self.registry.add
+        scheduler = server.scheduler
+
+        self.tick_duration = add(
+            Histogram("tick_duration_seconds", "Time spent simulating one tick.", TICK_BUCKETS)
+        )
+        add(
+            CallbackCounter(
+                "tick_overruns_total",
+                "Ticks that exceeded their time slice.",
+                lambda: scheduler.overrun_count,
+            )
+        )
+        add(
+            CallbackCounter(
+                "tick_dropped_total", "Ticks skipped to catch up.", lambda: scheduler.dropped_ticks
+            )
+        )
+        add(
+            CallbackCounter(
+                "process_cpu_seconds_total", "CPU time used by this process.", time.process_time
+            )
+        )
+        self.snapshot_encode = add(
+            Histogram(
+                "snapshot_encode_seconds",
+                "Time to build and encode one room's snapshots for all its clients.",
+                ENCODE_BUCKETS,
+            )
+        )
+        self.loop_lag = add(
+            Histogram("event_loop_lag_seconds", "Event-loop wakeup delay.", LAG_BUCKETS)
+        )
+
+        self.bytes_out = add(
+            Counter("client_sent_bytes_total", "Bytes sent per client.", ("client",))
+        )
+        self.messages_out = add(
+            Counter("client_sent_messages_total", "Messages sent per client.", ("client",))
+        )
+        self.bytes_in = add(
+            Counter("client_received_bytes_total", "Bytes received per client.", ("client",))
+        )
+        self.messages_in = add(
+            Counter("client_received_messages_total", "Messages received per client.", ("client",))
+        )
+        self.type_bytes_out = add(
+            Counter("message_sent_bytes_total", "Bytes sent per message type.", ("type",))
+        )
+        self.type_messages_out = add(
+            Counter("message_sent_total", "Messages sent per message type.", ("type",))
+        )
+        self.type_bytes_in = add(
+            Counter("message_received_bytes_total", "Bytes received per message type.", ("type",))
+        )
+        self.type_messages_in = add(
+            Counter("message_received_total", "Messages received per message type.", ("type",))
+        )
+
+        add(
+            Gauge(
+                "send_queue_depth",
+                "Messages waiting in each client's send queue.",
+                self.read_queue_depths,
+                ("client",),
+            )
+        )
+        add(
+            Gauge(
+                "client_snapshot_rate",
+                "Snapshots per second each client is currently sent.",
+                lambda: {(p.id,): p.rate.rate for p in server.players.values()},
+                ("client",),
+            )
+        )
+        add(
+            Gauge(
+                "client_rtt_seconds",
+                "Smoothed snapshot-to-ack round trip per client.",
+                lambda: {
+                    (p.id,): p.rate.srtt for p in server.players.values() if p.rate.srtt is not None
+                },
+                ("client",),
+            )
+        )
+        add(
+            Gauge(
+                "client_snapshot_loss",
+                "Smoothed fraction of snapshots each client did not receive.",
+                lambda: {(p.id,): p.rate.loss for p in server.players.values()},
+                ("client",),
+            )
+        )
+        add(
+            Gauge(
+                "client_interpolation_delay_seconds",
+                "Interpolation delay each client reports rendering with.",
+                lambda: {
+                    (p.id,): p.interpolation_delay
+                    for p in server.players.values()
+                    if p.interpolation_delay is not None
+                },
+                ("client",),
+            )
+        )
+        add(
+            Gauge(
+                "dropped_snapshots",
+                "Snapshots superseded before being sent to connected clients.",
+                lambda: sum(c.dropped_snapshots for c in server.connected_clients),
+            )
+        )
+        add(
+            Gauge(
+                "connected_clients",
+                "Open client connections.",
+                lambda: len(server.connected_clients),
+            )
+        )
+        add(Gauge("players", "Players in rooms.", lambda: len(server.players)))
+        add(
+            Gauge(
+                "detached_players",
+                "Players held for a session resume.",
+                lambda: sum(1 for p in server.players.values() if p.connection is None),
+            )
+        )
+        add(
+            CallbackCounter(
+                "sessions_resumed_total",
+                "Sessions picked up by a reconnecting client.",
+                lambda: server.sessions_resumed,
+            )
+        )
+        add(Gauge("rooms", "Open rooms.", lambda: len(server.rooms)))
+
+    def read_queue_depths(self):
+        """Get the send backlog of every labelled connection."""
+        return {
+            (connection.label,): connection.backlog
+            for connection in self.server.connected_clients
+            if connection.label
+        }
+
+    def record_sent(self, client, data: bytes):
+        """Count one outbound message."""
+        size = len(data)
+        msg_type = (registry.peek_type(data),)
+        self.bytes_out.inc(size, (client,))
+        self.messages_out.inc(1, (client,))
+        self.type_bytes_out.inc(size, msg_type)
+        self.type_messages_out.inc(1, msg_type)
+
+    def record_received(self, client, data: bytes):
+        """Count one inbound message."""
+        size = len(data)
+        msg_type = (registry.peek_type(data),)
+        self.bytes_in.inc(size, (client,))
+        self.messages_in.inc(1, (client,))
+        self.type_bytes_in.inc(size, msg_type)
+        self.type_messages_in.inc(1, msg_type)
+
+    def forget_client(self, client):
+        """Drop a departed client's per-client series."""
+        for counter in (self.bytes_out, self.messages_out, self.bytes_in, self.messages_in):
+            counter.remove(0, client)
+
+
+class MetricsExporter:
+    """Serves metrics over HTTP, dumps them to JSON and samples loop lag.
+
+    Use as an async context manager around the server's lifetime. A port
+    of None or an empty dump path turns that exporter off; port 0 binds
+    any free port.
+    """
+
+    def __init__(
+        self,
+        metrics: ServerMetrics,
+        host=config.METRICS_HOST,
+        port=config.METRICS_PORT or None,
+        dump_path=config.METRICS_DUMP_PATH,
+        dump_interval=config.METRICS_DUMP_INTERVAL,
+    ):
+        """Initialize the exporter."""
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def __aenter__(self):
+        """Start the HTTP endpoint and background tasks."""
+        if self.port is not None:
+            self._server = await asyncio.start_server(self.handle_http, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"Metrics on http://{self.host}:{self.port}/metrics")
+        if self.dump_path:
+            self._tasks.append(asyncio.create_task(self.dump_loop()))
+        self._tasks.append(asyncio.create_task(self.sample_loop_lag()))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Stop everything."""
+        for task in self._tasks:
+            task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def handle_http(self, reader, writer):
+        """Answer one HTTP request."""
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4"
+                body = self.metrics.registry.render_prometheus().encode()
+            elif path == "/metrics.json":
+                status, content_type = "200 OK", "application/json"
+                body = json.dumps(self.metrics.registry.to_json()).encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def dump(self):
+        """Write the current metrics to the dump file atomically."""
+        temp_path = f"{self.dump_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.metrics.registry.to_json(), f)
+        os.replace(temp_path, self.dump_path)
+
+    async def dump_loop(self):
+        """Dump metrics every ``dump_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.dump_interval)
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"Metrics dump failed: {e}")
+
+    async def sample_loop_lag(self, interval=config.METRICS_LAG_INTERVAL):
+        """Measure how late the event loop wakes up from a timed sleep."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.metrics.loop_lag.observe(max(0.0, loop.time() - expected))
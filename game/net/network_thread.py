@@ -0,0 +1,68 @@
+"""Background thread running the client's asyncio event loop.
+
+The game thread belongs to Ursina/Panda3D, which never runs an asyncio
+loop. Client networking therefore gets its own loop on a daemon thread:
+socket I/O, message decoding and delta reconstruction happen there, and
+only decoded results cross to the game thread.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Coroutine, Optional
+
+
+class NetworkThread:
+    """An asyncio event loop on a daemon thread."""
+
+    def __init__(self, name="dog-network"):
+        """Initialize without starting the thread."""
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.started = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        """Check if the loop thread is alive."""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start the loop thread and wait until it accepts work."""
+        if self.running:
+            return
+        self.started.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def run(self):
+        """Run the loop until ``stop``, then cancel whatever is left."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        self.started.set()
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    def in_thread(self) -> bool:
+        """Check if the caller runs on the loop thread."""
+        return threading.current_thread() is self.thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout=1.0):
+        """Stop the loop and wait up to ``timeout`` for the thread to exit."""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if not self.in_thread():
+            self.thread.join(timeout)
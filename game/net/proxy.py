@@ -0,0 +1,616 @@
+"""Network-conditions proxy for testing over realistic links on localhost.
+
+The proxy sits between clients and a server, on the same port number for
+UDP and TCP (WebSocket), and impairs each direction of every client's
+traffic on its own::
+
+    client <-> proxy (listen port) <-> server (target port)
+
+A ``LinkShaper`` decides when each packet arrives, in this order:
+
+1. Bandwidth: packets queue at a bottleneck of ``bandwidth`` bits per
+   second. When more than ``queue`` bytes wait, new packets are dropped.
+2. Loss: packets are dropped at random. After a loss the next packet is
+   lost with ``loss_burst`` probability instead, like a congested Wi-Fi
+   link.
+3. Latency and jitter: a one-way delay drawn around ``latency`` with
+   ``jitter`` standard deviation. Packets stay in order unless
+   ``reorder`` holds one back behind later ones.
+
+TCP cannot lose or reorder data, so on streams a loss instead delays the
+chunk (and everything behind it) by a retransmission timeout.
+
+Named profiles (``PROFILES``) and timed scripts of them (``parse_script``)
+cover common links. Every packet can be logged as a JSON line with its
+size, direction and the delay it got. ``NetworkProxy`` is an async
+context manager, so tests can run clients through it in-process.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from game import config
+
+STREAM_CHUNK = 65536
+MIN_RETRANSMIT_TIMEOUT = 0.2
+
+
+@dataclass
+class LinkConditions:
+    """Impairments applied to one direction of traffic."""
+
+    latency: float = 0.0  # One-way delay in seconds
+    jitter: float = 0.0  # Standard deviation of the delay
+    loss: float = 0.0  # Probability a packet is dropped
+    loss_burst: float = 0.0  # Probability a packet is dropped right after a loss
+    reorder: float = 0.0  # Probability a packet is held back behind later ones
+    reorder_delay: float = 0.01  # How long a reordered packet is held back
+    bandwidth: float = 0.0  # Bits per second, 0 for unlimited
+    queue: int = 64 * 1024  # Bytes waiting at the bottleneck before tail drop
+
+
+@dataclass
+class Profile:
+    """Conditions for both directions of a link."""
+
+    name: str
+    up: LinkConditions  # Client to server
+    down: LinkConditions  # Server to client
+
+
+def symmetric(name, up_bandwidth=0.0, down_bandwidth=0.0, **conditions) -> Profile:
+    """Build a profile with the same impairments but its own bandwidth each way."""
+    return Profile(
+        name,
+        LinkConditions(bandwidth=up_bandwidth, **conditions),
+        LinkConditions(bandwidth=down_bandwidth, **conditions),
+    )
+
+
+PROFILES: Dict[str, Profile] = {
+    profile.name: profile
+    for profile in (
+        symmetric("perfect"),
+        symmetric("lan", latency=0.0005, jitter=0.0002),
+        symmetric(
+            "dsl",
+            latency=0.015,
+            jitter=0.002,
+            loss=0.001,
+            up_bandwidth=1e6,
+            down_bandwidth=16e6,
+        ),
+        symmetric(
+            "4g",
+            latency=0.03,
+            jitter=0.008,
+            loss=0.005,
+            loss_burst=0.1,
+            up_bandwidth=5e6,
+            down_bandwidth=20e6,
+        ),
+        symmetric(
+            "3g",
+            latency=0.09,
+            jitter=0.03,
+            loss=0.02,
+            loss_burst=0.25,
+            reorder=0.005,
+            up_bandwidth=384e3,
+            down_bandwidth=1.6e6,
+            queue=32 * 1024,
+        ),
+        symmetric(
+            "wifi-congested",
+            latency=0.01,
+            jitter=0.025,
+            loss=0.03,
+            loss_burst=0.4,
+            reorder=0.02,
+            up_bandwidth=2e6,
+            down_bandwidth=4e6,
+            queue=16 * 1024,
+        ),
+        symmetric(
+            "satellite",
+            latency=0.3,
+            jitter=0.01,
+            loss=0.005,
+            up_bandwidth=1e6,
+            down_bandwidth=10e6,
+        ),
+    )
+}
+
+
+def parse_script(script) -> List[Tuple[Profile, float]]:
+    """Parse ``"4g:10,3g:5"`` into ``(profile, seconds)`` steps.
+
+    A step without a duration lasts until the end.
+    """
+    steps = []
+    for step in script.split(","):
+        name, _, duration = step.strip().partition(":")
+        if name not in PROFILES:
+            raise ValueError(f"Unknown profile {name!r} (known: {', '.join(PROFILES)})")
+        steps.append((PROFILES[name], float(duration) if duration else float("inf")))
+    return steps
+
+
+class LinkStats:
+    """Counters for one direction of traffic."""
+
+    def __init__(self):
+        """Initialize all counters at zero."""
+        self.packets = 0
+        self.bytes = 0
+        self.delivered = 0
+        self.lost = 0
+        self.queue_drops = 0
+        self.reordered = 0
+        self.retransmits = 0  # Stream losses turned into delays
+        self.delay_total = 0.0
+        self.delay_max = 0.0
+
+    @property
+    def dropped(self) -> int:
+        """Get packets dropped for any reason."""
+        return self.lost + self.queue_drops
+
+    @property
+    def mean_delay(self) -> float:
+        """Get the mean delay of delivered packets in seconds."""
+        return self.delay_total / self.delivered if self.delivered else 0.0
+
+    def to_dict(self):
+        """Get the counters as a dict."""
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "delivered": self.delivered,
+            "lost": self.lost,
+            "queue_drops": self.queue_drops,
+            "reordered": self.reordered,
+            "retransmits": self.retransmits,
+            "mean_delay_ms": self.mean_delay * 1000,
+            "max_delay_ms": self.delay_max * 1000,
+        }
+
+
+class LinkShaper:
+    """Decides when (and whether) each packet in one direction arrives."""
+
+    def __init__(self, conditions: LinkConditions, rng: random.Random, stats: LinkStats):
+        """Initialize an idle link."""
+        self.conditions = conditions
+        self.rng = rng
+        self.stats = stats
+        self.link_free = 0.0  # When the bottleneck finishes sending its queue
+        self.last_delivery = 0.0  # Arrival time of the newest in-order packet
+        self.last_lost = False
+
+    def schedule(self, size, now, stream=False) -> Tuple[Optional[float], str]:
+        """Get the arrival time of a ``size`` byte packet sent at ``now``.
+
+        Returns ``(None, reason)`` for a dropped packet, otherwise
+        ``(arrival, event)``. Streams are never dropped or reordered.
+        """
+        conditions = self.conditions
+        stats = self.stats
+        stats.packets += 1
+        stats.bytes += size
+        event = "sent"
+
+        departure = now
+        if conditions.bandwidth > 0:
+            backlog = max(0.0, self.link_free - now) * conditions.bandwidth / 8
+            if backlog + size > conditions.queue and not stream:
+                stats.queue_drops += 1
+                return None, "queue"
+            self.link_free = max(now, self.link_free) + size * 8 / conditions.bandwidth
+            departure = self.link_free
+
+        chance = max(conditions.loss, conditions.loss_burst) if self.last_lost else conditions.loss
+        self.last_lost = self.rng.random() < chance
+        delay = max(0.0, conditions.latency + self.rng.gauss(0.0, conditions.jitter))
+        if self.last_lost:
+            if not stream:
+                stats.lost += 1
+                return None, "loss"
+            # Resent once the sender's timer fires
+            delay += max(MIN_RETRANSMIT_TIMEOUT, 4 * conditions.latency + 8 * conditions.jitter)
+            stats.retransmits += 1
+            event = "retransmit"
+
+        arrival = departure + delay
+        if not stream and self.rng.random() < conditions.reorder:
+            arrival = max(arrival, self.last_delivery) + conditions.reorder_delay
+            stats.reordered += 1
+            event = "reorder"
+        else:
+            arrival = max(arrival, self.last_delivery)
+            self.last_delivery = arrival
+
+        stats.delivered += 1
+        stats.delay_total += arrival - now
+        stats.delay_max = max(stats.delay_max, arrival - now)
+        return arrival, event
+
+
+class FrameLog:
+    """Writes one JSON line per packet: time, flow, direction, size, delay and event."""
+
+    def __init__(self, path=""):
+        """Open ``path`` for writing; an empty path logs nothing."""
+        self.file = open(path, "w") if path else None
+        self.started = time.monotonic()
+
+    def record(self, flow, direction, size, sent, arrival, event):
+        """Log one packet sent at loop time ``sent`` that arrives at ``arrival`` (or None)."""
+        if self.file is None:
+            return
+        entry = {
+            "t": round(time.monotonic() - self.started, 6),
+            "flow": flow,
+            "dir": direction,
+            "size": size,
+            "delay_ms": None if arrival is None else round((arrival - sent) * 1000, 3),
+            "event": event,
+        }
+        self.file.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        """Close the log file."""
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class Flow:
+    """One client's traffic through the proxy, shaped per direction."""
+
+    def __init__(self, proxy: "NetworkProxy", label):
+        """Create shapers for both directions with the proxy's current profile."""
+        self.proxy = proxy
+        self.label = label
+        self.up = LinkShaper(proxy.profile.up, proxy.rng, proxy.stats["up"])
+        self.down = LinkShaper(proxy.profile.down, proxy.rng, proxy.stats["down"])
+        self.last_seen = time.monotonic()
+
+    def shaper(self, direction) -> LinkShaper:
+        """Get the shaper for ``"up"`` or ``"down"``."""
+        return self.up if direction == "up" else self.down
+
+    def schedule(self, direction, size, stream=False) -> Optional[float]:
+        """Shape one packet and log it; get its arrival in loop time, or None."""
+        now = asyncio.get_running_loop().time()
+        self.last_seen = time.monotonic()
+        arrival, event = self.shaper(direction).schedule(size, now, stream)
+        self.proxy.log.record(self.label, direction, size, now, arrival, event)
+        return arrival
+
+
+class DatagramFlow(Flow, asyncio.DatagramProtocol):
+    """A client's UDP traffic, relayed through its own socket to the server."""
+
+    def __init__(self, proxy: "NetworkProxy", client_addr):
+        """Initialize before the upstream socket is open."""
+        Flow.__init__(self, proxy, f"udp {client_addr[0]}:{client_addr[1]}")
+        self.client_addr = client_addr
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.waiting: List[bytes] = []  # Sent before the upstream socket opened
+
+    def connection_made(self, transport):
+        """Send whatever arrived while the socket was opening."""
+        self.transport = transport
+        for data in self.waiting:
+            self.forward_up(data)
+        self.waiting = []
+
+    def datagram_received(self, data, addr):
+        """Relay a server datagram to the client."""
+        arrival = self.schedule("down", len(data))
+        if arrival is not None:
+            loop = asyncio.get_running_loop()
+            loop.call_at(arrival, self.proxy.send_to_client, data, self.client_addr)
+
+    def forward_up(self, data):
+        """Relay a client datagram to the server."""
+        if self.transport is None:
+            self.waiting.append(data)
+            return
+        arrival = self.schedule("up", len(data))
+        if arrival is not None:
+            asyncio.get_running_loop().call_at(arrival, self.send_up, data)
+
+    def send_up(self, data):
+        """Send a datagram whose delay has passed."""
+        if self.transport and not self.transport.is_closing():
+            self.transport.sendto(data)
+
+    def close(self):
+        """Close the upstream socket."""
+        if self.transport:
+            self.transport.close()
+
+
+class DatagramListener(asyncio.DatagramProtocol):
+    """The proxy's public UDP socket, opening a flow per client address."""
+
+    def __init__(self, proxy: "NetworkProxy"):
+        """Initialize without flows."""
+        self.proxy = proxy
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        """Keep the transport."""
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        """Relay a client datagram, opening a flow for new clients."""
+        flow = self.proxy.flows.get(addr)
+        if flow is None:
+            flow = DatagramFlow(self.proxy, addr)
+            self.proxy.flows[addr] = flow
+            loop = asyncio.get_running_loop()
+            loop.create_task(
+                loop.create_datagram_endpoint(
+                    lambda: flow, remote_addr=(self.proxy.target_host, self.proxy.target_port)
+                )
+            )
+        flow.forward_up(data)
+
+
+class StreamFlow(Flow):
+    """A client's TCP connection, relayed chunk by chunk in order."""
+
+    def __init__(self, proxy: "NetworkProxy", reader, writer):
+        """Initialize for an accepted client connection."""
+        peer = writer.get_extra_info("peername")
+        super().__init__(proxy, f"tcp {peer[0]}:{peer[1]}")
+        self.client_reader = reader
+        self.client_writer = writer
+
+    async def run(self):
+        """Connect upstream and pump both directions until either side closes."""
+        try:
+            server_reader, server_writer = await asyncio.open_connection(
+                self.proxy.target_host, self.proxy.target_port
+            )
+        except OSError:
+            self.client_writer.close()
+            return
+        await asyncio.gather(
+            self.pump("up", self.client_reader, server_writer),
+            self.pump("down", server_reader, self.client_writer),
+            return_exceptions=True,
+        )
+        for writer in (server_writer, self.client_writer):
+            writer.close()
+
+    async def pump(self, direction, reader, writer):
+        """Delay each chunk read from ``reader`` before writing it, keeping order."""
+        queue: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def deliver():
+            while True:
+                arrival, data = await queue.get()
+                if data is None:
+                    break
+                await asyncio.sleep(max(0.0, arrival - loop.time()))
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+
+        delivery = loop.create_task(deliver())
+        try:
+            while True:
+                data = await reader.read(STREAM_CHUNK)
+                if not data:
+                    break
+                queue.put_nowait((self.schedule(direction, len(data), stream=True), data))
+        finally:
+            queue.put_nowait((0.0, None))
+            await delivery
+
+
+class NetworkProxy:
+    """Async context manager relaying UDP and TCP from ``host:port`` to the target.
+
+    ``profile`` is a ``Profile`` or the name of one in ``PROFILES``. A
+    ``seed`` makes the impairments repeatable.
+    """
+
+    def __init__(
+        self,
+        target_host,
+        target_port,
+        host="127.0.0.1",
+        port=0,
+        profile="perfect",
+        seed=None,
+        log_path="",
+        tcp=True,
+    ):
+        """Initialize; sockets are bound on entry (port 0 picks a free one)."""
+        self.target_host = target_host
+        self.target_port = target_port
+        self.host = host
+        self.port = port
+        self.tcp = tcp
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        self.rng = random.Random(seed)
+        self.log = FrameLog(log_path)
+        self.stats = {"up": LinkStats(), "down": LinkStats()}
+        self.flows: Dict[tuple, DatagramFlow] = {}
+        self.streams: List[StreamFlow] = []
+        self.listener: Optional[DatagramListener] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.maintenance: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        """Bind the UDP socket, then TCP on the same port number."""
+        loop = asyncio.get_running_loop()
+        transport, self.listener = await loop.create_datagram_endpoint(
+            lambda: DatagramListener(self), local_addr=(self.host, self.port)
+        )
+        self.port = transport.get_extra_info("sockname")[1]
+        if self.tcp:
+            self.server = await asyncio.start_server(self.handle_stream, self.host, self.port)
+        self.maintenance = loop.create_task(self.expire_flows())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close every socket and the log."""
+        self.maintenance.cancel()
+        for flow in self.flows.values():
+            flow.close()
+        self.listener.transport.close()
+        if self.server:
+            self.server.close()
+            for flow in self.streams:
+                flow.client_writer.close()
+        self.log.close()
+
+    def set_profile(self, profile):
+        """Switch every flow, current and future, to another profile."""
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        flows = list(self.flows.values()) + self.streams
+        for flow in flows:
+            flow.up.conditions = self.profile.up
+            flow.down.conditions = self.profile.down
+
+    async def run_script(self, steps: List[Tuple[Profile, float]]):
+        """Apply each scripted profile for its duration."""
+        for profile, duration in steps:
+            print(f"Network profile: {profile.name}")
+            self.set_profile(profile)
+            await asyncio.sleep(duration)
+
+    def send_to_client(self, data, addr):
+        """Send a datagram whose delay has passed to a client."""
+        if not self.listener.transport.is_closing():
+            self.listener.transport.sendto(data, addr)
+
+    async def handle_stream(self, reader, writer):
+        """Relay one TCP client."""
+        flow = StreamFlow(self, reader, writer)
+        self.streams.append(flow)
+        try:
+            await flow.run()
+        finally:
+            self.streams.remove(flow)
+
+    async def expire_flows(self):
+        """Close UDP flows that have been idle longer than a session may be."""
+        while True:
+            await asyncio.sleep(1.0)
+            cutoff = time.monotonic() - config.UDP_TIMEOUT * 2
+            for addr, flow in list(self.flows.items()):
+                if flow.last_seen < cutoff:
+                    flow.close()
+                    del self.flows[addr]
+
+    def report(self):
+        """Get per-direction statistics."""
+        return {direction: stats.to_dict() for direction, stats in self.stats.items()}
+
+
+def print_report(report):
+    """Print per-direction proxy statistics."""
+    for direction, stats in report.items():
+        print(
+            f"{direction:>4}: {stats['packets']} packets, {stats['bytes'] / 1024:.1f} KiB, "
+            f"lost {stats['lost']}, queue drops {stats['queue_drops']}, "
+            f"reordered {stats['reordered']}, retransmits {stats['retransmits']}, "
+            f"delay mean {stats['mean_delay_ms']:.1f}ms max {stats['max_delay_ms']:.1f}ms"
+        )
+
+
+def conditions_from_args(args, direction, base: LinkConditions) -> LinkConditions:
+    """Apply ``--<field>`` and ``--<direction>-<field>`` overrides to ``base``."""
+    changes = {}
+    for field in dataclasses.fields(LinkConditions):
+        for name in (field.name, f"{direction}_{field.name}"):
+            value = getattr(args, name, None)
+            if value is not None:
+                changes[field.name] = value
+    return dataclasses.replace(base, **changes)
+
+
+def profile_from_args(args, profile: Profile) -> Profile:
+    """Apply the command line's overrides to both directions of ``profile``."""
+    return Profile(
+        profile.name,
+        conditions_from_args(args, "up", profile.up),
+        conditions_from_args(args, "down", profile.down),
+    )
+
+
+async def run_proxy(args):
+    """Run the proxy until interrupted."""
+    steps = parse_script(args.script) if args.script else [(PROFILES[args.profile], float("inf"))]
+    # Overrides hold for every scripted step, not just the first
+    steps = [(profile_from_args(args, profile), duration) for profile, duration in steps]
+    proxy = NetworkProxy(
+        args.target_host,
+        args.target_port,
+        args.host,
+        args.port,
+        steps[0][0],
+        seed=args.seed,
+        log_path=args.log,
+    )
+    async with proxy:
+        print(
+            f"Proxying {args.host}:{proxy.port} -> {args.target_host}:{args.target_port} "
+            f"(UDP and TCP)"
+        )
+        try:
+            if args.script:
+                await proxy.run_script(steps)
+            await asyncio.Event().wait()
+        finally:
+            print_report(proxy.report())
+
+
+def main():
+    """Main entry point for the network-conditions proxy."""
+    parser = argparse.ArgumentParser(description="Dog Go Around - Network Conditions Proxy")
+    parser.add_argument("--host", default="127.0.0.1", help="Address clients connect to")
+    parser.add_argument("--port", type=int, default=7778, help="Port clients connect to")
+    parser.add_argument("--target-host", default="127.0.0.1", help="Server host address")
+    parser.add_argument(
+        "--target-port", type=int, default=config.DEFAULT_SERVER_PORT, help="Server port"
+    )
+    parser.add_argument("--profile", default="perfect", choices=sorted(PROFILES), help="Profile")
+    parser.add_argument(
+        "--script", default="", help='Timed profiles, e.g. "4g:30,3g:10,wifi-congested:20"'
+    )
+    for direction in ("", "up-", "down-"):
+        side = f" ({direction[:-1]} only)" if direction else ""
+        parser.add_argument(f"--{direction}latency", type=float, help=f"Seconds{side}")
+        parser.add_argument(f"--{direction}jitter", type=float, help=f"Seconds{side}")
+        parser.add_argument(f"--{direction}loss", type=float, help=f"Probability{side}")
+        parser.add_argument(f"--{direction}reorder", type=float, help=f"Probability{side}")
+        parser.add_argument(f"--{direction}bandwidth", type=float, help=f"Bits/s{side}")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--log", default="", help="Write per-packet timing as JSON lines here")
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_proxy(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Per-client snapshot rate control.
+
+The server offers snapshots at ``SNAPSHOT_RATE``. Each client takes a
+share of those offers matching its own rate, which adapts to what its link
+delivers: additive increase while the link keeps up, multiplicative
+decrease on congestion. Congestion shows up as lost snapshots, RTT rising
+above the client's best, or the send queue backing up and superseding
+snapshots. Loss is counted exactly: input packets carry the newest
+snapshot the client decoded and how many it has received in total. The
+rate also sets a detail level that slows far-entity refreshes for clients
+on weak links.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from game import config
+
+# Detail levels: far entities are refreshed ``3 - detail`` times less often
+DETAIL_FULL = 2
+DETAIL_REDUCED = 1
+DETAIL_MINIMAL = 0
+
+
+class SnapshotRateController:
+    """Estimates one client's link quality and picks its snapshot rate."""
+
+    def __init__(
+        self,
+        min_rate=config.SNAPSHOT_RATE_MIN,
+        max_rate=config.SNAPSHOT_RATE,
+        adapt_interval=config.SNAPSHOT_RATE_ADAPT_INTERVAL,
+    ):
+        """Initialize at the maximum rate."""
+        self.min_rate = min(min_rate, max_rate)
+        self.max_rate = max_rate
+        self.adapt_interval = adapt_interval
+        self.rate = float(max_rate)
+        self.detail = DETAIL_FULL
+        self.credit = 0.0
+        self.sent_count = 0
+
+        # Link estimates
+        self.srtt: Optional[float] = None
+        self.rtt_min: Optional[float] = None
+        self.loss = 0.0
+        self.throughput = 0.0  # Bytes per second actually written
+
+        # Send time and running send count of each unacked snapshot; the
+        # client reports its running receive count with every ack
+        self.sent_times: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self.acked_sent = -1
+        self.acked_received = -1
+        self.period_start: Optional[float] = None
+        self.period_expected = 0
+        self.period_received = 0
+        self.last_sent_bytes = 0
+        self.last_dropped = 0
+
+    @property
+    def reported_rate(self) -> int:
+        """Get the rate as announced to the client."""
+        return round(self.rate)
+
+    def due(self) -> bool:
+        """Check if the client takes the snapshot being offered now."""
+        self.credit = min(1.0, self.credit + self.rate / self.max_rate)
+        if self.credit < 1.0 - 1e-9:
+            return False
+        self.credit -= 1.0
+        return True
+
+    def on_sent(self, seq, now=None):
+        """Record that snapshot ``seq`` was queued for the client."""
+        self.sent_count += 1
+        self.sent_times[seq] = (time.monotonic() if now is None else now, self.sent_count)
+        while len(self.sent_times) > config.SNAPSHOT_HISTORY_SIZE:
+            self.sent_times.popitem(last=False)
+
+    def on_ack(self, seq, received=-1, now=None):
+        """Record the client's newest snapshot ``seq`` and its running receive count."""
+        now = time.monotonic() if now is None else now
+        entry = self.sent_times.pop(seq, None)
+        # Everything older was either acked already or lost
+        while self.sent_times and next(iter(self.sent_times)) < seq:
+            self.sent_times.popitem(last=False)
+        if entry is None:
+            return
+        sent, sent_count = entry
+
+        if received >= 0 and self.acked_received >= 0:
+            self.period_expected += sent_count - self.acked_sent
+            self.period_received += received - self.acked_received
+        self.acked_sent = sent_count
+        self.acked_received = received
+
+        rtt = now - sent
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.srtt = rtt if self.srtt is None else 0.875 * self.srtt + 0.125 * rtt
+
+    def update(self, connection, now=None) -> bool:
+        """Re-estimate the link once per adapt interval and adjust the rate.
+
+        Returns True when the reported rate or detail level changed.
+        """
+        now = time.monotonic() if now is None else now
+        if self.period_start is None:
+            self.period_start = now
+            self.last_sent_bytes = connection.sent_bytes
+            self.last_dropped = connection.dropped_snapshots
+            return False
+
+        elapsed = now - self.period_start
+        if elapsed < self.adapt_interval:
+            return False
+
+        if self.period_expected > 0:
+            sample = 1.0 - min(1.0, self.period_received / self.period_expected)
+            self.loss = 0.75 * self.loss + 0.25 * sample
+        self.throughput = (connection.sent_bytes - self.last_sent_bytes) / elapsed
+        superseded = connection.dropped_snapshots - self.last_dropped
+        rtt_inflated = False
+        if self.srtt is not None:
+            rtt_inflated = self.srtt > self.rtt_min + config.SNAPSHOT_RTT_INFLATION
+            # Let the baseline follow lasting route changes
+            self.rtt_min += (self.srtt - self.rtt_min) * 0.02
+
+        congested = (
+            superseded > 0
+            or connection.backlog > 1
+            or self.loss > config.SNAPSHOT_LOSS_THRESHOLD
+            or rtt_inflated
+        )
+
+        previous = (self.reported_rate, self.detail)
+        if congested:
+            delivered = self.period_received / elapsed
+            target = self.rate * config.SNAPSHOT_RATE_BACKOFF
+            if delivered > 0:
+                target = min(target, max(delivered, self.min_rate))
+            self.rate = max(float(self.min_rate), target)
+        else:
+            self.rate = min(float(self.max_rate), self.rate + config.SNAPSHOT_RATE_STEP)
+        self.detail = self.detail_for(self.rate)
+
+        self.period_start = now
+        self.period_expected = self.period_received = 0
+        self.last_sent_bytes = connection.sent_bytes
+        self.last_dropped = connection.dropped_snapshots
+        return (self.reported_rate, self.detail) != previous
+
+    def detail_for(self, rate) -> int:
+        """Get the detail level for a snapshot rate."""
+        span = self.max_rate - self.min_rate
+        fraction = (rate - self.min_rate) / span if span > 0 else 1.0
+        if fraction > 2 / 3:
+            return DETAIL_FULL
+        if fraction > 1 / 3:
+            return DETAIL_REDUCED
+        return DETAIL_MINIMAL
+
+    def interpolation_delay(self) -> float:
+        """Get the interpolation delay a client should use at this rate."""
+        return config.INTERPOLATION_DELAY * self.max_rate / max(self.rate, 1.0)
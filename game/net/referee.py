@@ -0,0 +1,154 @@
+"""Authoritative checkpoint, pickup and contact detection for a room."""
+
+from typing import Any, Dict, List, Set
+
+import numpy as np
+
+from game import config
+from game.core import layout
+from game.net.lag_compensation import StateHistory, segment_hits_sphere
+
+
+class RaceReferee:
+    """Judges race events from the room's position history.
+
+    Checkpoints and pickups are tested against each car's swept path over
+    the last tick. Where other players matter, the referee rewinds to what
+    the player could see: a powerup counts as available if it was still
+    there at the player's view tick, and contacts compare the player's car
+    against the other cars as rendered on that player's screen.
+    """
+
+    def __init__(self, room, history: StateHistory):
+        """Initialize for ``room`` using its position ``history``."""
+        self.room = room
+        self.history = history
+        self.checkpoints = np.array(layout.CHECKPOINT_POSITIONS, dtype=np.float64)
+        self.powerups = np.array(layout.POWERUP_POSITIONS, dtype=np.float64)
+        self.respawn_ticks = round(layout.POWERUP_RESPAWN_TIME * config.TICKRATE)
+
+        # Tick each powerup was first taken (-1 while available) and who
+        # has collected it since, so nobody collects the same one twice
+        self.taken_tick = np.full(len(self.powerups), -1, dtype=np.int64)
+        self.collected_by: List[Set[str]] = [set() for _ in self.powerups]
+
+        self.contacts: Set[frozenset] = set()
+
+    def view_tick(self, player, tick) -> int:
+        """Get the tick a player is seeing other cars at, clamped to the history."""
+        if player.acked_seq < 0:
+            return tick
+        return self.history.clamp(min(tick, player.acked_seq - player.interpolation_ticks))
+
+    def update(self, tick) -> List[Dict[str, Any]]:
+        """Judge the tick just simulated and get the resulting race events."""
+        self.respawn_powerups(tick)
+        start, end, _ = self.history.segment(tick)
+
+        players = list(self.room.players.values())
+        if not players:
+            return []
+
+        slots = [player.slot for player in players]
+        start, end = start[slots], end[slots]
+
+        events = []
+        events.extend(self.check_checkpoints(players, start, end, tick))
+        events.extend(self.check_pickups(players, start, end, tick))
+        events.extend(self.check_contacts(tick))
+        return events
+
+    def check_checkpoints(self, players, start, end, tick):
+        """Advance the checkpoint of every player whose path crossed its next one."""
+        if not len(self.checkpoints):
+            return []
+
+        targets = [player.checkpoint % len(self.checkpoints) for player in players]
+        hits = segment_hits_sphere(start, end, self.checkpoints[targets], config.CHECKPOINT_RADIUS)
+
+        events = []
+        for row in np.flatnonzero(hits).tolist():
+            player = players[row]
+            player.checkpoint += 1
+            events.append(self.event("checkpoint", player, tick, index=player.checkpoint - 1))
+            if player.checkpoint >= len(self.checkpoints):
+                player.checkpoint = 0
+                player.lap += 1
+                events.append(self.event("lap", player, tick, lap=player.lap))
+        return events
+
+    def check_pickups(self, players, start, end, tick):
+        """Collect powerups on players' paths that were still visible to them."""
+        hits = segment_hits_sphere(
+            start[:, None], end[:, None], self.powerups[None], layout.POWERUP_RADIUS
+        )
+
+        events = []
+        for row, index in zip(*np.nonzero(hits)):
+            player, index = players[row], int(index)
+            if player.id in self.collected_by[index]:
+                continue
+            # Taken before this player could have seen it disappear
+            taken = int(self.taken_tick[index])
+            if 0 <= taken <= self.view_tick(player, tick):
+                continue
+
+            if taken < 0:
+                self.taken_tick[index] = tick
+            self.collected_by[index].add(player.id)
+            events.append(self.event("pickup", player, tick, index=index, powerup="boost"))
+        return events
+
+    def respawn_powerups(self, tick):
+        """Make powerups available again once their respawn time has passed."""
+        for index in np.flatnonzero(
+            (self.taken_tick >= 0) & (self.taken_tick + self.respawn_ticks <= tick)
+        ).tolist():
+            self.taken_tick[index] = -1
+            self.collected_by[index].clear()
+
+    def check_contacts(self, tick):
+        """Detect new car contacts, each judged at the instigator's view tick."""
+        players = list(self.room.players.values())
+        if len(players) < 2:
+            self.contacts.clear()
+            return []
+
+        slots = [player.slot for player in players]
+        view_ticks = [self.view_tick(player, tick) for player in players]
+        current = self.history.rewind(tick)[0][slots]
+
+        # Row i: where player i saw every other car, relative to its own car
+        rows = [self.history.row(view_tick) for view_tick in view_ticks]
+        seen = self.history.positions[rows][:, slots]
+        offsets = seen - current[:, None]
+        close = (offsets * offsets).sum(axis=-1) < config.CAR_CONTACT_RADIUS**2
+        close &= self.history.active[rows][:, slots]
+        np.fill_diagonal(close, False)
+
+        touching: Set[frozenset] = set()
+        events = []
+        for row, column in zip(*np.nonzero(close)):
+            player, other = players[row], players[column]
+            pair = frozenset((player.id, other.id))
+            if pair in touching:
+                continue
+            touching.add(pair)
+            if pair not in self.contacts:
+                events.append(
+                    self.event("contact", player, tick, other=other.id, view_tick=view_ticks[row])
+                )
+
+        self.contacts = touching
+        return events
+
+    @staticmethod
+    def event(kind, player, tick, **data):
+        """Build a race event message."""
+        return {"kind": kind, "player_id": player.id, "tick": tick, **data}
+
+    def reset_player(self, player_id):
+        """Forget a departed player's pickups and contacts."""
+        for collected in self.collected_by:
+            collected.discard(player_id)
+        self.contacts = {pair for pair in self.contacts if player_id not in pair}
@@ -0,0 +1,468 @@
+"""Race rooms hosted inside a single server process."""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from game import config
+from game.core.batch_physics import BatchPhysics, CarBatch
+from game.core.deterministic import (
+    DeterministicSimulation,
+    FixedInput,
+    Replay,
+    from_fixed,
+    yaw_to_degrees,
+)
+from game.net.delta import SnapshotHistory, encode_delta, index_entities
+from game.net.input_buffer import InputJitterBuffer
+from game.net.interest import InterestManager
+from game.net.lag_compensation import INTERPOLATION_TICKS, StateHistory
+from game.net.messages import (
+    SnapshotRateMessage,
+    SnapshotFrame,
+    StateSnapshot,
+    WireTable,
+    binary_snapshot_codec,
+    encode_snapshot_frame,
+    serialize_message,
+)
+from game.net.rate_control import SnapshotRateController
+from game.net.referee import RaceReferee
+
+
+class Player:
+    """Server-side player representation."""
+
+    def __init__(self, player_id, name, connection, cars, slot):
+        self.id = player_id
+        self.name = name
+        self.connection = connection
+        self.cars = cars
+        self.slot = slot
+        self.room: Optional["Room"] = None
+        self.inputs = InputJitterBuffer()
+        self.snapshot_history = SnapshotHistory()
+        self.view_versions = SnapshotHistory()  # Seq each sent entity's state dates from
+        self.acked_seq = -1
+        self.rate = SnapshotRateController()
+        self.interpolation_ticks = INTERPOLATION_TICKS  # Follows the client's delay
+        self.interpolation_delay: Optional[float] = None  # As reported by the client
+        self.codec = "msgpack"
+        self.session_token = ""
+        self.expiry: Optional[asyncio.TimerHandle] = None  # Pending removal while detached
+        self.ready = False
+        self.lap = 1
+        self.checkpoint = 0
+
+    @property
+    def position(self):
+        """Get car position."""
+        return self.cars.position[self.slot].tolist()
+
+    @property
+    def rotation(self):
+        """Get car rotation."""
+        return self.cars.get_rotation(self.slot)
+
+    @property
+    def velocity(self):
+        """Get car velocity."""
+        return self.cars.velocity[self.slot].tolist()
+
+    @property
+    def flags(self):
+        """Get drift/boost flags packed into an int."""
+        return int(self.cars.is_drifting[self.slot]) | int(self.cars.boost_active[self.slot]) << 1
+
+    def next_input(self):
+        """Get the input to simulate this tick (repeats the last on underrun)."""
+        return self.inputs.pop()
+
+
+class Room:
+    """One race: its players, car simulation, tick counter and broadcasts."""
+
+    def __init__(
+        self,
+        room_id,
+        max_players=config.MAX_PLAYERS,
+        track="default",
+        deterministic=config.DETERMINISTIC_SIMULATION,
+        seed=None,
+    ):
+        """Initialize an empty room.
+
+        With ``deterministic`` the cars are simulated in fixed point by a
+        ``DeterministicSimulation`` (mirrored into ``cars`` for snapshots)
+        and every tick is hashed. The inputs are recorded as a ``Replay``
+        only when ``REPLAY_DIR`` is set to save it into on close.
+        """
+        self.id = room_id
+        self.max_players = max_players
+        self.track = track
+        self.players: Dict[str, Player] = {}
+        self.cars = CarBatch(max_players)
+        self.physics = BatchPhysics()
+        self.tick = 0
+        self.tick_time = time.monotonic()  # Server time of the current tick
+        self.created_at = time.time()
+        self.interest = InterestManager()
+        self.history = StateHistory(slots=max_players)
+        self.referee = RaceReferee(self, self.history)
+
+        # Slots of recently departed players, so removals can still be
+        # encoded for clients whose baseline predates the departure
+        self.departed_slots: "OrderedDict[str, int]" = OrderedDict()
+
+        self.simulation: Optional[DeterministicSimulation] = None
+        self.state_hashes: "OrderedDict[int, int]" = OrderedDict()
+        if deterministic:
+            seed = uuid.uuid4().int & 0xFFFFFFFF if seed is None else seed
+            replay = Replay(seed=seed, tick_rate=config.TICKRATE) if config.REPLAY_DIR else None
+            self.simulation = DeterministicSimulation(seed, config.TICKRATE, replay)
+
+    @property
+    def replay(self) -> Optional[Replay]:
+        """Get the replay being recorded, if the room is deterministic and saves replays."""
+        return self.simulation.replay if self.simulation else None
+
+    def is_full(self):
+        """Check if the room has no free player slots."""
+        return len(self.players) >= self.max_players
+
+    def is_empty(self):
+        """Check if the room has no players."""
+        return not self.players
+
+    def add_player(self, player_id, name, connection):
+        """Create a player in this room and give it a car slot."""
+        player = Player(player_id, name, connection, self.cars, self.cars.allocate())
+        player.room = self
+        if self.simulation:
+            self.simulation.add_car(
+                player.slot, self.cars.position[player.slot], self.cars.yaw[player.slot]
+            )
+        self.players[player_id] = player
+        return player
+
+    def remove_player(self, player_id):
+        """Remove a player and free its car slot."""
+        player = self.players.pop(player_id, None)
+        if player:
+            self.cars.release(player.slot)
+            if self.simulation:
+                self.simulation.remove_car(player.slot)
+            self.referee.reset_player(player_id)
+            player.room = None
+            self.departed_slots[player_id] = player.slot
+            while len(self.departed_slots) > self.max_players * 4:
+                self.departed_slots.popitem(last=False)
+        return player
+
+    def step(self, dt, now=None):
+        """Advance the room simulation by one tick scheduled at server time ``now``."""
+        self.tick_time = time.monotonic() if now is None else now
+        if self.simulation:
+            self.step_deterministic()
+        else:
+            for player in self.players.values():
+                self.cars.set_car_input(player.slot, player.next_input())
+            self.physics.step(self.cars, dt)
+            self.tick += 1
+        self.history.record(self.tick, self.cars)
+
+        for event in self.referee.update(self.tick):
+            self.broadcast_message("race_event", event)
+
+    def step_deterministic(self):
+        """Advance the fixed-point simulation one tick and mirror it into ``cars``."""
+        sim = self.simulation
+        for player in self.players.values():
+            sim.set_input(player.slot, FixedInput.from_input(player.next_input()))
+        self.tick = sim.step()
+        if sim.replay is not None:
+            sim.replay.end_tick = self.tick
+
+        cars = self.cars
+        for slot, state in sim.cars.items():
+            cars.position[slot] = [from_fixed(v) for v in state.position]
+            cars.velocity[slot] = [from_fixed(v) for v in state.velocity]
+            cars.yaw[slot] = yaw_to_degrees(state.yaw)
+            cars.is_drifting[slot] = state.is_drifting
+            cars.is_on_ground[slot] = state.is_on_ground
+            cars.boost_active[slot] = state.boost_active
+
+        self.state_hashes[self.tick] = sim.state_hash()
+        while len(self.state_hashes) > config.STATE_HASH_HISTORY:
+            self.state_hashes.popitem(last=False)
+
+    def save_replay(self, directory) -> Optional[str]:
+        """Write the recorded replay into ``directory`` and get its path."""
+        if not self.replay or not self.replay.events:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}-{int(self.created_at)}.replay")
+        self.replay.save(path)
+        return path
+
+    def build_state_snapshot(self):
+        """Build a game state snapshot for the current tick."""
+        players_data = []
+
+        for player in self.players.values():
+            players_data.append(
+                {
+                    "id": player.id,
+                    "name": player.name,
+                    "position": player.position,
+                    "rotation": player.rotation,
+                    "velocity": player.velocity,
+                    "lap": player.lap,
+                    "checkpoint": player.checkpoint,
+                    "flags": player.flags,
+                }
+            )
+
+        return StateSnapshot(
+            timestamp=self.tick_time, players=players_data, tick=self.tick, seq=self.tick
+        )
+
+    def send_snapshots(self, now=None) -> int:
+        """Offer a snapshot, sending it to the players whose rate takes it.
+
+        Each player's view is filtered by spatial interest and delta-encoded
+        against that player's last ack, so views (and the history kept to
+        delta against them) are per player. Players whose ack fell out of
+        the history window get a full view. Players with the same view and
+        baseline share one encoded frame. Returns the number sent.
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        for player in self.players.values():
+            if not player.connection:
+                continue
+            if player.rate.update(player.connection, now):
+                self.send_rate(player)
+            if player.rate.due():
+                due.append(player)
+        if not due:
+            return 0
+
+        snapshot = self.build_state_snapshot()
+        current = index_entities(snapshot.players)
+        slots = self.snapshot_slots()
+        self.interest.update(self.players.values())
+        diff_cache: Dict[tuple, tuple] = {}
+        frames: Dict[tuple, SnapshotFrame] = {}
+        table = None
+        if any(player.codec == "binary" for player in due):
+            table = self.quantize_snapshot(snapshot)
+
+        for player in due:
+            self.send_view(player, snapshot, current, slots, diff_cache, now, table, frames)
+
+        return len(due)
+
+    def send_keyframe(self, player, now=None):
+        """Send one player a full snapshot at once, outside its rate schedule."""
+        now = time.monotonic() if now is None else now
+        player.acked_seq = -1
+        snapshot = self.build_state_snapshot()
+        self.interest.update(self.players.values())
+        current = index_entities(snapshot.players)
+        self.send_view(player, snapshot, current, self.snapshot_slots(), {}, now)
+
+    def quantize_snapshot(self, snapshot) -> WireTable:
+        """Quantize a snapshot's entities for binary clients straight from the car arrays."""
+        players = list(self.players.values())
+        table = WireTable(binary_snapshot_codec)
+        table.add_cars(
+            [(entity["id"], snapshot.seq) for entity in snapshot.players],
+            self.cars,
+            [player.slot for player in players],
+            [player.lap for player in players],
+            [player.checkpoint for player in players],
+        )
+        return table
+
+    def snapshot_slots(self) -> Dict[str, int]:
+        """Get the car slot of every current and recently departed player."""
+        slots = dict(self.departed_slots)
+        slots.update((player.id, player.slot) for player in self.players.values())
+        return slots
+
+    def send_view(self, player, snapshot, current, slots, diff_cache, now, table=None, frames=None):
+        """Send a player its view of ``snapshot``, delta-encoded against its last ack.
+
+        Every entity state is versioned by the snapshot seq it was taken
+        from, so ``frames`` caches encoded frames for the pass by codec,
+        baseline seq and the versions in the baseline and the view, which
+        fix the delta; only the recipient's input tick differs between
+        sharers.
+        """
+        baseline = player.snapshot_history.get(player.acked_seq)
+        baseline_seq = player.acked_seq if baseline is not None else -1
+        base_versions = player.view_versions.get(baseline_seq) or {}
+        sent_versions = player.view_versions.get(player.view_versions.latest_seq()) or {}
+
+        view = self.interest.build_view(player, baseline, current, player.rate.sent_count)
+        # Entities not taken from ``current`` are carried over from the last view sent
+        versions = {}
+        for entity_id, entity in view.items():
+            fresh = entity is current.get(entity_id)
+            versions[entity_id] = snapshot.seq if fresh else sent_versions[entity_id]
+        key = (
+            player.codec,
+            baseline_seq,
+            frozenset(base_versions.items()),
+            frozenset(versions.items()),
+        )
+        frame = frames.get(key) if frames is not None else None
+        if frame is None:
+            players, removed = encode_delta(baseline, view, diff_cache)
+            delta = StateSnapshot(
+                timestamp=snapshot.timestamp,
+                players=players,
+                tick=snapshot.tick,
+                seq=snapshot.seq,
+                baseline=baseline_seq,
+                removed=removed,
+            )
+            wire_versions = {
+                entity_id: (base_versions.get(entity_id, -1), version)
+                for entity_id, version in versions.items()
+            }
+            frame = encode_snapshot_frame(delta, player.codec, slots, view, table, wire_versions)
+            if frames is not None:
+                frames[key] = frame
+
+        player.snapshot_history.store(snapshot.seq, view)
+        player.view_versions.store(snapshot.seq, versions)
+        player.connection.send(frame.finish(player.inputs.last_tick), droppable=True)
+        player.rate.on_sent(snapshot.seq, now)
+
+    def send_rate(self, player):
+        """Tell a player its new snapshot rate and detail level."""
+        rate = player.rate
+        if player.interpolation_delay is None:
+            # Clients that don't report their delay derive it from the rate
+            player.interpolation_ticks = round(rate.interpolation_delay() * config.TICKRATE)
+        message = SnapshotRateMessage(rate=rate.reported_rate, detail=rate.detail)
+        player.connection.send(serialize_message("snapshot_rate", message))
+
+    def build_roster(self):
+        """Build the slot-to-player mapping used by binary snapshots."""
+        return {
+            "players": [
+                {"slot": p.slot, "id": p.id, "name": p.name} for p in self.players.values()
+            ]
+        }
+
+    def build_lobby_state(self):
+        """Build a lobby state update for this room."""
+        return {
+            "players": [
+                {"id": p.id, "name": p.name, "ready": p.ready} for p in self.players.values()
+            ],
+            "track": self.track,
+            "ready_count": sum(1 for p in self.players.values() if p.ready),
+        }
+
+    def broadcast_message(self, msg_type, data, droppable=False):
+        """Queue a message for every player in this room.
+
+        Droppable messages (snapshots) may be superseded by newer ones if a
+        client falls behind; everything else is delivered in order.
+        """
+        if self.players:
+            message = serialize_message(msg_type, data)
+            for player in self.players.values():
+                if player.connection:
+                    player.connection.send(message, droppable)
+
+
+class RoomManager:
+    """Creates, finds and tears down rooms."""
+
+    def __init__(self, max_rooms=config.MAX_ROOMS, on_close=None, on_create=None):
+        """Initialize with no rooms."""
+        self.max_rooms = max_rooms
+        self.on_close = on_close
+        self.on_create = on_create
+        self.rooms: Dict[str, Room] = {}
+
+    def __len__(self):
+        """Get number of open rooms."""
+        return len(self.rooms)
+
+    def player_count(self):
+        """Get number of players across all rooms."""
+        return sum(len(room.players) for room in self.rooms.values())
+
+    def get(self, room_id) -> Optional[Room]:
+        """Get a room by id."""
+        return self.rooms.get(room_id)
+
+    def create_room(self, room_id=None) -> Room:
+        """Create a new room, generating an id if none is given."""
+        if len(self.rooms) >= self.max_rooms:
+            raise RoomError("Server is at room capacity")
+
+        room_id = room_id or uuid.uuid4().hex[:8]
+        room = Room(room_id)
+        self.rooms[room_id] = room
+        print(f"Room {room_id} created")
+        if self.on_create:
+            self.on_create(room)
+        return room
+
+    def find_room(self, room_id="") -> Room:
+        """Find the room a join request should go to.
+
+        A named room is joined (and created if missing). Without a name the
+        fullest room that still has space is used, so small races fill up
+        before new ones open.
+        """
+        if room_id:
+            room = self.rooms.get(room_id) or self.create_room(room_id)
+            if room.is_full():
+                raise RoomError(f"Room {room_id} is full")
+            return room
+
+        open_rooms = [room for room in self.rooms.values() if not room.is_full()]
+        if open_rooms:
+            return max(open_rooms, key=lambda room: len(room.players))
+        return self.create_room()
+
+    def close_room(self, room_id):
+        """Tear down a room."""
+        room = self.rooms.pop(room_id, None)
+        if room:
+            print(f"Room {room_id} closed")
+            if config.REPLAY_DIR:
+                path = room.save_replay(config.REPLAY_DIR)
+                if path:
+                    print(f"Replay saved to {path}")
+            if self.on_close:
+                self.on_close(room)
+
+    def remove_player(self, player):
+        """Remove a player from its room, closing the room once empty."""
+        room = player.room
+        if not room:
+            return
+        room.remove_player(player.id)
+        if room.is_empty():
+            self.close_room(room.id)
+
+    def step_all(self, dt, now=None):
+        """Advance every room by one tick."""
+        for room in list(self.rooms.values()):
+            room.step(dt, now)
+
+
+class RoomError(Exception):
+    """Raised when a player cannot be placed in a room."""
@@ -2,53 +2,78 @@
 
 import asyncio
 import argparse
+import contextlib
+import os
+import secrets
 import time
-from typing import Dict, Set
+import uuid
+from typing import Dict, Optional, Set
 import websockets
 from game import config
+from game.core.simulation import CarInput
+from game.net.connection import ClientConnection
 from game.net.messages import (
     deserialize_message,
+    dispatch,
     serialize_message,
-    StateSnapshot,
+    JoinErrorMessage,
+    JoinResponseMessage,
     LobbyStateMessage,
+    PongMessage,
+    RedirectMessage,
+    SNAPSHOT_CODECS,
 )
-
-
-class Player:
-    """Server-side player representation."""
-
-    def __init__(self, player_id, name, websocket):
-        self.id = player_id
-        self.name = name
-        self.websocket = websocket
-        self.position = [0, 1, 0]
-        self.rotation = [0, 0, 0]
-        self.velocity = [0, 0, 0]
-        self.ready = False
-        self.lap = 1
-        self.checkpoint = 0
+from game.net.metrics import MetricsExporter, ServerMetrics
+from game.net.rooms import Player, RoomError, RoomManager
+from game.net.supervisor import run_supervisor, worker_port
+from game.net.tick import TickScheduler
+from game.net.transport import DatagramServer, TransportClosedError
 
 
 class NetworkServer:
     """Authoritative game server with lobby and room management."""
 
-    def __init__(self, host="0.0.0.0", port=7777):
+    def __init__(self, host="0.0.0.0", port=7777, worker_index=None, directory=None):
         self.host = host
         self.port = port
+        self.worker_index = worker_index
+        self.directory = directory
         self.players: Dict[str, Player] = {}
-        self.connected_clients: Set = set()
+        self.connected_clients: Set[ClientConnection] = set()
         self.running = False
         self.tick_rate = config.TICKRATE
         self.snapshot_rate = config.SNAPSHOT_RATE
-        self.last_snapshot_time = 0
+        self.ticks_per_snapshot = max(1, round(self.tick_rate / self.snapshot_rate))
+        self.scheduler = TickScheduler(
+            self.tick_rate,
+            self.on_tick,
+            max_catchup=config.MAX_CATCHUP_TICKS,
+            on_overrun=self.on_tick_overrun,
+        )
+        self.rooms = RoomManager(on_close=self.on_room_closed, on_create=self.on_room_created)
         self.player_counter = 0
 
-    async def handle_client(self, websocket, path):
-        """Handle a connected client."""
+        # Session token -> player id; players stay resumable for the grace
+        # period after their connection drops
+        self.sessions: Dict[str, str] = {}
+        self.sessions_resumed = 0
+
+        self.metrics = ServerMetrics(self)
+
+        # Client message type -> handler(player, data)
+        self.message_handlers = {
+            "input": self.handle_input,
+            "chat": self.handle_chat,
+            "ready": self.handle_ready,
+            "ping": self.handle_ping,
+        }
+
+    async def handle_client(self, websocket, path=None):
+        """Handle a connected client (a WebSocket or a datagram session)."""
         player_id = None
+        connection = ClientConnection(websocket, metrics=self.metrics)
 
         try:
-            self.connected_clients.add(websocket)
             print(f"Client connected from {websocket.remote_address}")
 
             # Wait for join message
@@ -56,111 +81,335 @@ class NetworkServer:
             message = deserialize_message(data)
 
             if message["type"] == "join":
-                player_id = f"player_{self.player_counter}"
-                self.player_counter += 1
-
-                player_name = message["data"]["player_name"]
-                player = Player(player_id, player_name, websocket)
-                self.players[player_id] = player
-
-                # Send player ID
-                response = serialize_message("join_response", {"player_id": player_id})
+                # A known session token picks the held player up again
+                player = self.resume_session(message["data"].get("session_token", ""), connection)
+                resumed = player is not None
+                if not resumed:
+                    player = await self.admit_player(websocket, connection, message["data"])
+                    if player is None:
+                        return
+                player_id = player.id
+
+                # Send player ID, room, car slot, snapshot codec and session
+                response = serialize_message(
+                    "join_response",
+                    JoinResponseMessage(
+                        player_id=player_id,
+                        room_id=player.room.id,
+                        slot=player.slot,
+                        codec=player.codec,
+                        session_token=player.session_token,
+                        resumed=resumed,
+                    ),
+                )
                 await websocket.send(response)
 
-                print(f"Player {player_name} joined as {player_id}")
+                # From here on all sends go through the writer task
+                connection.label = player_id
+                self.metrics.record_sent(player_id, response)
+                self.connected_clients.add(connection)
+                connection.start()
+
+                if resumed:
+                    # Skip the lobby: roster and a full snapshot right away
+                    connection.send(serialize_message("roster", player.room.build_roster()))
+                    player.room.send_keyframe(player)
+                    print(f"Player {player.name} resumed {player_id} in room {player.room.id}")
+                else:
+                    print(f"Player {player.name} joined room {player.room.id} as {player_id}")
 
                 # Handle player messages
                 async for msg in websocket:
                     await self.handle_message(player_id, msg)
 
-        except websockets.exceptions.ConnectionClosed:
+        except (websockets.exceptions.ConnectionClosed, TransportClosedError):
             print(f"Client {player_id} disconnected")
         finally:
-            self.connected_clients.discard(websocket)
-            if player_id and player_id in self.players:
-                del self.players[player_id]
+            self.connected_clients.discard(connection)
+            connection.close()
+            player = self.players.get(player_id) if player_id else None
+            if player is not None and player.connection is connection:
+                self.detach_player(player)
+
+    async def admit_player(self, websocket, connection, data) -> Optional[Player]:
+        """Place a joining client in a room, or answer with a redirect or error."""
+        room_id = data.get("room_id", "")
+        codec = data.get("codec", "msgpack")
+        if codec not in SNAPSHOT_CODECS:
+            codec = "msgpack"
+
+        # Hand the client over if another worker owns the room
+        room_id, owner = await self.route_room(room_id)
+        if owner is not None and owner != self.worker_index:
+            redirect = RedirectMessage(port=worker_port(self.port, owner), room_id=room_id)
+            await websocket.send(serialize_message("redirect", redirect))
+            return None
+
+        try:
+            player = self.add_player(
+                f"player_{self.player_counter}",
+                data["player_name"],
+                connection,
+                room_id,
+                codec=codec,
+            )
+        except RoomError as e:
+            await websocket.send(serialize_message("join_error", JoinErrorMessage(reason=str(e))))
+            return None
+
+        self.player_counter += 1
+        return player
+
+    def resume_session(self, token, connection) -> Optional[Player]:
+        """Attach a new connection to the player holding session ``token``."""
+        player = self.players.get(self.sessions.get(token, "")) if token else None
+        if player is None:
+            return None
+        if player.expiry:
+            player.expiry.cancel()
+            player.expiry = None
+        if player.connection is not None:
+            # The old connection hasn't noticed it is dead yet
+            self.connected_clients.discard(player.connection)
+            player.connection.close()
+        player.connection = connection
+        self.sessions_resumed += 1
+        return player
+
+    def detach_player(self, player):
+        """Hold a disconnected player for the grace period, or remove it."""
+        if config.SESSION_GRACE_PERIOD <= 0:
+            self.remove_player(player.id)
+            return
+
+        # The car coasts, and keeps its place in the race
+        player.connection = None
+        player.inputs.release()
+        player.expiry = asyncio.get_running_loop().call_later(
+            config.SESSION_GRACE_PERIOD, self.expire_session, player.id
+        )
+
+    def expire_session(self, player_id):
+        """Remove a player whose grace period ran out."""
+        player = self.players.get(player_id)
+        if player is not None and player.connection is None:
+            print(f"Session of {player_id} expired")
+            self.remove_player(player_id)
+
+    async def route_room(self, room_id):
+        """Resolve the room a join goes to and the worker that owns it.
+
+        Returns ``(room_id, worker_index)``; the worker is ``None`` when not
+        running under the supervisor.
+        """
+        if not self.directory:
+            return room_id, None
+
+        if not room_id:
+            # Prefer an open room on this worker, otherwise open a new one
+            # on whichever worker is least loaded.
+            local = [r for r in self.rooms.rooms.values() if not r.is_full()]
+            if local:
+                return max(local, key=lambda r: len(r.players)).id, self.worker_index
+            room_id = uuid.uuid4().hex[:8]
+
+        if self.rooms.get(room_id):
+            return room_id, self.worker_index
+
+        loop = asyncio.get_running_loop()
+        owner = await loop.run_in_executor(None, self.directory.assign, room_id)
+        return room_id, owner
+
+    def add_player(self, player_id, name, connection, room_id="", codec="msgpack") -> Player:
+        """Place a new player in a room."""
+        room = self.rooms.find_room(room_id)
+        player = room.add_player(player_id, name, connection)
+        player.codec = codec
+        player.session_token = secrets.token_urlsafe(16)
+        self.sessions[player.session_token] = player_id
+        self.players[player_id] = player
+        room.broadcast_message("roster", room.build_roster())
+        self.report_load()
+        return player
+
+    def remove_player(self, player_id):
+        """Remove a player, tearing down its room once empty."""
+        player = self.players.pop(player_id)
+        self.sessions.pop(player.session_token, None)
+        if player.expiry:
+            player.expiry.cancel()
+            player.expiry = None
+        self.metrics.forget_client(player_id)
+        room = player.room
+        self.rooms.remove_player(player)
+        if room and not room.is_empty():
+            room.broadcast_message("roster", room.build_roster())
+        self.report_load()
+
+    def on_room_created(self, room):
+        """Claim a room in the shared directory once it really exists."""
+        if self.directory:
+            self._directory_call(self.directory.claim, room.id, self.worker_index)
+
+    def on_room_closed(self, room):
+        """Release a torn-down room from the shared directory."""
+        if self.directory:
+            self._directory_call(self.directory.release, room.id)
+
+    def report_load(self):
+        """Publish this worker's player count to the supervisor."""
+        if self.directory:
+            self._directory_call(
+                self.directory.set_load, self.worker_index, len(self.players)
+            )
+
+    def _directory_call(self, func, *args):
+        """Run a directory update off the event loop."""
+        asyncio.get_running_loop().run_in_executor(None, func, *args)
 
     async def handle_message(self, player_id, data):
         """Handle message from player."""
+        self.metrics.record_received(player_id, data)
         try:
             message = deserialize_message(data)
-            msg_type = message["type"]
-            msg_data = message["data"]
-
-            if msg_type == "input":
-                # Update player state based on input
-                player = self.players.get(player_id)
-                if player:
-                    # Store input for processing
-                    pass  # Input processing would go here
-
-            elif msg_type == "chat":
-                # Broadcast chat message
-                await self.broadcast_message("chat", msg_data)
-
-            elif msg_type == "ready":
-                player = self.players.get(player_id)
-                if player:
-                    player.ready = msg_data.get("ready", False)
-
+            player = self.players.get(player_id)
+            if player:
+                dispatch(message, self.message_handlers, player)
         except Exception as e:
             print(f"Error handling message: {e}")
 
-    async def broadcast_message(self, msg_type, data):
-        """Broadcast message to all connected clients."""
+    def handle_chat(self, player, msg_data):
+        """Broadcast chat message to the sender's room."""
+        if player.room:
+            player.room.broadcast_message("chat", msg_data)
+
+    def handle_ready(self, player, msg_data):
+        """Update a player's ready flag and the room's lobby state."""
+        if player.room:
+            player.ready = msg_data.get("ready", False)
+            lobby = LobbyStateMessage(**player.room.build_lobby_state())
+            player.room.broadcast_message("lobby_state", lobby)
+
+    def handle_ping(self, player, msg_data):
+        """Answer a clock sync ping with the server clock and the room tick."""
+        pong = PongMessage(
+            client_time=msg_data["client_time"],
+            server_time=time.monotonic(),
+            tick=player.room.tick if player.room else 0,
+        )
+        if player.connection:
+            player.connection.send(serialize_message("pong", pong))
+
+    def handle_input(self, player, msg_data):
+        """Buffer player inputs for upcoming simulation ticks.
+
+        Packets carry the newest input plus a few earlier ones; the jitter
+        buffer drops the copies it has already seen.
+        """
+        for entry in msg_data.get("inputs", ()):
+            tick, throttle, steer, brake, handbrake, boost = entry
+            player.inputs.push(tick, CarInput(throttle, steer, brake, handbrake, boost))
+
+        tick = msg_data.get("tick", -1)
+        player.inputs.push(tick if tick >= 0 else None, CarInput.from_message(msg_data))
+
+        # Inputs carry the newest snapshot the client has decoded
+        ack = msg_data.get("ack", -1)
+        if ack > player.acked_seq:
+            player.acked_seq = ack
+            player.rate.on_ack(ack, msg_data.get("received", -1))
+
+        # Lag compensation rewinds by the delay the client actually renders
+        # with, kept within what an honest client can report
+        delay = msg_data.get("delay", -1.0)
+        if delay >= 0:
+            delay = min(max(delay, config.INTERPOLATION_DELAY_MIN), config.INTERPOLATION_DELAY_MAX)
+            player.interpolation_delay = delay
+            player.interpolation_ticks = round(delay * config.TICKRATE)
+
+    def broadcast_message(self, msg_type, data, droppable=False):
+        """Queue a message for all connected clients."""
         if self.connected_clients:
             message = serialize_message(msg_type, data)
-            await asyncio.gather(
-                *[client.send(message) for client in self.connected_clients],
-                return_exceptions=True,
-            )
+            for connection in self.connected_clients:
+                connection.send(message, droppable)
 
     async def game_loop(self):
-        """Main game loop for state updates."""
-        while self.running:
-            current_time = time.time()
-
-            # Send snapshots at configured rate
-            if current_time - self.last_snapshot_time >= 1.0 / self.snapshot_rate:
-                await self.send_state_snapshot()
-                self.last_snapshot_time = current_time
-
-            # Wait for next tick
-            await asyncio.sleep(1.0 / self.tick_rate)
-
-    async def send_state_snapshot(self):
-        """Send game state snapshot to all clients."""
-        players_data = []
-
-        for player in self.players.values():
-            players_data.append(
-                {
-                    "id": player.id,
-                    "name": player.name,
-                    "position": player.position,
-                    "rotation": player.rotation,
-                    "velocity": player.velocity,
-                    "lap": player.lap,
-                    "checkpoint": player.checkpoint,
-                }
+        """Main game loop, driven by the fixed-timestep tick scheduler."""
+        await self.scheduler.run()
+
+    def on_tick(self, tick):
+        """Advance every room by one tick."""
+        started = time.perf_counter()
+        self.rooms.step_all(self.scheduler.interval, self.scheduler.tick_time)
+
+        # Offer snapshots on room tick boundaries at the maximum rate; each
+        # client takes the share its link can carry
+        for room in self.rooms.rooms.values():
+            if room.tick % self.ticks_per_snapshot == 0:
+                encode_started = time.perf_counter()
+                if room.send_snapshots():
+                    self.metrics.snapshot_encode.observe(time.perf_counter() - encode_started)
+
+        self.metrics.tick_duration.observe(time.perf_counter() - started)
+
+    def on_tick_overrun(self, tick, duration):
+        """Report a tick that took longer than its time slice."""
+        if config.DEBUG_MODE:
+            print(
+                f"Tick {tick} overran: {duration * 1000:.2f}ms "
+                f"(budget {self.scheduler.interval * 1000:.2f}ms)"
             )
 
-        snapshot = StateSnapshot(timestamp=time.time(), players=players_data)
+    def stop(self):
+        """Stop the game loop."""
+        self.running = False
+        self.scheduler.stop()
 
-        await self.broadcast_message("state", snapshot)
+    def listen_ports(self):
+        """Get ``(port, reuse_port)`` pairs to listen on."""
+        if self.directory is None:
+            return [(self.port, False)]
+        # Worker: share the public port and listen on a private one for redirects
+        return [(self.port, True), (worker_port(self.port, self.worker_index), False)]
 
     async def start(self):
         """Start the server."""
         self.running = True
         print(f"Starting server on {self.host}:{self.port}")
 
-        # Start WebSocket server
-        async with websockets.serve(self.handle_client, self.host, self.port):
-            print(f"Server listening on ws://{self.host}:{self.port}")
-
-            # Start game loop
+        async with contextlib.AsyncExitStack() as stack:
+            for port, reuse_port in self.listen_ports():
+                # WebSocket on TCP, datagram sessions on the same UDP port number
+                await stack.enter_async_context(
+                    websockets.serve(self.handle_client, self.host, port, reuse_port=reuse_port)
+                )
+                urls = [f"ws://{self.host}:{port}"]
+                if config.UDP_ENABLED:
+                    await stack.enter_async_context(
+                        DatagramServer(self.handle_client, self.host, port, reuse_port)
+                    )
+                    urls.append(f"udp://{self.host}:{port}")
+
+                if self.worker_index is None:
+                    print(f"Server listening on {' and '.join(urls)}")
+                else:
+                    print(f"Worker {self.worker_index} listening on {' and '.join(urls)}")
+
+            await stack.enter_async_context(self.metrics_exporter())
             await self.game_loop()
 
+    def metrics_exporter(self) -> MetricsExporter:
+        """Get the metrics exporter, on a per-worker port and dump file when supervised."""
+        if self.worker_index is None:
+            return MetricsExporter(self.metrics)
+        port = worker_port(config.METRICS_PORT, self.worker_index) if config.METRICS_PORT else None
+        dump_path = config.METRICS_DUMP_PATH
+        if dump_path:
+            root, ext = os.path.splitext(dump_path)
+            dump_path = f"{root}.{self.worker_index}{ext}"
+        return MetricsExporter(self.metrics, port=port, dump_path=dump_path)
+
 
 def main():
     """Main entry point for server."""
@@ -174,9 +423,19 @@ def main():
     parser.add_argument(
         "--port", type=int, default=config.DEFAULT_SERVER_PORT, help="Server port"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.SERVER_WORKERS,
+        help="Worker processes (0 = one per CPU, 1 = single process)",
+    )
 
     args = parser.parse_args()
 
+    if args.workers != 1:
+        run_supervisor(args.host, args.port, args.workers)
+        return
+
     server = NetworkServer(args.host, args.port)
 
     try:
@@ -1,15 +1,28 @@
 """State synchronization utilities."""
 
+import bisect
+import math
 import time
-from typing import List, Dict, Any
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from game import config
+from game.core.simulation import CarInput, CarState, HeadlessPhysics
+from game.net.interpolation import wrap_degrees
 
 
 class StateSynchronizer:
-    """Handles state synchronization between client and server."""
+    """Handles state synchronization between client and server.
+
+    State timestamps are server time; ``clock`` returns the current
+    estimated server time (``ClockSync.server_time``), or None before the
+    first estimate.
+    """
 
-    def __init__(self, interpolation_delay=0.1):
+    def __init__(self, interpolation_delay=0.1, clock: Callable[[], Optional[float]] = time.time):
         self.interpolation_delay = interpolation_delay
-        self.state_buffer: List[Dict[str, Any]] = []
+        self.clock = clock
+        self.state_buffer: Deque[Dict[str, Any]] = deque()
         self.max_buffer_size = 30
 
     def add_state(self, state: Dict[str, Any]):
@@ -17,27 +30,28 @@ class StateSynchronizer:
         self.state_buffer.append(state)
 
         # Trim buffer
-        if len(self.state_buffer) > self.max_buffer_size:
-            self.state_buffer.pop(0)
+        while len(self.state_buffer) > self.max_buffer_size:
+            self.state_buffer.popleft()
 
     def get_interpolated_state(self) -> Dict[str, Any]:
         """Get interpolated state for current time."""
         if len(self.state_buffer) < 2:
             return self.state_buffer[-1] if self.state_buffer else {}
 
-        render_time = time.time() - self.interpolation_delay
-
-        # Find bracketing states
-        for i in range(len(self.state_buffer) - 1):
-            t0 = self.state_buffer[i]["timestamp"]
-            t1 = self.state_buffer[i + 1]["timestamp"]
-
-            if t0 <= render_time <= t1:
-                # Interpolate
-                alpha = (render_time - t0) / (t1 - t0) if t1 != t0 else 0
-                return self.interpolate_states(
-                    self.state_buffer[i], self.state_buffer[i + 1], alpha
-                )
+        server_time = self.clock()
+        if server_time is None:
+            return self.state_buffer[-1]
+        render_time = server_time - self.interpolation_delay
+
+        # Find bracketing states by bisection on their timestamps
+        i = bisect.bisect_right(self.state_buffer, render_time, key=lambda s: s["timestamp"])
+        if 0 < i < len(self.state_buffer):
+            state0 = self.state_buffer[i - 1]
+            state1 = self.state_buffer[i]
+            t0 = state0["timestamp"]
+            t1 = state1["timestamp"]
+            alpha = (render_time - t0) / (t1 - t0) if t1 != t0 else 0
+            return self.interpolate_states(state0, state1, alpha)
 
         # Return most recent if no match
         return self.state_buffer[-1]
@@ -51,10 +65,11 @@ class StateSynchronizer:
         # Interpolate player data
         if "players" in state0 and "players" in state1:
             result["players"] = []
+            players1 = {p["id"]: p for p in state1["players"]}
 
             for p0 in state0["players"]:
                 # Find matching player in state1
-                p1 = next((p for p in state1["players"] if p["id"] == p0["id"]), None)
+                p1 = players1.get(p0["id"])
 
                 if p1:
                     interpolated = {
@@ -86,28 +101,148 @@ class StateSynchronizer:
 
 
 class ClientPrediction:
-    """Client-side prediction for local player."""
-
-    def __init__(self):
-        self.predicted_position = [0, 0, 0]
-        self.predicted_velocity = [0, 0, 0]
-        self.input_history = []
-        self.max_history = 60
-
-    def predict(self, input_data: Dict[str, Any], dt: float):
-        """Predict next state based on input."""
-        # Simple prediction - would need proper physics
-        self.input_history.append({"input": input_data, "timestamp": time.time()})
-
-        if len(self.input_history) > self.max_history:
-            self.input_history.pop(0)
-
-    def reconcile(self, server_state: Dict[str, Any]):
-        """Reconcile prediction with server state."""
-        # Check difference between prediction and server
-        # Re-simulate if needed
-        pass
+    """Client-side prediction for local player.
+
+    Every input tick the client samples is simulated at once with the
+    server's rules (``HeadlessPhysics`` at the server tick rate). Inputs
+    and predicted states are kept in a ring buffer keyed by tick. A
+    snapshot tells which of our input ticks the server has simulated. Its
+    state is compared with our prediction for that tick. On a mismatch,
+    the authoritative state is adopted and every later input is replayed
+    on top of it. The jump this causes on screen becomes an offset that
+    decays over ``PREDICTION_SMOOTHING_TIME``.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        size=config.PREDICTION_HISTORY,
+        smoothing_time=config.PREDICTION_SMOOTHING_TIME,
+        snap_distance=config.ERROR_SNAP_DISTANCE,
+    ):
+        """Initialize without a state; the first server state starts predicting."""
+        self.clock = clock
+        self.physics = HeadlessPhysics()
+        self.dt = 1.0 / config.TICKRATE
+        self.size = size
+        self.smoothing_time = smoothing_time
+        self.snap_distance = snap_distance
+
+        # Ring buffer slots, indexed by tick % size
+        self.ticks = [-1] * size
+        self.inputs: List[Optional[CarInput]] = [None] * size
+        self.states: List[Optional[CarState]] = [None] * size
+
+        self.state: Optional[CarState] = None  # Newest predicted state
+        self.tick = -1  # Input tick of ``state``
+        self.acked_tick = -1  # Newest tick the server has confirmed
+        self.corrections = 0
+
+        # Visual error: (x, y, z) offset and yaw offset, blended to zero
+        self.error_position = [0.0, 0.0, 0.0]
+        self.error_yaw = 0.0
+        self.last_display: Optional[float] = None
+
+    @property
+    def started(self) -> bool:
+        """Check if there is a state to predict from."""
+        return self.state is not None
+
+    def store(self, tick, car_input, state: Optional[CarState]):
+        """Keep the input and resulting state of ``tick``."""
+        slot = tick % self.size
+        self.ticks[slot] = tick
+        self.inputs[slot] = car_input
+        self.states[slot] = state.copy() if state else None
+
+    def lookup(self, tick):
+        """Get the ``(input, state)`` stored for ``tick``, or None if overwritten."""
+        slot = tick % self.size
+        if self.ticks[slot] != tick:
+            return None
+        return self.inputs[slot], self.states[slot]
+
+    def predict(self, tick, car_input: CarInput) -> Optional[CarState]:
+        """Simulate the local input for ``tick`` on top of the newest prediction.
+
+        Before the first server state arrives the input is only recorded.
+        """
+        if self.state is not None:
+            self.physics.step(self.state, car_input, self.dt)
+        self.tick = tick
+        self.store(tick, car_input, self.state)
+        return self.state
+
+    def reconcile(self, tick, server_state: CarState) -> bool:
+        """Check the server's state after simulating our input ``tick``.
+
+        Returns True when the prediction was wrong (or had not started) and
+        has been replayed from the server's state.
+        """
+        if tick <= self.acked_tick:
+            return False
+        self.acked_tick = tick
+
+        entry = self.lookup(tick)
+        if entry is not None and entry[1] is not None and self.matches(entry[1], server_state):
+            return False
+
+        # Replay unconfirmed inputs on the authoritative state
+        shown = self.state
+        newest = self.tick
+        self.state = server_state.copy()
+        self.tick = tick
+        self.store(tick, entry[0] if entry else None, self.state)
+        for replay_tick in range(tick + 1, newest + 1):
+            replay = self.lookup(replay_tick)
+            if replay is None:
+                break  # Overwritten; the next snapshot catches up
+            self.predict(replay_tick, replay[0])
+        if shown is None:
+            return True
+        self.corrections += 1
+
+        # Keep showing the car where it was and blend toward the correction
+        offset = [
+            shown.position[i] - self.state.position[i] + self.error_position[i] for i in range(3)
+        ]
+        if math.sqrt(sum(v * v for v in offset)) > self.snap_distance:
+            self.error_position = [0.0, 0.0, 0.0]
+            self.error_yaw = 0.0
+        else:
+            self.error_position = offset
+            self.error_yaw += wrap_degrees(shown.yaw - self.state.yaw)
+        return True
+
+    def matches(self, predicted: CarState, server_state: CarState) -> bool:
+        """Check if a prediction agrees with the server within tolerance."""
+        tolerance = config.PREDICTION_TOLERANCE
+        for i in range(3):
+            if abs(predicted.position[i] - server_state.position[i]) > tolerance:
+                return False
+            if abs(predicted.velocity[i] - server_state.velocity[i]) > tolerance:
+                return False
+        yaw_error = abs(wrap_degrees(predicted.yaw - server_state.yaw))
+        return yaw_error <= config.PREDICTION_YAW_TOLERANCE
+
+    def display(self, now=None):
+        """Get the position and yaw to draw, with the correction blending out."""
+        now = self.clock() if now is None else now
+        if self.last_display is not None and now > self.last_display:
+            decay = math.exp(-(now - self.last_display) / self.smoothing_time)
+            self.error_position = [v * decay for v in self.error_position]
+            self.error_yaw *= decay
+        self.last_display = now
+        position = [self.state.position[i] + self.error_position[i] for i in range(3)]
+        return position, self.state.yaw + self.error_yaw
 
     def clear(self):
         """Clear prediction history."""
-        self.input_history.clear()
+        self.ticks = [-1] * self.size
+        self.inputs = [None] * self.size
+        self.states = [None] * self.size
+        self.state = None
+        self.tick = self.acked_tick = -1
+        self.error_position = [0.0, 0.0, 0.0]
+        self.error_yaw = 0.0
+        self.last_display = None
@@ -0,0 +1,127 @@
+"""Multi-process server supervisor.
+
+The supervisor forks one ``NetworkServer`` worker per core. Every worker
+binds the public port with ``SO_REUSEPORT`` so the kernel spreads incoming
+connections across them, and also listens on a private port
+(``port + 1 + worker_index``). A shared ``RoomDirectory`` records which
+worker owns each room; a worker that receives a join for a room it does not
+own answers with a ``redirect`` to the owner's private port.
+
+A new room is only pending until its worker actually creates it
+(``claim``). A redirected client that never arrives leaves no room
+behind: the pending entry expires after ``ROOM_CLAIM_TIMEOUT``.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from typing import Optional
+
+from game import config
+
+
+class RoomDirectory:
+    """Room-to-worker routing table and per-worker load, shared across processes."""
+
+    def __init__(self, manager, num_workers):
+        """Create shared state through a ``multiprocessing.Manager``."""
+        self.num_workers = num_workers
+        self.rooms = manager.dict()  # Rooms a worker has created
+        self.pending = manager.dict()  # Room -> (worker, deadline) until created
+        self.loads = manager.list([0] * num_workers)
+        self.lock = manager.Lock()
+
+    def assign(self, room_id, now=None) -> int:
+        """Get the worker owning ``room_id``, placing new rooms on the least-loaded worker."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.expire(now)
+            worker = self.owner(room_id)
+            if worker is None:
+                loads = list(self.loads)
+                worker = loads.index(min(loads))
+                self.pending[room_id] = (worker, now + config.ROOM_CLAIM_TIMEOUT)
+                # Count the room's first player now so back-to-back
+                # placements do not all land on the same worker.
+                self.loads[worker] = loads[worker] + 1
+            return worker
+
+    def claim(self, room_id, worker):
+        """Record that ``worker`` has created ``room_id``."""
+        with self.lock:
+            self.pending.pop(room_id, None)
+            self.rooms[room_id] = worker
+
+    def expire(self, now):
+        """Drop pending rooms whose worker never created them."""
+        for room_id, (_, deadline) in list(self.pending.items()):
+            if deadline <= now:
+                self.pending.pop(room_id, None)
+
+    def owner(self, room_id) -> Optional[int]:
+        """Get the worker owning (or about to create) ``room_id``, if any."""
+        worker = self.rooms.get(room_id)
+        if worker is None:
+            worker, _ = self.pending.get(room_id, (None, 0.0))
+        return worker
+
+    def release(self, room_id):
+        """Forget a closed room."""
+        with self.lock:
+            self.rooms.pop(room_id, None)
+            self.pending.pop(room_id, None)
+
+    def set_load(self, worker, players):
+        """Report the number of players hosted by ``worker``."""
+        self.loads[worker] = players
+
+
+def worker_port(base_port, worker_index):
+    """Get the private port of a worker."""
+    return base_port + 1 + worker_index
+
+
+def run_worker(host, port, worker_index, directory):
+    """Run one worker process."""
+    from game.net.server import NetworkServer
+
+    server = NetworkServer(host, port, worker_index=worker_index, directory=directory)
+
+    try:
+        asyncio.run(server.start())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_supervisor(host, port, num_workers=0):
+    """Fork ``num_workers`` workers (one per CPU if 0) and wait for them."""
+    num_workers = num_workers or os.cpu_count() or 1
+
+    with multiprocessing.Manager() as manager:
+        directory = RoomDirectory(manager, num_workers)
+        workers = []
+
+        for index in range(num_workers):
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(host, port, index, directory),
+                name=f"dog-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            workers.append(process)
+            print(
+                f"Worker {index} (pid {process.pid}) on port {port}, "
+                f"direct port {worker_port(port, index)}"
+            )
+
+        try:
+            for process in workers:
+                process.join()
+        except KeyboardInterrupt:
+            print("\nStopping workers...")
+            for process in workers:
+                process.terminate()
+            for process in workers:
+                process.join()
@@ -0,0 +1,142 @@
+"""Fixed-timestep tick scheduling on the event loop's monotonic clock."""
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TickScheduler:
+    """Runs a callback at a fixed tick rate using deadline-based scheduling.
+
+    Tick N is due at ``start_time + N * interval`` on ``loop.time()``, so the
+    time spent inside a tick never pushes later ticks back. When the loop
+    falls behind, missed ticks are run back to back (up to ``max_catchup``
+    per wakeup); anything beyond that is dropped and the schedule is
+    re-anchored so the tick counter stays contiguous.
+    """
+
+    def __init__(
+        self,
+        tick_rate: int,
+        callback: Callable[[int], None],
+        max_catchup: int = 5,
+        on_overrun: Optional[Callable[[int, float], None]] = None,
+    ):
+        """Initialize scheduler for ``tick_rate`` ticks per second."""
+        self.tick_rate = tick_rate
+        self.interval = 1.0 / tick_rate
+        self.callback = callback
+        self.max_catchup = max_catchup
+        self.on_overrun = on_overrun
+
+        # Tick state
+        self.tick = 0
+        self.start_time = 0.0
+        self.next_deadline = 0.0
+        self.running = False
+
+        # Statistics
+        self.overrun_count = 0
+        self.dropped_ticks = 0
+        self.catchup_ticks = 0
+        self.last_tick_duration = 0.0
+        self.max_tick_duration = 0.0
+        self.last_lateness = 0.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stopped: Optional[asyncio.Future] = None
+
+    def start(self):
+        """Start ticking on the running event loop."""
+        if self.running:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = self._loop.create_future()
+        self.running = True
+        self.start_time = self._loop.time()
+        self.next_deadline = self.start_time
+        self._schedule()
+
+    def stop(self):
+        """Stop ticking and release anyone waiting in ``run``."""
+        self.running = False
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        if self._stopped and not self._stopped.done():
+            self._stopped.set_result(None)
+
+    async def run(self):
+        """Start the scheduler and wait until it is stopped."""
+        self.start()
+        await self._stopped
+
+    @property
+    def tick_time(self) -> float:
+        """Get the scheduled loop time of the tick being run.
+
+        This is the ideal tick grid, free of wakeup jitter. Outside a
+        running scheduler it is the current monotonic time.
+        """
+        if not self.running:
+            return time.monotonic()
+        return self.next_deadline
+
+    def time_until_next_tick(self) -> float:
+        """Get seconds remaining until the next tick is due."""
+        if not self._loop:
+            return 0.0
+        return max(0.0, self.next_deadline - self._loop.time())
+
+    def _schedule(self):
+        """Arm the timer for the next deadline."""
+        self._handle = self._loop.call_at(self.next_deadline, self._on_timer)
+
+    def _on_timer(self):
+        """Run every tick that is due, then re-arm for the next one."""
+        self._handle = None
+        if not self.running:
+            return
+
+        loop = self._loop
+        now = loop.time()
+        self.last_lateness = now - self.next_deadline
+
+        steps = 0
+        while self.running and self.next_deadline <= now and steps < self.max_catchup:
+            tick = self.tick
+            tick_start = loop.time()
+
+            try:
+                self.callback(tick)
+            except Exception as e:
+                print(f"Error in tick {tick}: {e}")
+
+            duration = loop.time() - tick_start
+            self.last_tick_duration = duration
+            self.max_tick_duration = max(self.max_tick_duration, duration)
+            if duration > self.interval:
+                self.overrun_count += 1
+                if self.on_overrun:
+                    self.on_overrun(tick, duration)
+
+            self.tick += 1
+            steps += 1
+            self.next_deadline = self.start_time + self.tick * self.interval
+            now = loop.time()
+
+        if steps > 1:
+            self.catchup_ticks += steps - 1
+
+        # Still behind after the catch-up budget: drop the backlog and
+        # re-anchor so the next tick is due one interval from now.
+        if self.running and self.next_deadline <= now:
+            behind = int((now - self.next_deadline) / self.interval) + 1
+            self.dropped_ticks += behind
+            self.start_time = now + self.interval - self.tick * self.interval
+            self.next_deadline = now + self.interval
+
+        if self.running:
+            self._schedule()
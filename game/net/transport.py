@@ -0,0 +1,450 @@
+"""UDP datagram transport.
+
+A lighter alternative to WebSockets for snapshots and inputs: a lost
+datagram only loses itself instead of stalling everything behind it.
+
+Every packet starts with a fixed header::
+
+    protocol id (B) | kind (B) | token (I) | seq (I) | ack (I)
+
+A client says ``HELLO`` and the server answers ``CHALLENGE`` with a
+cookie derived from the client's address. The client repeats ``HELLO``
+carrying the cookie, and only then does the server open a session and
+answer ``WELCOME`` with a random connection token that every later packet
+must carry. Spoofed source addresses never see their cookie, so they
+cannot make the server hold state. Unreliable packets
+are numbered so stale or duplicated ones are dropped. Reliable packets
+(join, chat, results) are numbered separately, retransmitted until the
+peer's cumulative ``ack`` covers them and delivered in order.
+
+``DatagramSession`` mimics the parts of a WebSocket connection the server
+and client use (``send``, ``recv``, ``close``, async iteration and
+``remote_address``), adding ``send_unreliable`` for snapshots and inputs.
+"""
+
+import asyncio
+import hashlib
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from game import config
+
+PROTOCOL_ID = 0xD6
+HEADER = struct.Struct("<BBIII")
+
+# Packet kinds
+HELLO = 0
+WELCOME = 1
+RELIABLE = 2
+UNRELIABLE = 3
+ACK = 4
+CLOSE = 5
+CHALLENGE = 6
+
+# Largest payload sent in one datagram; bigger ones rely on IP fragmentation
+MAX_PAYLOAD = 60000
+
+
+class TransportClosedError(ConnectionError):
+    """Raised when receiving on a closed datagram session."""
+
+
+class DatagramSession:
+    """One side of a token-authenticated datagram connection."""
+
+    def __init__(self, transport, addr, token, on_close: Optional[Callable] = None):
+        """Initialize a session talking to ``addr`` over ``transport``."""
+        self.transport = transport
+        self.remote_address = addr
+        self.token = token
+        self.on_close = on_close
+        self.closed = False
+
+        self.incoming: asyncio.Queue = asyncio.Queue(maxsize=config.UDP_RECEIVE_QUEUE)
+        self.unreliable_seq = 0
+        self.last_unreliable = -1  # Newest unreliable seq delivered
+
+        # Reliable channel: unacked sends by seq, and receive reordering
+        self.reliable_seq = 0
+        self.unacked: "OrderedDict[int, list]" = OrderedDict()  # seq -> [data, sent_at, tries]
+        self.receive_next = 0
+        self.out_of_order: Dict[int, bytes] = {}
+        self._window_open = asyncio.Event()
+        self._window_open.set()
+
+        # Round-trip estimate from acks of packets sent only once
+        self.rtt: Optional[float] = None
+
+        # Statistics
+        self.sent_packets = 0
+        self.received_packets = 0
+        self.retransmits = 0
+        self.stale_packets = 0
+
+        now = time.monotonic()
+        self.last_received = now
+        self.last_sent = now
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start retransmission, keepalive and timeout handling."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    @property
+    def resend_interval(self) -> float:
+        """Get the retransmission timeout."""
+        if self.rtt is None:
+            return config.UDP_RESEND_INTERVAL
+        return min(max(2 * self.rtt, 0.05), 1.0)
+
+    def _sendto(self, kind, seq=0, payload=b""):
+        """Send one packet."""
+        if self.transport.is_closing():
+            return
+        header = HEADER.pack(PROTOCOL_ID, kind, self.token, seq, self.receive_next)
+        self.transport.sendto(header + payload, self.remote_address)
+        self.sent_packets += 1
+        self.last_sent = time.monotonic()
+
+    async def send(self, data: bytes):
+        """Send ``data`` on the reliable, ordered channel."""
+        if len(data) > MAX_PAYLOAD:
+            raise ValueError(f"Payload of {len(data)} bytes exceeds {MAX_PAYLOAD}")
+        while len(self.unacked) >= config.UDP_RELIABLE_WINDOW and not self.closed:
+            self._window_open.clear()
+            await self._window_open.wait()
+        if self.closed:
+            raise TransportClosedError("session closed")
+
+        seq = self.reliable_seq
+        self.reliable_seq += 1
+        self.unacked[seq] = [data, time.monotonic(), 1]
+        self._sendto(RELIABLE, seq, data)
+
+    async def send_unreliable(self, data: bytes):
+        """Send ``data`` as a single unreliable datagram."""
+        if self.closed:
+            raise TransportClosedError("session closed")
+        if len(data) > MAX_PAYLOAD:
+            raise ValueError(f"Payload of {len(data)} bytes exceeds {MAX_PAYLOAD}")
+        self._sendto(UNRELIABLE, self.unreliable_seq, data)
+        self.unreliable_seq += 1
+
+    async def recv(self) -> bytes:
+        """Wait for the next delivered message."""
+        data = await self.incoming.get()
+        if data is None:
+            self.incoming.put_nowait(None)  # Keep later receivers from hanging
+            raise TransportClosedError("session closed")
+        return data
+
+    def __aiter__(self):
+        """Iterate over delivered messages until the session closes."""
+        return self
+
+    async def __anext__(self) -> bytes:
+        """Get the next delivered message."""
+        try:
+            return await self.recv()
+        except TransportClosedError:
+            raise StopAsyncIteration
+
+    def packet_received(self, kind, seq, ack, payload):
+        """Handle a packet addressed to this session."""
+        if self.closed:
+            return
+        self.received_packets += 1
+        self.last_received = time.monotonic()
+        self._acknowledge(ack)
+
+        if kind == UNRELIABLE:
+            if seq <= self.last_unreliable:
+                self.stale_packets += 1
+                return
+            if self.incoming.full():
+                return
+            self.last_unreliable = seq
+            self.incoming.put_nowait(payload)
+
+        elif kind == RELIABLE:
+            if seq >= self.receive_next and len(self.out_of_order) < config.UDP_RELIABLE_WINDOW:
+                self.out_of_order[seq] = payload
+            # Deliver in order while there is room; the rest is resent later
+            while self.receive_next in self.out_of_order and not self.incoming.full():
+                self.incoming.put_nowait(self.out_of_order.pop(self.receive_next))
+                self.receive_next += 1
+            self._sendto(ACK)
+
+        elif kind == CLOSE:
+            self._shutdown()
+
+    def _acknowledge(self, ack):
+        """Drop reliable sends the peer has received (all seqs below ``ack``)."""
+        now = time.monotonic()
+        while self.unacked:
+            seq, (_, sent_at, tries) = next(iter(self.unacked.items()))
+            if seq >= ack:
+                break
+            del self.unacked[seq]
+            if tries == 1:
+                sample = now - sent_at
+                self.rtt = sample if self.rtt is None else 0.875 * self.rtt + 0.125 * sample
+
+        if len(self.unacked) < config.UDP_RELIABLE_WINDOW:
+            self._window_open.set()
+
+    async def _maintain(self):
+        """Resend unacked packets, keep the session alive and time it out."""
+        try:
+            while not self.closed:
+                await asyncio.sleep(0.05)
+                now = time.monotonic()
+
+                if now - self.last_received > config.UDP_TIMEOUT:
+                    self._shutdown()
+                    return
+
+                for seq, entry in self.unacked.items():
+                    data, sent_at, tries = entry
+                    if now - sent_at < self.resend_interval * tries:
+                        continue
+                    if tries > config.UDP_MAX_RETRIES:
+                        self._shutdown()
+                        return
+                    entry[1], entry[2] = now, tries + 1
+                    self.retransmits += 1
+                    self._sendto(RELIABLE, seq, data)
+
+                if now - self.last_sent > config.UDP_KEEPALIVE_INTERVAL:
+                    self._sendto(ACK)
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        """Close the session, telling the peer."""
+        if not self.closed:
+            self._sendto(CLOSE)
+        self._shutdown()
+
+    def _shutdown(self):
+        """Mark the session closed and wake up receivers."""
+        if self.closed:
+            return
+        self.closed = True
+        self._window_open.set()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        try:
+            self.incoming.put_nowait(None)
+        except asyncio.QueueFull:
+            self.incoming.get_nowait()
+            self.incoming.put_nowait(None)
+        if self.on_close:
+            self.on_close(self)
+
+
+def parse_packet(data) -> Optional[Tuple[int, int, int, int, bytes]]:
+    """Split a datagram into ``(kind, token, seq, ack, payload)``, or None if malformed."""
+    if len(data) < HEADER.size:
+        return None
+    protocol_id, kind, token, seq, ack = HEADER.unpack_from(data)
+    if protocol_id != PROTOCOL_ID or kind > CHALLENGE:
+        return None
+    return kind, token, seq, ack, data[HEADER.size :]
+
+
+class DatagramServerProtocol(asyncio.DatagramProtocol):
+    """Accepts datagram sessions and routes packets to them by token."""
+
+    def __init__(self, handler):
+        """Initialize with ``handler``, a coroutine run for each new session."""
+        self.handler = handler
+        self.transport = None
+        self.sessions: Dict[int, DatagramSession] = {}
+        self.pending: Dict[tuple, DatagramSession] = {}  # Welcomed, by address
+        self.secret = os.urandom(16)  # Keys HELLO cookies
+
+    def connection_made(self, transport):
+        """Keep the transport."""
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        """Dispatch a packet to its session, or open one on HELLO."""
+        packet = parse_packet(data)
+        if packet is None:
+            return
+        kind, token, seq, ack, payload = packet
+
+        if kind == HELLO:
+            session = self.pending.get(addr)
+            if session is None or session.closed:
+                if not self.valid_cookie(token, addr):
+                    header = HEADER.pack(PROTOCOL_ID, CHALLENGE, self.cookie(addr), 0, 0)
+                    self.transport.sendto(header, addr)
+                    return
+                if len(self.pending) >= config.UDP_MAX_PENDING_SESSIONS:
+                    return  # The client keeps saying hello until one finishes
+                session = self.open_session(addr)
+            # Re-sent until the client stops saying hello
+            session._sendto(WELCOME)
+            return
+
+        session = self.sessions.get(token)
+        if session is None:
+            return
+        if session.remote_address != addr:
+            # The client's NAT mapping changed; the token still proves who it is,
+            # but only a packet newer than any received may move the session
+            if kind != UNRELIABLE or seq <= session.last_unreliable:
+                return
+            self.pending.pop(session.remote_address, None)
+            session.remote_address = addr
+        self.pending.pop(addr, None)
+        session.packet_received(kind, seq, ack, payload)
+
+    def cookie(self, addr, bucket: Optional[int] = None) -> int:
+        """Get the HELLO cookie for ``addr`` in the current (or given) time bucket."""
+        if bucket is None:
+            bucket = int(time.monotonic() // config.UDP_COOKIE_LIFETIME)
+        digest = hashlib.blake2s(
+            f"{addr[0]}|{addr[1]}|{bucket}".encode(), key=self.secret, digest_size=4
+        ).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def valid_cookie(self, cookie, addr) -> bool:
+        """Check a HELLO cookie from this or the previous time bucket."""
+        bucket = int(time.monotonic() // config.UDP_COOKIE_LIFETIME)
+        return cookie != 0 and cookie in (self.cookie(addr, bucket), self.cookie(addr, bucket - 1))
+
+    def open_session(self, addr) -> DatagramSession:
+        """Create a session for a new client and start its handler."""
+        token = int.from_bytes(os.urandom(4), "little") or 1
+        while token in self.sessions:
+            token = int.from_bytes(os.urandom(4), "little") or 1
+
+        session = DatagramSession(self.transport, addr, token, on_close=self.session_closed)
+        self.sessions[token] = session
+        self.pending[addr] = session
+        session.start()
+        asyncio.ensure_future(self.handler(session))
+        return session
+
+    def session_closed(self, session):
+        """Forget a closed session."""
+        self.sessions.pop(session.token, None)
+        if self.pending.get(session.remote_address) is session:
+            del self.pending[session.remote_address]
+
+    def close(self):
+        """Close every session and the socket."""
+        for session in list(self.sessions.values()):
+            session._sendto(CLOSE)
+            session._shutdown()
+        if self.transport:
+            self.transport.close()
+
+
+class DatagramServer:
+    """Async context manager serving datagram sessions on ``host:port``."""
+
+    def __init__(self, handler, host, port, reuse_port=False):
+        """Initialize; the socket is bound on entry."""
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.protocol: Optional[DatagramServerProtocol] = None
+
+    async def __aenter__(self):
+        """Bind the socket."""
+        loop = asyncio.get_running_loop()
+        transport, self.protocol = await loop.create_datagram_endpoint(
+            lambda: DatagramServerProtocol(self.handler),
+            local_addr=(self.host, self.port),
+            reuse_port=self.reuse_port or None,
+        )
+        self.port = transport.get_extra_info("sockname")[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close all sessions and the socket."""
+        self.protocol.close()
+
+
+class DatagramClientProtocol(asyncio.DatagramProtocol):
+    """Client side of a datagram session."""
+
+    def __init__(self):
+        """Initialize before the handshake."""
+        self.transport = None
+        self.session: Optional[DatagramSession] = None
+        self.welcomed: Optional[asyncio.Future] = None
+        self.cookie = 0  # From the server's CHALLENGE
+
+    def connection_made(self, transport):
+        """Keep the transport."""
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        """Finish the handshake or hand the packet to the session."""
+        packet = parse_packet(data)
+        if packet is None:
+            return
+        kind, token, seq, ack, payload = packet
+
+        if self.session is None:
+            if kind == CHALLENGE:
+                # Say hello again at once, proving we receive at this address
+                self.cookie = token
+                self.transport.sendto(HEADER.pack(PROTOCOL_ID, HELLO, token, 0, 0))
+            elif kind == WELCOME and self.welcomed and not self.welcomed.done():
+                self.welcomed.set_result(token)
+            return
+        if token == self.session.token:
+            self.session.packet_received(kind, seq, ack, payload)
+
+    def error_received(self, exc):
+        """Treat ICMP errors (nothing listening) as a failed handshake or closed session."""
+        if self.session:
+            self.session._shutdown()
+        elif self.welcomed and not self.welcomed.done():
+            self.welcomed.set_exception(exc)
+
+
+async def connect_datagram(host, port, timeout=config.UDP_CONNECT_TIMEOUT) -> DatagramSession:
+    """Open a datagram session with the server at ``host:port``.
+
+    Raises ``TimeoutError`` if the server does not answer.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        DatagramClientProtocol, remote_addr=(host, port)
+    )
+    protocol.welcomed = loop.create_future()
+    try:
+        deadline = loop.time() + timeout
+        while not protocol.welcomed.done():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"No answer from udp://{host}:{port}")
+            transport.sendto(HEADER.pack(PROTOCOL_ID, HELLO, protocol.cookie, 0, 0))
+            try:
+                await asyncio.wait_for(asyncio.shield(protocol.welcomed), min(0.25, remaining))
+            except asyncio.TimeoutError:
+                pass
+    except BaseException:
+        transport.close()
+        raise
+
+    addr = transport.get_extra_info("peername")
+    session = DatagramSession(
+        transport, addr, protocol.welcomed.result(), on_close=lambda s: transport.close()
+    )
+    protocol.session = session
+    session._sendto(ACK)  # Confirms the token so the server stops expecting HELLO
+    session.start()
+    return session
@@ -66,6 +66,59 @@ class TestMessages:
         assert len(decoded["data"]["players"]) == 1
         assert decoded["data"]["players"][0]["id"] == "player_1"
 
+    def test_registered_messages_are_positional(self):
+        """Test registered types encode as a type id plus field values."""
+        import msgpack
+        from game.net.messages import ChatMessage, registry
+
+        msg = ChatMessage(player_name="Tester", message="hi", timestamp=1.5)
+        data = serialize_message("chat", msg)
+
+        assert msgpack.unpackb(data) == [registry.by_name["chat"].type_id, "Tester", "hi", 1.5]
+        assert len(data) < len(msgpack.packb({"type": "chat", "data": msg.to_dict()}))
+        assert deserialize_message(data) == {"type": "chat", "data": msg.to_dict()}
+
+        # Dict payloads use the same layout, filling in defaults
+        from_dict = deserialize_message(serialize_message("join", {"player_name": "A"}))
+        assert from_dict["data"] == JoinMessage(player_name="A").to_dict()
+
+    def test_older_and_unregistered_messages(self):
+        """Test short arrays from older peers and keyed messages still decode."""
+        import msgpack
+        from game.net.messages import registry
+
+        schema = registry.by_name["input"]
+        short = msgpack.packb([schema.type_id, "player_1", 1.0, 0.0, False, False, False, 2.0])
+        decoded = deserialize_message(short)["data"]
+        assert decoded["ack"] == -1
+        assert decoded["inputs"] == []
+
+        keyed = serialize_message("debug_note", {"text": "hi"})
+        assert deserialize_message(keyed) == {"type": "debug_note", "data": {"text": "hi"}}
+
+    def test_single_field_and_empty_messages(self):
+        """Test one-field layouts round trip and empty frames are rejected."""
+        from game.net.messages import ReadyMessage
+
+        data = serialize_message("ready", ReadyMessage(ready=True))
+        assert deserialize_message(data) == {"type": "ready", "data": {"ready": True}}
+
+        with pytest.raises(ValueError):
+            deserialize_message(b"")
+
+    def test_dispatch_table(self):
+        """Test messages are routed to the handler registered for their type."""
+        from game.net.messages import dispatch
+
+        calls = []
+        handlers = {"chat": lambda sender, data: calls.append((sender, data["message"]))}
+        chat = {"player_name": "A", "message": "gg", "timestamp": 0.0}
+
+        dispatch(deserialize_message(serialize_message("chat", chat)), handlers, "player_0")
+        dispatch(deserialize_message(serialize_message("ready", {"ready": True})), handlers, "x")
+
+        assert calls == [("player_0", "gg")]
+
 
 class TestStateSynchronization:
     """Test state synchronization."""
@@ -99,6 +152,1724 @@ class TestStateSynchronization:
         assert len(sync.state_buffer) <= sync.max_buffer_size
 
 
+    def test_snapshot_buffer_interpolates_all_cars(self):
+        """Test bisection lookup and the vectorized curves over id-aligned rows."""
+        from game.net.interpolation import BufferedSnapshot, SnapshotBuffer
+
+        def car(player_id, x, vx, yaw):
+            return {
+                "id": player_id,
+                "position": [x, 1.0, 0.0],
+                "rotation": [0.0, yaw, 0.0],
+                "velocity": [vx, 0.0, 0.0],
+            }
+
+        buffer = SnapshotBuffer(capacity=4)
+        for i in range(6):
+            cars = [car("a", 10.0 * i, 100.0, 350.0 + 20.0 * i), car("b", -float(i), -10.0, 90.0)]
+            if i == 5:
+                cars = [car("c", 0.0, 0.0, 0.0)] + cars  # Joins; no earlier state to blend from
+            assert buffer.add(BufferedSnapshot(i * 0.1, cars, tick=i))
+        assert not buffer.add(BufferedSnapshot(0.3, []))  # Out of order
+        assert len(buffer) == 4
+
+        ids, positions, yaws = buffer.sample(0.475)
+        assert ids == ["a", "b"]
+        assert positions[:, 0].tolist() == pytest.approx([47.5, -4.75])
+        # 430 -> 450 turns the short way, not back through 360 degrees
+        assert yaws.tolist() == pytest.approx([445.0, 90.0])
+        assert buffer.sample(0.5)[1][:, 0].tolist() == pytest.approx([50.0, -5.0])
+
+        # Before the oldest buffered snapshot cars hold still
+        assert buffer.sample(0.15)[1][:, 0].tolist() == pytest.approx([20.0, -2.0])
+
+    def test_hermite_follows_acceleration(self):
+        """Test velocity tangents reproduce accelerating motion that a lerp cuts short."""
+        from game.net.interpolation import BufferedSnapshot, SnapshotBuffer
+
+        buffer = SnapshotBuffer()
+        for i in range(2):
+            t = i * 0.1
+            car = {"id": "a", "position": [20.0 * t * t, 1.0, 0.0], "rotation": [0.0, 0.0, 0.0]}
+            buffer.add(BufferedSnapshot(t, [{**car, "velocity": [40.0 * t, 0.0, 0.0]}]))
+
+        positions = buffer.sample(0.05)[1]
+        assert positions[0, 0] == pytest.approx(20.0 * 0.05**2)  # A lerp would give 0.1
+
+    def test_dead_reckoning_and_error_smoothing(self):
+        """Test late snapshots are bridged by bounded dead reckoning and blended in."""
+        import math
+        from game.net.interpolation import BufferedSnapshot, SnapshotBuffer
+
+        def snapshot(timestamp, x, vx):
+            car = {"id": "a", "position": [x, 1.0, 0.0], "rotation": [0.0, 0.0, 0.0]}
+            return BufferedSnapshot(timestamp, [{**car, "velocity": [vx, 0.0, 0.0]}])
+
+        buffer = SnapshotBuffer(extrapolation_limit=0.2, smoothing_time=0.1)
+        buffer.add(snapshot(0.0, 0.0, 10.0))
+        buffer.add(snapshot(0.1, 1.0, 10.0))
+
+        # The next snapshot is late: keep moving along the last velocity
+        assert buffer.sample(0.15)[1][0, 0] == pytest.approx(1.5)
+
+        # It arrives showing the car braked; the jump is blended out, not snapped
+        buffer.add(snapshot(0.2, 1.6, 2.0))
+        hermite = 1.456  # Curve between the snapshots at 0.16
+        shown = buffer.sample(0.16)[1][0, 0]
+        assert shown == pytest.approx(hermite + (1.6 - hermite) * math.exp(-0.1))
+
+        # Dead reckoning stops at the limit and the correction has faded
+        assert buffer.sample(2.0)[1][0, 0] == pytest.approx(1.6 + 2.0 * 0.2)
+
+    def test_synchronizer_interpolates_by_id(self):
+        """Test the synchronizer pairs players by id between bracketing states."""
+        from game.net.state_sync import StateSynchronizer
+
+        def player(player_id, x):
+            return {
+                "id": player_id,
+                "name": player_id,
+                "position": [x, 1.0, 0.0],
+                "rotation": [0.0, 0.0, 0.0],
+                "velocity": [0.0, 0.0, 0.0],
+                "lap": 1,
+                "checkpoint": 0,
+            }
+
+        now = [1.35]
+        sync = StateSynchronizer(interpolation_delay=0.1, clock=lambda: now[0])
+        for i in range(3):
+            sync.add_state({"timestamp": i * 1.0, "players": [player("b", i), player("a", 2 * i)]})
+
+        state = sync.get_interpolated_state()
+        assert state["timestamp"] == pytest.approx(1.25)
+        assert {p["id"]: p["position"][0] for p in state["players"]} == pytest.approx(
+            {"a": 2.5, "b": 1.25}
+        )
+
+class TestBinarySnapshotCodec:
+    """Test the quantized binary snapshot format."""
+
+    def make_snapshot(self, count=8):
+        players = [
+            {
+                "id": f"player_{i}",
+                "name": f"Racer {i}",
+                "position": [10.5 * i - 30.0, 1.0, -15.25 + i],
+                "rotation": [0.0, 45.0 * i, 0.0],
+                "velocity": [1.5, 0.0, -20.25 + i],
+                "lap": 2,
+                "checkpoint": i,
+                "flags": i % 4,
+            }
+            for i in range(count)
+        ]
+        return StateSnapshot(timestamp=123.456, players=players, tick=600, seq=600)
+
+    def test_round_trip_within_quantization(self):
+        """Test that decoded values match within one quantization step."""
+        from game.net.messages import serialize_snapshot
+
+        snapshot = self.make_snapshot()
+        slots = {p["id"]: i for i, p in enumerate(snapshot.players)}
+
+        decoded = deserialize_message(serialize_snapshot(snapshot, "binary", slots))
+        assert decoded["type"] == "state"
+        data = decoded["data"]
+
+        assert data["tick"] == 600
+        assert data["seq"] == 600
+        assert data["baseline"] == -1
+        for original, player in zip(snapshot.players, data["players"]):
+            assert player["id"] == slots[original["id"]]
+            for a, b in zip(original["position"], player["position"]):
+                assert abs(a - b) < 0.02
+            assert abs(original["rotation"][1] - player["rotation"][1]) < 0.01
+            for a, b in zip(original["velocity"], player["velocity"]):
+                assert abs(a - b) <= 0.005 + 1e-9
+            assert player["lap"] == original["lap"]
+            assert player["checkpoint"] == original["checkpoint"]
+            assert player["flags"] == original["flags"]
+
+    def test_partial_entities_and_removals(self):
+        """Test delta snapshots with missing fields and removed slots."""
+        from game.net.messages import serialize_snapshot
+
+        snapshot = StateSnapshot(
+            timestamp=1.0,
+            players=[{"id": "a", "lap": 3}, {"id": "b", "position": [1.0, 1.0, 1.0]}],
+            seq=5,
+            baseline=4,
+            removed=["c"],
+        )
+        data = deserialize_message(
+            serialize_snapshot(snapshot, "binary", {"a": 0, "b": 1, "c": 7})
+        )["data"]
+
+        assert data["baseline"] == 4
+        assert data["removed"] == [7]
+        assert data["players"][0] == {"id": 0, "lap": 3}
+        assert set(data["players"][1]) == {"id", "position"}
+
+    def test_smaller_than_msgpack(self):
+        """Test that the binary format is several times smaller."""
+        from game.net.messages import serialize_snapshot
+
+        snapshot = self.make_snapshot()
+        slots = {p["id"]: i for i, p in enumerate(snapshot.players)}
+
+        binary = serialize_snapshot(snapshot, "binary", slots)
+        packed = serialize_snapshot(snapshot, "msgpack")
+
+        assert len(binary) * 5 < len(packed)
+
+    def test_table_rows_follow_state_versions(self):
+        """Test that car rows serve current states and older states encode their own values."""
+        from game.core.batch_physics import CarBatch
+        from game.net.messages import WireTable, binary_snapshot_codec
+
+        cars = CarBatch(2)
+        slot = cars.allocate(position=(100.0, 1.0, -50.0), yaw=90.0)
+        current = {"id": "a", "position": [100.0, 1.0, -50.0], "rotation": [0.0, 90.0, 0.0]}
+        older = {"id": "a", "position": [20.0, 1.0, 0.0], "rotation": [0.0, 10.0, 0.0]}
+        table = WireTable(binary_snapshot_codec)
+        table.add_cars([("a", 2)], cars, [slot], [3], [0])
+
+        def encode(entry, state, versions):
+            snapshot = StateSnapshot(timestamp=1.0, players=[entry], seq=2, baseline=0)
+            data = binary_snapshot_codec.encode(
+                snapshot, {"a": slot}, {"a": state}, table, {"a": versions}
+            )
+            return deserialize_message(data)["data"]["players"][0]
+
+        assert abs(encode(current, current, (-1, 2))["position"][0] - 100.0) < 0.02
+        assert abs(encode(older, older, (-1, 1))["position"][0] - 20.0) < 0.02
+        # A delta entry between versions carries only its changed fields
+        assert encode({"id": "a", "lap": 3}, current, (1, 2)) == {"id": slot, "lap": 3}
+        assert len(table.values) == 2
+
+    def test_encode_no_slower_than_msgpack(self):
+        """Test that encoding from a pass's shared table is no slower than msgpack."""
+        import timeit
+        from game.net.messages import WireTable, binary_snapshot_codec, serialize_snapshot
+
+        snapshot = self.make_snapshot(64)
+        slots = {p["id"]: i for i, p in enumerate(snapshot.players)}
+        table = WireTable(binary_snapshot_codec)
+        versions = {p["id"]: (-1, snapshot.seq) for p in snapshot.players}
+
+        def encode():
+            return binary_snapshot_codec.encode(snapshot, slots, None, table, versions)
+
+        def best(encode):
+            return min(timeit.repeat(encode, number=100, repeat=5))
+
+        encode()
+        binary = best(encode)
+        packed = best(lambda: serialize_snapshot(snapshot, "msgpack"))
+        assert binary <= packed
+
+
+class TestInterestManagement:
+    """Test spatial filtering of per-client snapshots."""
+
+    def make_room(self, positions):
+        from game.net.rooms import Room
+
+        room = Room("test", max_players=len(positions))
+        players = []
+        for i, position in enumerate(positions):
+            player = room.add_player(f"player_{i}", f"P{i}", RecordingConnection())
+            room.cars.position[player.slot] = position
+            players.append(player)
+        return room, players
+
+    def test_grid_query(self):
+        """Test that grid queries return entities in nearby cells only."""
+        import numpy as np
+        from game.net.interest import SpatialGrid
+
+        grid = SpatialGrid(cell_size=10.0)
+        grid.rebuild(["a", "b", "c"], np.array([[1, 1, 1], [12, 1, 3], [500, 1, 500]], float))
+
+        assert set(grid.query([0, 1, 0], 10.0)) == {"a", "b"}
+        assert grid.query([1000, 1, 1000], 10.0) == []
+        # Wider than the occupied cells: scans those instead of every cell in reach
+        assert set(grid.query([0, 1, 0], 600.0)) == {"a", "b", "c"}
+        assert set(grid.query([0, 1, 0], 300.0)) == {"a", "b"}
+
+    def test_near_far_and_cutoff(self):
+        """Test full rate nearby, reduced rate far away, nothing past the cutoff."""
+        from game.net.interest import InterestManager
+
+        room, players = self.make_room(
+            [[0, 1, 0], [50, 1, 0], [400, 1, 0], [5000, 1, 0]]
+        )
+        viewer = players[0]
+        interest = InterestManager(near_radius=100.0, cutoff=1000.0, far_interval=3)
+        interest.update(room.players.values())
+        current = {p.id: {"id": p.id, "position": p.position} for p in players}
+
+        full = interest.build_view(viewer, None, current, snapshot_count=0)
+        assert set(full) == {"player_0", "player_1", "player_2"}
+
+        # Between far refreshes, the far car keeps its baseline state
+        moved = {k: {**v, "position": [v["position"][0] + 1, 1, 0]} for k, v in current.items()}
+        skipped = [n for n in range(1, 4) if not interest.far_update_due(viewer, n)][0]
+        view = interest.build_view(viewer, full, moved, snapshot_count=skipped)
+        assert view["player_1"] is moved["player_1"]
+        assert view["player_2"] is full["player_2"]
+        assert "player_3" not in view
+
+    def test_far_entities_follow_newest_sent_view(self):
+        """Test that far cars are carried from the last view sent, not a lagging ack."""
+        from game.net.interest import InterestManager
+
+        room, players = self.make_room([[0, 1, 0], [400, 1, 0]])
+        viewer = players[0]
+        interest = InterestManager(near_radius=100.0, cutoff=1000.0, far_interval=3)
+        interest.update(room.players.values())
+
+        def state(x):
+            return {
+                "player_0": {"id": "player_0", "position": [0, 1, 0]},
+                "player_1": {"id": "player_1", "position": [x, 1, 0]},
+            }
+
+        counts = range(1, 10)
+        refresh = [n for n in counts if interest.far_update_due(viewer, n)][0]
+        skipped = [n for n in counts if n > refresh and not interest.far_update_due(viewer, n)][0]
+
+        acked = interest.build_view(viewer, None, state(400), snapshot_count=0)
+        viewer.snapshot_history.store(1, acked)
+        refreshed = interest.build_view(viewer, acked, state(410), snapshot_count=refresh)
+        viewer.snapshot_history.store(2, refreshed)
+
+        # The client still acks seq 1 while seq 2 is in flight
+        view = interest.build_view(viewer, acked, state(420), snapshot_count=skipped)
+        assert view["player_1"] is refreshed["player_1"]
+        assert view["player_1"]["position"][0] == 410
+
+    def test_room_filters_distant_players(self):
+        """Test that a far-away player is never sent to a client."""
+        room, players = self.make_room([[0, 1, 0], [20, 1, 0], [5000, 1, 0]])
+
+        room.send_snapshots()
+        data = deserialize_message(players[0].connection.messages[-1])["data"]
+
+        assert {p["id"] for p in data["players"]} == {"player_0", "player_1"}
+
+
+    def test_identical_views_share_a_frame(self, monkeypatch):
+        """Test that players with the same view and baseline get one encoded frame."""
+        from game.net import rooms
+        from game.net.interest import InterestManager
+
+        room, players = self.make_room([[0, 1, 0], [10, 1, 0], [20, 1, 0]])
+        room.interest = InterestManager(near_radius=100.0, cutoff=1000.0)
+        for i, player in enumerate(players):
+            player.inputs.last_tick = 10 + i
+
+        encoded = []
+        encode = rooms.encode_snapshot_frame
+        monkeypatch.setattr(
+            rooms, "encode_snapshot_frame", lambda *args: encoded.append(args) or encode(*args)
+        )
+        room.send_snapshots()
+
+        assert len(encoded) == 1
+        for i, player in enumerate(players):
+            data = deserialize_message(player.connection.messages[-1])["data"]
+            assert data["input_tick"] == 10 + i
+            assert len(data["players"]) == 3
+
+        # A player acking a different baseline gets its own frame
+        players[0].acked_seq = room.tick
+        room.tick += 1
+        room.send_snapshots()
+        assert len(encoded) == 3
+
+
+class TestLagCompensation:
+    """Test the position history and lag-compensated race events."""
+
+    def test_history_ring_rewind(self):
+        """Test recording wraps the ring and rewinds clamp to the window."""
+        from game.core.batch_physics import CarBatch
+        from game.net.lag_compensation import StateHistory
+
+        cars = CarBatch(2)
+        slot = cars.allocate()
+        history = StateHistory(size=4, slots=2)
+
+        for tick in range(1, 7):
+            cars.position[slot] = [tick, 1.0, 0.0]
+            history.record(tick, cars)
+
+        assert len(history) == 4
+        assert history.oldest_tick == 3
+        assert history.rewind(5)[0][slot][0] == 5.0
+        assert history.rewind(1)[0][slot][0] == 3.0  # Clamped to the oldest tick
+        start, end, active = history.segment(6)
+        assert (start[slot][0], end[slot][0]) == (5.0, 6.0)
+        assert active[slot] and not active[1]
+
+    def test_checkpoint_crossed_between_ticks(self):
+        """Test a car moving past a checkpoint within one tick still hits it."""
+        from game.core import layout
+        from game.net.rooms import Room
+
+        room = Room("test")
+        player = room.add_player("player_0", "Fast", None)
+        x, y, z = layout.CHECKPOINT_POSITIONS[0]
+
+        room.cars.position[player.slot] = [x - 20, y, z]
+        room.history.record(1, room.cars)
+        room.cars.position[player.slot] = [x + 20, y, z]
+        room.history.record(2, room.cars)
+
+        events = room.referee.update(2)
+        assert [e["kind"] for e in events] == ["checkpoint"]
+        assert player.checkpoint == 1
+
+    def test_pickup_visible_at_view_tick(self):
+        """Test a lagging player still collects a powerup it could see."""
+        from game.core import layout
+        from game.net.rooms import Room
+
+        room = Room("test")
+        fast = room.add_player("player_0", "Local", None)
+        slow = room.add_player("player_1", "Remote", None)
+        spawn = layout.POWERUP_POSITIONS[0]
+        room.cars.position[fast.slot] = spawn
+        room.cars.position[slow.slot] = [spawn[0], spawn[1], spawn[2] + 50]
+
+        for tick in range(1, 41):
+            if tick == 40:
+                room.cars.position[slow.slot] = spawn
+            room.history.record(tick, room.cars)
+            fast.acked_seq = slow.acked_seq = tick - 30
+            events = room.referee.update(tick)
+            if tick == 1:
+                assert [e["player_id"] for e in events if e["kind"] == "pickup"] == ["player_0"]
+
+        # Taken at tick 1, long before the lagging player's view tick
+        assert [e["player_id"] for e in events if e["kind"] == "pickup"] == []
+
+        # Taken after the lagging player's view tick: it still sees it
+        room.referee.taken_tick[0] = 35
+        room.referee.collected_by[0] = {"player_0"}
+        events = room.referee.update(40)
+        assert [e["player_id"] for e in events if e["kind"] == "pickup"] == ["player_1"]
+
+    def test_contact_judged_at_view_tick(self):
+        """Test contacts use where the instigator saw the other car."""
+        from game.net.lag_compensation import INTERPOLATION_TICKS
+        from game.net.rooms import Room
+
+        room = Room("test")
+        chaser = room.add_player("player_0", "Chaser", None)
+        leader = room.add_player("player_1", "Leader", None)
+
+        for tick in range(1, 21):
+            room.cars.position[leader.slot] = [0.0, 1.0, tick * 2.0]
+            room.cars.position[chaser.slot] = [0.0, 1.0, 20.0]
+            room.history.record(tick, room.cars)
+
+        # At tick 20 the leader is 20 units ahead, but the chaser's view
+        # shows it at tick 10, right where the chaser is
+        chaser.acked_seq = 10 + INTERPOLATION_TICKS
+        leader.acked_seq = 20
+        events = room.referee.check_contacts(20)
+        assert [(e["player_id"], e["other"]) for e in events] == [("player_0", "player_1")]
+        assert room.referee.check_contacts(20) == []  # Reported once per contact
+
+
+class TestTickScheduler:
+    """Test fixed-timestep tick scheduling."""
+
+    @pytest.mark.asyncio
+    async def test_ticks_are_numbered_in_order(self):
+        """Test that every tick is numbered and runs in sequence."""
+        from game.net.tick import TickScheduler
+
+        ticks = []
+        scheduler = TickScheduler(200, ticks.append)
+        scheduler.start()
+
+        await asyncio.sleep(0.1)
+        scheduler.stop()
+
+        assert len(ticks) >= 10
+        assert ticks == list(range(len(ticks)))
+
+    @pytest.mark.asyncio
+    async def test_rate_holds_under_load(self):
+        """Test that tick work does not slow down the tick rate."""
+        import time
+        from game.net.tick import TickScheduler
+
+        ticks = []
+
+        def busy_tick(tick):
+            ticks.append(tick)
+            time.sleep(0.003)  # 60% of a 5ms slice
+
+        scheduler = TickScheduler(200, busy_tick)
+        scheduler.start()
+
+        await asyncio.sleep(0.25)
+        scheduler.stop()
+
+        # A sleep-after-work loop would manage ~31 ticks here
+        assert len(ticks) >= 40
+
+    @pytest.mark.asyncio
+    async def test_catch_up_and_overrun(self):
+        """Test that late ticks are caught up and overruns are reported."""
+        import time
+        from game.net.tick import TickScheduler
+
+        ticks = []
+        overruns = []
+
+        def stalling_tick(tick):
+            ticks.append(tick)
+            if tick == 0:
+                time.sleep(0.03)  # Stall for six 5ms slices
+
+        scheduler = TickScheduler(
+            200,
+            stalling_tick,
+            max_catchup=3,
+            on_overrun=lambda tick, duration: overruns.append(tick),
+        )
+        scheduler.start()
+
+        await asyncio.sleep(0.1)
+        scheduler.stop()
+
+        assert overruns == [0]
+        assert scheduler.overrun_count == 1
+        assert scheduler.catchup_ticks >= 2
+        assert scheduler.dropped_ticks > 0
+        assert ticks == list(range(len(ticks)))
+
+    @pytest.mark.asyncio
+    async def test_run_returns_on_stop(self):
+        """Test that run() completes once the scheduler is stopped."""
+        from game.net.tick import TickScheduler
+
+        scheduler = TickScheduler(100, lambda tick: None)
+        asyncio.get_running_loop().call_later(0.05, scheduler.stop)
+
+        await asyncio.wait_for(scheduler.run(), timeout=1.0)
+
+        assert scheduler.running is False
+
+
+class TestServerSimulation:
+    """Test authoritative server-side simulation."""
+
+    def test_queued_input_moves_player(self):
+        """Test that queued inputs are simulated on each tick."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        player = server.add_player("player_0", "TestPlayer", None)
+        server.ticks_per_snapshot = 100  # No snapshots without a running loop
+
+        server.handle_input(player, {"throttle": 1.0, "steer": 0.0})
+        for tick in range(1, 16):
+            server.on_tick(tick)
+
+        assert player.position[2] > 0
+        assert player.velocity[2] > 0
+
+    def test_redundant_inputs_survive_packet_loss(self):
+        """Test that resent inputs fill ticks whose packet was lost."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        player = server.add_player("player_0", "TestPlayer", None)
+
+        def packet(tick):
+            older = [[t, 0.5, t / 10, False, False, False] for t in range(tick - 3, tick)]
+            return {"tick": tick, "throttle": 0.5, "steer": tick / 10, "inputs": older}
+
+        server.handle_input(player, packet(3))
+        # Packets for ticks 4 and 5 are lost; 6 resends them
+        server.handle_input(player, packet(6))
+
+        steers = [player.next_input().steer for _ in range(7)]
+        assert steers == [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6]
+        assert player.inputs.duplicates == 1
+        assert player.inputs.underruns == 0
+
+    def test_input_buffer_repeats_and_drops_stale(self):
+        """Test underrun repeats the last input and late ticks are dropped."""
+        from game.core.simulation import CarInput
+        from game.net.input_buffer import InputJitterBuffer
+
+        buffer = InputJitterBuffer(size=4, depth=2)
+        assert buffer.pop() == CarInput()  # Nothing received yet
+
+        buffer.push(10, CarInput(steer=1.0))
+        buffer.push(11, CarInput(steer=-1.0))
+        assert buffer.pop().steer == 1.0
+        assert buffer.pop().steer == -1.0
+
+        # Underrun: repeat, then rebuffer
+        assert buffer.pop().steer == -1.0
+        assert buffer.underruns == 1
+        assert not buffer.push(11, CarInput())
+
+        # Overflow keeps only the newest ticks
+        for tick in range(12, 20):
+            buffer.push(tick, CarInput(throttle=tick))
+        assert len(buffer) == 4
+        assert buffer.pop().throttle == 16
+
+    def test_remove_player_frees_slot(self):
+        """Test that a departed player's car slot is reused."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        first = server.add_player("player_0", "A", None, room_id="race")
+        server.add_player("player_1", "B", None, room_id="race")
+        server.remove_player("player_0")
+
+        third = server.add_player("player_2", "C", None, room_id="race")
+
+        assert third.slot == first.slot
+        assert len(third.room.cars) == 2
+
+
+class TestRooms:
+    """Test multi-room hosting."""
+
+    def test_join_by_room_id(self):
+        """Test that players joining the same room id share a room."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        a = server.add_player("player_0", "A", None, room_id="alpha")
+        b = server.add_player("player_1", "B", None, room_id="alpha")
+        c = server.add_player("player_2", "C", None, room_id="beta")
+
+        assert a.room is b.room
+        assert a.room is not c.room
+        assert len(server.rooms) == 2
+
+    def test_auto_placement_fills_rooms(self):
+        """Test that joins without a room id fill an open room first."""
+        from game.net.rooms import RoomManager
+
+        manager = RoomManager()
+        room = manager.find_room()
+        for i in range(room.max_players):
+            manager.find_room().add_player(f"player_{i}", "P", None)
+
+        assert manager.find_room() is not room
+        assert len(manager) == 2
+
+    def test_full_room_rejects_join(self):
+        """Test that a full named room raises RoomError."""
+        from game.net.rooms import RoomError, RoomManager
+
+        manager = RoomManager()
+        room = manager.find_room("full")
+        for i in range(room.max_players):
+            room.add_player(f"player_{i}", "P", None)
+
+        with pytest.raises(RoomError):
+            manager.find_room("full")
+
+    def test_empty_room_is_torn_down(self):
+        """Test that a room closes when its last player leaves."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        server.add_player("player_0", "A", None, room_id="alpha")
+        server.remove_player("player_0")
+
+        assert server.rooms.get("alpha") is None
+
+    def test_rooms_tick_independently(self):
+        """Test that each room keeps its own tick counter."""
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        server.ticks_per_snapshot = 100  # No snapshots without a running loop
+        server.add_player("player_0", "A", None, room_id="alpha")
+        server.on_tick(1)
+        server.add_player("player_1", "B", None, room_id="beta")
+        server.on_tick(2)
+
+        assert server.rooms.get("alpha").tick == 2
+        assert server.rooms.get("beta").tick == 1
+
+
+    def test_deterministic_room_records_replay(self, tmp_path, monkeypatch):
+        """Test fixed-point rooms hash identically and save verifiable replays."""
+        from game import config
+        from game.core.deterministic import Replay
+        from game.core.simulation import CarInput
+        from game.net.rooms import Room, RoomManager
+
+        monkeypatch.setattr(config, "REPLAY_DIR", str(tmp_path))
+        manager = RoomManager()
+        rooms = [Room(room_id, deterministic=True, seed=3) for room_id in ("alpha", "beta")]
+        for room in rooms:
+            player = room.add_player("player_0", "A", None)
+            for tick in range(30):
+                player.inputs.push(tick, CarInput(throttle=1.0, steer=tick % 3 - 1))
+                room.step(1 / config.TICKRATE)
+
+        assert rooms[0].state_hashes == rooms[1].state_hashes
+        assert rooms[0].cars.position[0, 2] > 0
+
+        manager.rooms["alpha"] = rooms[0]
+        manager.close_room("alpha")
+        (path,) = tmp_path.iterdir()
+        replay = Replay.load(path)
+        sim, divergence = replay.run()
+        assert divergence is None
+        assert sim.state_hash() == rooms[0].state_hashes[30]
+
+    def test_deterministic_room_skips_replay_without_dir(self, monkeypatch):
+        """Test rooms record nothing when replays are not saved."""
+        from game import config
+        from game.net.rooms import Room
+
+        monkeypatch.setattr(config, "REPLAY_DIR", "")
+        room = Room("gamma", deterministic=True, seed=3)
+        room.add_player("player_0", "A", None)
+        room.step(1 / config.TICKRATE)
+
+        assert room.replay is None
+        assert room.tick == 1
+
+class TestWorkerRouting:
+    """Test room routing between supervisor workers."""
+
+    def test_new_rooms_go_to_least_loaded_worker(self):
+        """Test that room placement balances players across workers."""
+        import multiprocessing
+        from game.net.supervisor import RoomDirectory
+
+        with multiprocessing.Manager() as manager:
+            directory = RoomDirectory(manager, 3)
+            directory.set_load(0, 5)
+            directory.set_load(1, 2)
+            directory.set_load(2, 4)
+
+            assert directory.assign("a") == 1
+            assert directory.assign("a") == 1  # Existing rooms keep their owner
+            directory.set_load(1, 6)
+            assert directory.assign("b") == 2
+
+            directory.release("a")
+            assert directory.owner("a") is None
+
+    def test_unclaimed_rooms_expire(self):
+        """Test a room assigned for a redirect nobody followed is forgotten."""
+        import multiprocessing
+        from game import config
+        from game.net.supervisor import RoomDirectory
+
+        with multiprocessing.Manager() as manager:
+            directory = RoomDirectory(manager, 2)
+            assert directory.assign("ghost", now=0.0) == 0
+            assert directory.assign("real", now=0.0) == 1
+            directory.claim("real", 1)
+
+            later = config.ROOM_CLAIM_TIMEOUT + 1.0
+            directory.set_load(0, 5)
+            assert directory.assign("other", now=later) == 1
+            assert directory.owner("ghost") is None
+            assert directory.owner("real") == 1
+
+    @pytest.mark.asyncio
+    async def test_join_for_foreign_room_is_redirected(self):
+        """Test that a worker redirects joins for rooms it does not own."""
+        import multiprocessing
+        from game.net.server import NetworkServer
+        from game.net.supervisor import RoomDirectory
+
+        with multiprocessing.Manager() as manager:
+            directory = RoomDirectory(manager, 2)
+            directory.set_load(0, 10)
+            worker = NetworkServer(port=7000, worker_index=0, directory=directory)
+
+            room_id, owner = await worker.route_room("elsewhere")
+            assert (room_id, owner) == ("elsewhere", 1)
+
+            directory.rooms["mine"] = 0
+            assert await worker.route_room("mine") == ("mine", 0)
+
+
+class StalledWebSocket:
+    """Fake websocket whose sends block until released."""
+
+    def __init__(self):
+        self.remote_address = ("127.0.0.1", 0)
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed = False
+
+    async def send(self, data):
+        await self.gate.wait()
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestClientConnection:
+    """Test per-client send queues and backpressure."""
+
+    @pytest.mark.asyncio
+    async def test_send_does_not_wait_for_socket(self):
+        """Test that queueing returns immediately for a stalled client."""
+        from game.net.connection import ClientConnection
+
+        ws = StalledWebSocket()
+        connection = ClientConnection(ws)
+        connection.start()
+
+        assert connection.send(b"chat", droppable=False) is True
+        assert connection.send(b"snap", droppable=True) is True
+        assert ws.sent == []
+
+        ws.gate.set()
+        await connection.flush()
+
+        assert ws.sent == [b"chat", b"snap"]
+        connection.close()
+
+    @pytest.mark.asyncio
+    async def test_old_snapshots_dropped_reliable_kept(self):
+        """Test that only the newest snapshot survives while chat is kept."""
+        from game.net.connection import ClientConnection
+
+        ws = StalledWebSocket()
+        connection = ClientConnection(ws, high_water=100)
+        connection.start()
+        connection.send(b"first", droppable=True)
+        await asyncio.sleep(0)  # Writer picks up "first" and blocks
+
+        connection.send(b"snap_1", droppable=True)
+        connection.send(b"chat", droppable=False)
+        connection.send(b"snap_2", droppable=True)
+        connection.send(b"snap_3", droppable=True)
+
+        ws.gate.set()
+        await connection.flush()
+
+        assert ws.sent == [b"first", b"chat", b"snap_3"]
+        assert connection.dropped_snapshots == 2
+        connection.close()
+
+    @pytest.mark.asyncio
+    async def test_client_over_high_water_is_disconnected(self):
+        """Test that a client stuck over the high-water mark is dropped."""
+        from game.net.connection import ClientConnection
+
+        ws = StalledWebSocket()
+        connection = ClientConnection(ws, high_water=3, high_water_timeout=0.05)
+        connection.start()
+
+        for _ in range(5):
+            connection.send(b"snap", droppable=True)
+        assert connection.closed is False
+
+        await asyncio.sleep(0.06)
+        connection.send(b"snap", droppable=True)
+        await asyncio.sleep(0)
+
+        assert connection.closed is True
+        assert ws.closed is True
+
+    @pytest.mark.asyncio
+    async def test_reliable_overflow_disconnects(self):
+        """Test that overflowing the reliable queue closes the connection."""
+        from game.net.connection import ClientConnection
+
+        ws = StalledWebSocket()
+        connection = ClientConnection(ws, max_queue=2, high_water=100)
+
+        assert connection.send(b"a") is True
+        assert connection.send(b"b") is True
+        assert connection.send(b"c") is False
+        assert connection.closed is True
+
+
+class TestDatagramTransport:
+    """Test the UDP transport on localhost."""
+
+    @pytest.mark.asyncio
+    async def test_reliable_channel_survives_loss(self):
+        """Test that reliable messages arrive in order despite dropped datagrams."""
+        from game.net.transport import DatagramServer, connect_datagram
+
+        received = []
+
+        async def handler(session):
+            async for data in session:
+                received.append(data)
+
+        async with DatagramServer(handler, "127.0.0.1", 0) as server:
+            session = await connect_datagram("127.0.0.1", server.port)
+
+            # Drop every other datagram the client sends
+            sendto = session.transport.sendto
+            sent = [0]
+
+            def lossy_sendto(data, addr=None):
+                sent[0] += 1
+                if sent[0] % 2 == 0:
+                    sendto(data, addr)
+
+            session.transport.sendto = lossy_sendto
+            for i in range(5):
+                await session.send(b"chat %d" % i)
+
+            for _ in range(100):
+                if len(received) == 5:
+                    break
+                await asyncio.sleep(0.05)
+
+            assert received == [b"chat %d" % i for i in range(5)]
+            assert session.retransmits > 0
+            await session.close()
+
+    @pytest.mark.asyncio
+    async def test_stale_unreliable_packets_dropped(self):
+        """Test that reordered unreliable packets older than the newest are dropped."""
+        from game.net.transport import UNRELIABLE, DatagramSession
+
+        class NullTransport:
+            def is_closing(self):
+                return False
+
+            def sendto(self, data, addr=None):
+                pass
+
+        session = DatagramSession(NullTransport(), ("127.0.0.1", 0), token=7)
+        for seq, payload in [(0, b"a"), (2, b"c"), (1, b"b"), (2, b"c")]:
+            session.packet_received(UNRELIABLE, seq, 0, payload)
+
+        assert [session.incoming.get_nowait() for _ in range(2)] == [b"a", b"c"]
+        assert session.incoming.empty()
+        assert session.stale_packets == 2
+
+    @pytest.mark.asyncio
+    async def test_hello_needs_cookie_and_pending_sessions_are_capped(self, monkeypatch):
+        """Test that sessions open only for echoed cookies, up to the pending cap."""
+        from game import config
+        from game.net.transport import (
+            CHALLENGE,
+            HEADER,
+            HELLO,
+            PROTOCOL_ID,
+            WELCOME,
+            DatagramServerProtocol,
+            parse_packet,
+        )
+
+        class RecordingTransport:
+            def __init__(self):
+                self.sent = []
+
+            def is_closing(self):
+                return False
+
+            def sendto(self, data, addr=None):
+                self.sent.append((parse_packet(data), addr))
+
+            def close(self):
+                pass
+
+        async def handler(session):
+            async for _ in session:
+                pass
+
+        monkeypatch.setattr(config, "UDP_MAX_PENDING_SESSIONS", 2)
+        protocol = DatagramServerProtocol(handler)
+        transport = RecordingTransport()
+        protocol.connection_made(transport)
+
+        def hello(addr, cookie=0):
+            transport.sent.clear()
+            protocol.datagram_received(HEADER.pack(PROTOCOL_ID, HELLO, cookie, 0, 0), addr)
+            return transport.sent
+
+        addrs = [("10.0.0.1", port) for port in range(1000, 1004)]
+        [((kind, cookie, _, _, _), _)] = hello(addrs[0])
+        assert kind == CHALLENGE and protocol.sessions == {}
+        assert hello(addrs[1], cookie)[0][0][0] == CHALLENGE  # Bound to the address
+
+        for addr in addrs[:3]:
+            hello(addr, protocol.cookie(addr))
+        assert len(protocol.pending) == len(protocol.sessions) == 2
+        assert hello(addrs[3], protocol.cookie(addrs[3])) == []
+
+        # A welcomed client repeating its hello gets the same session back
+        [((kind, token, _, _, _), _)] = hello(addrs[0], protocol.cookie(addrs[0]))
+        assert kind == WELCOME and protocol.sessions[token] is protocol.pending[addrs[0]]
+        protocol.close()
+
+    @pytest.mark.asyncio
+    async def test_session_moves_only_for_newer_packets(self):
+        """Test that a replayed packet from a new address does not move the session."""
+        from game.net.transport import HEADER, PROTOCOL_ID, UNRELIABLE, DatagramServerProtocol
+
+        class NullTransport:
+            def is_closing(self):
+                return False
+
+            def sendto(self, data, addr=None):
+                pass
+
+            def close(self):
+                pass
+
+        async def handler(session):
+            async for _ in session:
+                pass
+
+        protocol = DatagramServerProtocol(handler)
+        protocol.connection_made(NullTransport())
+        home, away = ("10.0.0.1", 1000), ("10.0.0.2", 2000)
+        session = protocol.open_session(home)
+
+        def unreliable(seq, addr):
+            packet = HEADER.pack(PROTOCOL_ID, UNRELIABLE, session.token, seq, 0) + b"x"
+            protocol.datagram_received(packet, addr)
+
+        unreliable(5, home)
+        unreliable(5, away)
+        unreliable(3, away)
+        assert session.remote_address == home and session.last_unreliable == 5
+
+        unreliable(6, away)
+        assert session.remote_address == away and session.last_unreliable == 6
+        protocol.close()
+
+    @pytest.mark.asyncio
+    async def test_join_and_snapshots_over_udp(self):
+        """Test a full join, input and snapshot exchange with the game server."""
+        from game.net.server import NetworkServer
+        from game.net.transport import DatagramServer, connect_datagram
+
+        server = NetworkServer("127.0.0.1", 0)
+        async with DatagramServer(server.handle_client, "127.0.0.1", 0) as udp:
+            session = await connect_datagram("127.0.0.1", udp.port)
+            join = JoinMessage(player_name="Udp", codec="binary")
+            await session.send(serialize_message("join", join))
+            response = deserialize_message(await session.recv())
+            assert response["type"] == "join_response"
+
+            await session.send_unreliable(
+                serialize_message("input", {"tick": 0, "throttle": 1.0, "inputs": []})
+            )
+            await asyncio.sleep(0.05)
+            server.on_tick(1)
+            server.on_tick(2)
+
+            types = set()
+            while "state" not in types:
+                message = await asyncio.wait_for(session.recv(), 1.0)
+                types.add(deserialize_message(message)["type"])
+            assert "roster" in types
+
+            await session.close()
+            await asyncio.sleep(0.05)
+            assert server.players["player_0"].connection is None  # Held for a resume
+            server.expire_session("player_0")
+            assert server.players == {}
+
+
+class TestSessionResume:
+    """Test resumable sessions after a dropped connection."""
+
+    @pytest.mark.asyncio
+    async def test_server_holds_player_and_sends_keyframe(self):
+        """Test a resumed session keeps the race state and gets a full snapshot at once."""
+        from game.net.server import NetworkServer
+        from game.net.transport import DatagramServer, connect_datagram
+
+        server = NetworkServer("127.0.0.1", 0)
+        async with DatagramServer(server.handle_client, "127.0.0.1", 0) as udp:
+            session = await connect_datagram("127.0.0.1", udp.port)
+            await session.send(serialize_message("join", JoinMessage(player_name="Racer")))
+            joined = deserialize_message(await session.recv())["data"]
+            assert joined["session_token"] and not joined["resumed"]
+
+            await session.close()
+            await asyncio.sleep(0.05)
+            player = server.players[joined["player_id"]]
+            assert player.connection is None
+            assert player.expiry is not None
+            player.lap = 2
+
+            session = await connect_datagram("127.0.0.1", udp.port)
+            join = JoinMessage(player_name="Racer", session_token=joined["session_token"])
+            await session.send(serialize_message("join", join))
+            resumed = deserialize_message(await session.recv())["data"]
+            assert resumed["resumed"]
+            assert resumed["player_id"] == joined["player_id"]
+            assert player.connection is not None and player.expiry is None
+
+            # No tick has run, yet the roster and a keyframe are already on their way
+            types = {}
+            while "state" not in types:
+                message = deserialize_message(await asyncio.wait_for(session.recv(), 1.0))
+                types[message["type"]] = message["data"]
+            assert "roster" in types
+            assert types["state"]["baseline"] == -1
+            assert types["state"]["players"][0]["lap"] == 2
+
+            await session.close()
+            await asyncio.sleep(0.05)
+            assert "dog_detached_players 1" in server.metrics.registry.render_prometheus()
+
+    @pytest.mark.asyncio
+    async def test_client_reconnects_to_its_session(self, monkeypatch):
+        """Test the client resumes its session after its connection drops."""
+        from game import config
+        from game.net.client import NetworkClient
+        from game.net.server import NetworkServer
+        from game.net.transport import DatagramServer
+
+        monkeypatch.setattr(config, "RECONNECT_BACKOFF_MIN", 0.05)
+        server = NetworkServer("127.0.0.1", 0)
+        async with DatagramServer(server.handle_client, "127.0.0.1", 0) as udp:
+            monkeypatch.setattr(config, "NETWORK_TRANSPORT", "udp")
+            client = NetworkClient("127.0.0.1", udp.port, "Racer", None)
+
+            async def wait_for(condition):
+                for _ in range(100):
+                    if condition():
+                        return
+                    await asyncio.sleep(0.02)
+                raise AssertionError("timed out")
+
+            try:
+                await wait_for(lambda: client.connected)
+                player_id = client.player_id
+                client.network.submit(client.websocket.close())
+                await wait_for(lambda: server.sessions_resumed == 1 and client.connected)
+                assert client.player_id == player_id
+                assert list(server.players) == [player_id]
+            finally:
+                client.disconnect()
+
+
+class TestMetrics:
+    """Test the server metrics registry and exporter."""
+
+    def test_prometheus_rendering(self):
+        """Test histograms and labelled counters in the text format."""
+        from game.net.metrics import Counter, Histogram, MetricsRegistry
+
+        registry = MetricsRegistry(const_labels={"worker": "0"})
+        histogram = registry.add(Histogram("tick_seconds", "Tick time.", (0.001, 0.01)))
+        counter = registry.add(Counter("sent_bytes_total", "Bytes.", ("client",)))
+        for value in (0.0005, 0.005, 0.5):
+            histogram.observe(value)
+        counter.inc(10, ("player_0",))
+
+        text = registry.render_prometheus()
+        assert "# TYPE dog_tick_seconds histogram" in text
+        assert 'dog_tick_seconds_bucket{worker="0",le="0.001"} 1' in text
+        assert 'dog_tick_seconds_bucket{worker="0",le="0.01"} 2' in text
+        assert 'dog_tick_seconds_bucket{worker="0",le="+Inf"} 3' in text
+        assert 'dog_tick_seconds_count{worker="0"} 3' in text
+        assert 'dog_sent_bytes_total{worker="0",client="player_0"} 10' in text
+
+        counter.remove(0, "player_0")
+        assert "player_0" not in registry.render_prometheus()
+
+    @pytest.mark.asyncio
+    async def test_server_metrics_scrape(self):
+        """Test per-client and per-type counters served over HTTP."""
+        from game.net.metrics import MetricsExporter
+        from game.net.server import NetworkServer
+
+        server = NetworkServer("127.0.0.1", 0)
+        server.add_player("player_0", "Alice", RecordingConnection())
+        data = serialize_message("input", {"tick": 0, "throttle": 1.0, "inputs": []})
+        await server.handle_message("player_0", data)
+        server.on_tick(1)
+
+        async with MetricsExporter(server.metrics, "127.0.0.1", 0, dump_path="") as exporter:
+            reader, writer = await asyncio.open_connection("127.0.0.1", exporter.port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = (await asyncio.wait_for(reader.read(), 1.0)).decode()
+            writer.close()
+
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert f'dog_client_received_bytes_total{{client="player_0"}} {len(data)}' in response
+        assert 'dog_message_received_total{type="input"} 1' in response
+        assert "dog_tick_duration_seconds_count 1" in response
+        assert "dog_players 1" in response
+
+
+class TestLoadTest:
+    """Test the headless bot load generator."""
+
+    @pytest.mark.asyncio
+    async def test_bots_measure_snapshots_and_latency(self):
+        """Test bots join over UDP, get snapshots and measure input latency."""
+        import time
+
+        from game.net.loadtest import BotClient, summarize
+        from game.net.server import NetworkServer
+        from game.net.transport import DatagramServer
+
+        server = NetworkServer("127.0.0.1", 0)
+        async with DatagramServer(server.handle_client, "127.0.0.1", 0) as udp:
+            scheduler = asyncio.create_task(server.game_loop())
+            bots = [
+                BotClient("127.0.0.1", udp.port, f"bot_{i}", "load", transport="udp")
+                for i in range(2)
+            ]
+            await asyncio.gather(*(bot.run(time.time() + 0.8) for bot in bots))
+            server.stop()
+            await scheduler
+
+        results = [bot.results() for bot in bots]
+        assert all(r["joined"] and not r["error"] for r in results)
+        assert all(r["snapshots"] > 5 and r["latencies"] for r in results)
+
+        report = summarize(results, [], [], 0.8)
+        assert report["joined"] == 2
+        assert 0 < report["input_latency_ms"]["p50"] < 500
+        assert "server" not in report
+
+    def test_missing_shards_are_reported_as_errors(self):
+        """Test a bot process that dies or hangs is reported instead of awaited forever."""
+        import multiprocessing
+        import sys
+        import time
+
+        from game.net.loadtest import collect_results, summarize
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=time.sleep, args=(0,)),
+            multiprocessing.Process(target=sys.exit, args=(3,)),
+            multiprocessing.Process(target=time.sleep, args=(60,)),
+        ]
+        shards = [[{"name": f"bot_{i}"}] for i in range(3)]
+        for process in workers:
+            process.start()
+        shard = [{"name": "bot_0", "joined": False, "error": "refused"}]
+        results.put((0, shard))
+
+        started = time.time()
+        bot_results = collect_results(workers, shards, results, started + 1.0)
+        assert time.time() - started < 5.0
+        assert all(process.exitcode is not None for process in workers)
+
+        report = summarize(bot_results, [], [], 1.0)
+        assert report["bots"] == 3
+        assert report["errors"] == {
+            "refused": 1,
+            "bot process 1 exited with code 3": 1,
+            "bot process 2 did not report in time": 1,
+        }
+
+
+class TestNetworkProxy:
+    """Test the network-conditions proxy."""
+
+    def test_shaper_applies_bandwidth_loss_and_order(self):
+        """Test the bottleneck queue, random loss and in-order delivery."""
+        import random
+        from game.net.proxy import LinkConditions, LinkShaper, LinkStats
+
+        # 8 kbit/s: each 100 byte packet takes 0.1 s on the wire
+        stats = LinkStats()
+        link = LinkShaper(
+            LinkConditions(latency=0.05, bandwidth=8000, queue=250), random.Random(1), stats
+        )
+        arrivals = [link.schedule(100, 0.0)[0] for _ in range(3)]
+        assert arrivals[:2] == pytest.approx([0.15, 0.25])
+        assert arrivals[2] is None and stats.queue_drops == 1
+
+        stats = LinkStats()
+        link = LinkShaper(
+            LinkConditions(latency=0.05, jitter=0.02, loss=0.1), random.Random(1), stats
+        )
+        arrivals = [link.schedule(100, i * 0.01)[0] for i in range(2000)]
+        delivered = [a for a in arrivals if a is not None]
+        assert 150 < stats.lost < 250
+        assert delivered == sorted(delivered)
+
+        # Streams turn losses into retransmission delays
+        stats = LinkStats()
+        link = LinkShaper(LinkConditions(loss=1.0), random.Random(1), stats)
+        arrival, event = link.schedule(100, 0.0, stream=True)
+        assert event == "retransmit" and arrival >= 0.2
+
+    def test_overrides_apply_to_every_scripted_step(self):
+        """Test command-line overrides survive each profile switch of a script."""
+        from argparse import Namespace
+        from game.net.proxy import PROFILES, parse_script, profile_from_args
+
+        args = Namespace(loss=None, down_loss=0.05, latency=0.2)
+        steps = [profile_from_args(args, profile) for profile, _ in parse_script("4g:5,3g")]
+
+        assert [profile.name for profile in steps] == ["4g", "3g"]
+        for profile in steps:
+            assert profile.down.loss == 0.05
+            assert profile.up.latency == profile.down.latency == 0.2
+        assert steps[1].up.loss == PROFILES["3g"].up.loss
+
+    @pytest.mark.asyncio
+    async def test_client_traffic_through_proxy(self, tmp_path):
+        """Test a join over UDP through the proxy pays the latency each way and is logged."""
+        import json
+        import time
+        from game.net.proxy import LinkConditions, NetworkProxy, Profile
+        from game.net.server import NetworkServer
+        from game.net.transport import DatagramServer, connect_datagram
+
+        server = NetworkServer("127.0.0.1", 0)
+        profile = Profile("slow", LinkConditions(latency=0.03), LinkConditions(latency=0.05))
+        log_path = tmp_path / "frames.jsonl"
+        async with DatagramServer(server.handle_client, "127.0.0.1", 0) as udp:
+            async with NetworkProxy(
+                "127.0.0.1", udp.port, profile=profile, seed=1, log_path=str(log_path), tcp=False
+            ) as proxy:
+                session = await connect_datagram("127.0.0.1", proxy.port)
+                started = time.monotonic()
+                await session.send(serialize_message("join", JoinMessage(player_name="Far")))
+                response = deserialize_message(await session.recv())
+                assert response["type"] == "join_response"
+                assert time.monotonic() - started >= 0.08
+                await session.close()
+
+                report = proxy.report()
+                assert report["up"]["delivered"] >= 2 and report["down"]["delivered"] >= 2
+                assert report["down"]["mean_delay_ms"] == pytest.approx(50, abs=1)
+
+        entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+        assert {entry["dir"] for entry in entries} == {"up", "down"}
+        assert all(entry["event"] == "sent" for entry in entries)
+
+
+class TestSnapshotRate:
+    """Test per-client adaptive snapshot rates."""
+
+    def test_loss_backs_off_and_recovery_ramps_up(self):
+        """Test lost snapshots lower rate and detail, a clean link raises them."""
+        from game.net.rate_control import DETAIL_FULL, SnapshotRateController
+
+        connection = RecordingConnection()
+        rate = SnapshotRateController(min_rate=10, max_rate=30, adapt_interval=0.5)
+        rate.update(connection, now=0.0)
+
+        # Half of the snapshots never arrive
+        received = 0
+        for seq in range(15):
+            rate.on_sent(seq, now=seq / 30)
+            if seq % 2 == 0:
+                received += 1
+                rate.on_ack(seq, received, now=seq / 30 + 0.05)
+        for _ in range(4):
+            rate.update(connection, now=rate.period_start + 0.5)
+        assert rate.loss > 0.1
+        assert rate.rate == 10
+        assert rate.detail < DETAIL_FULL
+        assert rate.interpolation_delay() > 0.1
+
+        rate.loss = 0.0
+        for _ in range(20):
+            rate.update(connection, now=rate.period_start + 0.5)
+        assert rate.rate == 30
+        assert rate.detail == DETAIL_FULL
+
+    def test_room_sends_at_each_players_rate(self):
+        """Test a slowed player gets a share of snapshots and is told its rate."""
+        from game.net.rooms import Room
+
+        room = Room("test")
+        fast = room.add_player("player_0", "Fast", RecordingConnection())
+        slow = room.add_player("player_1", "Slow", RecordingConnection())
+        slow.rate.rate = slow.rate.max_rate / 3
+
+        for _ in range(30):
+            room.step(1 / 60)
+            room.send_snapshots(now=0.0)
+        sent = {
+            player.id: sum(
+                deserialize_message(m)["type"] == "state" for m in player.connection.messages
+            )
+            for player in (fast, slow)
+        }
+        assert sent[fast.id] == 30
+        assert sent[slow.id] == 10
+
+        # The next adjustment announces the slow player's rate
+        assert room.send_snapshots(now=1.0) >= 1
+        rate_messages = [
+            deserialize_message(m)["data"]
+            for m in slow.connection.messages
+            if deserialize_message(m)["type"] == "snapshot_rate"
+        ]
+        assert rate_messages[-1]["rate"] < 30
+        assert slow.interpolation_ticks > fast.interpolation_ticks
+
+
+class TestClockSync:
+    """Test the NTP-style server clock estimate."""
+
+    def test_offset_converges_despite_skew_and_jitter(self):
+        """Test a 5s skew is found from the lowest-RTT sample and then slewed."""
+        import random
+
+        from game.net.clock import ClockSync
+
+        rng = random.Random(7)
+        skew = 5.0  # Server clock runs this far ahead of the client's
+        local = [100.0]
+        clock = ClockSync(clock=lambda: local[0])
+
+        for _ in range(8):
+            sent = local[0]
+            uplink, downlink = rng.uniform(0.02, 0.2), rng.uniform(0.02, 0.2)
+            server_time = sent + uplink + skew
+            local[0] = sent + uplink + downlink
+            clock.handle_pong({"client_time": sent, "server_time": server_time})
+            local[0] += 0.1
+
+        best_rtt = clock.rtt
+        assert abs(clock.server_time() - (local[0] + skew)) <= best_rtt / 2 + 1e-9
+
+        # A small correction is slewed, never jumping backwards
+        clock.target_offset += 0.02
+        before = clock.server_time()
+        local[0] += 0.1
+        after = clock.server_time()
+        assert 0.1 < after - before <= 0.1 * (1 + 0.05) + 1e-9
+        local[0] += 1.0
+        clock.server_time()
+        assert abs(clock.offset - clock.target_offset) < 1e-9
+
+    def test_server_answers_ping(self):
+        """Test the server echoes the ping time with its clock and room tick."""
+        from game.net.clock import ClockSync
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        connection = RecordingConnection()
+        player = server.add_player("player_0", "A", connection)
+        server.on_tick(1)
+
+        clock = ClockSync()
+        server.handle_ping(player, clock.build_ping().to_dict())
+        pong = deserialize_message(connection.messages[-1])
+        assert pong["type"] == "pong"
+        assert pong["data"]["tick"] == 1
+
+        clock.handle_pong(pong["data"])
+        assert clock.synced
+        assert abs(clock.offset) < 0.05  # Same machine, same monotonic clock
+
+
+class TestAdaptiveDelay:
+    """Test the jitter-driven interpolation delay."""
+
+    def feed(self, delay, spread, count=150, rate=30):
+        """Deliver snapshots whose transit varies uniformly over ``spread`` seconds."""
+        import random
+
+        rng = random.Random(1)
+        for i in range(count):
+            timestamp = i / rate
+            delay.on_snapshot(timestamp, timestamp + 0.02 + rng.uniform(0, spread))
+
+    def test_delay_follows_jitter(self):
+        """Test steady links get a short delay and jittery ones a long one."""
+        from game.net.jitter import AdaptiveDelay
+
+        steady = AdaptiveDelay()
+        self.feed(steady, spread=0.002)
+        jittery = AdaptiveDelay()
+        self.feed(jittery, spread=0.15)
+
+        # One snapshot interval plus transit and margin, well under the default
+        assert 0.05 < steady.target < 0.065
+        assert jittery.target > 0.17
+        assert jittery.jitter > 10 * steady.jitter
+        assert steady.loss == pytest.approx(0.0, abs=1e-9)
+
+    def test_delay_changes_by_warping_playback(self):
+        """Test the delay moves toward its target at the warp rate only."""
+        from game import config
+        from game.net.jitter import AdaptiveDelay
+
+        delay = AdaptiveDelay()
+        self.feed(delay, spread=0.002)
+        start = delay.advance(100.0)
+        assert start == config.INTERPOLATION_DELAY
+
+        later = delay.advance(100.1, underrun=True)
+        assert start - later == pytest.approx(config.INTERPOLATION_WARP * 0.1)
+        assert delay.underrun_rate > 0
+
+        delay.advance(110.0)
+        assert delay.delay == delay.target
+
+    def test_delay_adapts_while_rate_keeps_changing(self):
+        """Test frequent rate changes do not hold the delay at the fallback."""
+        from game.net.jitter import AdaptiveDelay
+
+        delay = AdaptiveDelay()
+        timestamp = 0.0
+        for change in range(20):
+            rate = 15 if change % 2 else 12
+            delay.set_rate(rate)
+            # About what arrives in one rate-control interval at this rate
+            for _ in range(7):
+                timestamp += 1 / rate
+                delay.on_snapshot(timestamp, timestamp + 0.02)
+
+        assert delay.target < delay.fallback
+        assert delay.target == pytest.approx(1 / 12 + 0.02 + 0.005, abs=1e-6)
+        assert delay.loss == pytest.approx(0.0, abs=1e-6)
+
+    def test_server_rewinds_by_reported_delay(self):
+        """Test lag compensation uses the delay the client reports."""
+        from game import config
+        from game.net.server import NetworkServer
+
+        server = NetworkServer()
+        player = server.add_player("player_0", "TestPlayer", None)
+        server.handle_input(player, {"throttle": 0.0, "steer": 0.0, "delay": 0.05})
+
+        assert player.interpolation_ticks == round(0.05 * config.TICKRATE)
+        text = server.metrics.registry.render_prometheus()
+        assert 'dog_client_interpolation_delay_seconds{client="player_0"} 0.05' in text
+
+        # Reports outside the supported range are clamped before rewinding
+        server.handle_input(player, {"throttle": 0.0, "steer": 0.0, "delay": 30.0})
+        assert player.interpolation_delay == config.INTERPOLATION_DELAY_MAX
+        assert player.interpolation_ticks == round(config.INTERPOLATION_DELAY_MAX * config.TICKRATE)
+        server.handle_input(player, {"throttle": 0.0, "steer": 0.0, "delay": 0.0})
+        assert player.interpolation_delay == config.INTERPOLATION_DELAY_MIN
+
+
+class TestClientPrediction:
+    """Test local car prediction and reconciliation."""
+
+    def server_states(self, inputs, start):
+        """Get the server's state after each input, stepping from ``start``."""
+        from game import config
+        from game.core.simulation import HeadlessPhysics
+
+        physics = HeadlessPhysics()
+        state = start.copy()
+        states = []
+        for car_input in inputs:
+            physics.step(state, car_input, 1.0 / config.TICKRATE)
+            states.append(state.copy())
+        return states
+
+    def test_agreeing_server_causes_no_correction(self):
+        """Test a server that saw the same inputs confirms the prediction."""
+        from game.core.simulation import CarInput, CarState
+        from game.net.state_sync import ClientPrediction
+
+        prediction = ClientPrediction()
+        inputs = [CarInput(throttle=1.0, steer=0.3 * (i % 3 - 1)) for i in range(20)]
+        start = CarState()
+        prediction.reconcile(0, start)
+        for tick, car_input in enumerate(inputs, 1):
+            prediction.predict(tick, car_input)
+
+        server = self.server_states(inputs, start)
+        assert not prediction.reconcile(10, server[9])
+        assert prediction.corrections == 0
+        assert prediction.state.position == server[-1].position
+
+    def test_misprediction_replays_and_blends(self):
+        """Test a correction replays later inputs and the visual jump decays."""
+        from game.core.simulation import CarInput, CarState
+        from game.net.state_sync import ClientPrediction
+
+        prediction = ClientPrediction()
+        inputs = [CarInput(throttle=1.0) for _ in range(20)]
+        start = CarState()
+        prediction.reconcile(0, start)
+        for tick, car_input in enumerate(inputs, 1):
+            prediction.predict(tick, car_input)
+        shown = prediction.state.copy()
+
+        # The server had the car 1 m further along at tick 10
+        server = self.server_states(inputs[:10], start)[-1]
+        server.position[2] += 1.0
+        assert prediction.reconcile(10, server)
+        assert prediction.corrections == 1
+
+        expected = self.server_states(inputs[10:], server)[-1]
+        assert prediction.tick == 20
+        assert prediction.state.position == pytest.approx(expected.position)
+
+        position, _ = prediction.display(now=0.0)
+        assert position == pytest.approx(shown.position)
+        position, _ = prediction.display(now=1.0)
+        assert position == pytest.approx(expected.position, abs=1e-3)
+
+    def test_inputs_before_first_state_are_replayed(self):
+        """Test inputs sampled before the first server state are not lost."""
+        from game.core.simulation import CarInput, CarState
+        from game.net.state_sync import ClientPrediction
+
+        prediction = ClientPrediction()
+        inputs = [CarInput(throttle=1.0) for _ in range(6)]
+        for tick, car_input in enumerate(inputs):
+            prediction.predict(tick, car_input)
+        assert not prediction.started
+
+        start = CarState()
+        server = self.server_states(inputs[:2], start)
+        prediction.reconcile(1, server[-1])
+        assert prediction.started
+        assert prediction.corrections == 0
+        expected = self.server_states(inputs[2:], server[-1])[-1]
+        assert prediction.state.position == pytest.approx(expected.position)
+
+
+class RecordingConnection:
+    """Fake client connection that records queued messages."""
+
+    def __init__(self):
+        self.messages = []
+        self.sent_bytes = 0
+        self.dropped_snapshots = 0
+        self.backlog = 0
+
+    def send(self, data, droppable=False):
+        self.messages.append(data)
+        self.sent_bytes += len(data)
+        return True
+
+
+class TestDeltaSnapshots:
+    """Test delta compression against acknowledged baselines."""
+
+    def make_entity(self, entity_id, x, lap=1):
+        return {
+            "id": entity_id,
+            "name": entity_id.upper(),
+            "position": [x, 1.0, 0.0],
+            "rotation": [0.0, 0.0, 0.0],
+            "velocity": [0.0, 0.0, 0.0],
+            "lap": lap,
+            "checkpoint": 0,
+        }
+
+    def test_delta_round_trip(self):
+        """Test that applying a delta rebuilds the current state."""
+        from game.net.delta import apply_delta, encode_delta, index_entities
+
+        baseline = index_entities([self.make_entity("a", 0.0), self.make_entity("b", 5.0)])
+        current = index_entities([self.make_entity("a", 1.0), self.make_entity("c", 9.0)])
+
+        players, removed = encode_delta(baseline, current)
+
+        assert removed == ["b"]
+        assert {"id": "a", "position": [1.0, 1.0, 0.0]} in players
+        assert apply_delta(baseline, players, removed) == current
+
+    def test_unchanged_entities_omitted(self):
+        """Test that entities identical to the baseline are not sent."""
+        from game.net.delta import encode_delta, index_entities
+
+        baseline = index_entities([self.make_entity("a", 0.0), self.make_entity("b", 5.0)])
+        current = index_entities([self.make_entity("a", 0.0), self.make_entity("b", 5.0, lap=2)])
+
+        players, removed = encode_delta(baseline, current)
+
+        assert players == [{"id": "b", "lap": 2}]
+        assert removed == []
+
+    def test_history_window(self):
+        """Test that old snapshots fall out of the history."""
+        from game.net.delta import SnapshotHistory
+
+        history = SnapshotHistory(size=4)
+        for seq in range(10):
+            history.store(seq, {})
+
+        assert history.get(5) is None
+        assert history.get(6) == {}
+        assert history.latest_seq() == 9
+
+    def test_room_sends_delta_after_ack(self):
+        """Test full snapshot first, deltas after an ack, full again when stale."""
+        from game.core.simulation import CarInput
+        from game.net.rooms import Room
+
+        room = Room("test")
+        connection = RecordingConnection()
+        player = room.add_player("player_0", "Tester", connection)
+        room.add_player("player_1", "Parked", None)
+
+        room.step(1 / 60)
+        room.send_snapshots()
+        full_frame = connection.messages[-1]
+        full = deserialize_message(full_frame)["data"]
+        assert full["baseline"] == -1
+        assert len(full["players"]) == 2
+
+        player.acked_seq = full["seq"]
+        player.inputs.push(0, CarInput(throttle=1.0))
+        player.inputs.push(1, CarInput(throttle=1.0))
+        room.step(1 / 60)
+        room.send_snapshots()
+        delta = deserialize_message(connection.messages[-1])["data"]
+        assert delta["baseline"] == full["seq"]
+        assert [p["id"] for p in delta["players"]] == ["player_0"]
+        assert "name" not in delta["players"][0]
+        assert len(connection.messages[-1]) < len(full_frame)
+
+        # Ack falls out of the history window
+        for _ in range(player.snapshot_history.size + 1):
+            room.step(1 / 60)
+            room.send_snapshots()
+        stale = deserialize_message(connection.messages[-1])["data"]
+        assert stale["baseline"] == -1
+
+    def test_client_rebuilds_state_from_deltas(self):
+        """Test that the client decodes deltas against its acked baseline."""
+        from game.net.client import NetworkClient
+
+        client = NetworkClient.__new__(NetworkClient)
+        client.last_snapshot_seq = -1
+        client.codec = "msgpack"
+        from game.net.delta import SnapshotHistory
+
+        client.snapshot_history = SnapshotHistory()
+
+        full = {"seq": 1, "baseline": -1, "players": [self.make_entity("a", 0.0)]}
+        delta = {"seq": 2, "baseline": 1, "players": [{"id": "a", "lap": 2}]}
+        unknown = {"seq": 3, "baseline": 99, "players": []}
+
+        assert client.decode_snapshot(full)[0]["position"] == [0.0, 1.0, 0.0]
+        rebuilt = client.decode_snapshot(delta)[0]
+        assert rebuilt["lap"] == 2
+        assert rebuilt["name"] == "A"
+        assert client.decode_snapshot(unknown) is None
+        assert client.decode_snapshot(delta) is None  # Stale
+        assert client.last_snapshot_seq == 2
+
+
 class TestNetworkClient:
     """Test network client functionality."""
 
@@ -116,6 +1887,103 @@ class TestNetworkClient:
         # Should not be connected
         assert not client.connected
 
+    @pytest.mark.asyncio
+    async def test_inputs_sampled_per_tick_and_resent(self):
+        """Test that each input packet carries the recent tick-stamped inputs."""
+        from types import SimpleNamespace
+        from game import config
+        from game.core.simulation import CarInput
+        from game.net.client import NetworkClient
+
+        car = SimpleNamespace(current_input=CarInput(throttle=1.0))
+        client = NetworkClient(
+            "127.0.0.1", 1, "TestPlayer", SimpleNamespace(player_car=car), autoconnect=False
+        )
+        client.player_id = "player_0"
+
+        interval = 1.0 / config.TICKRATE
+        assert client.sample_inputs(now=100.0) == 1
+        assert client.sample_inputs(now=100.0 + 2.5 * interval) == 2
+        # A long stall samples at most MAX_CATCHUP_TICKS ticks
+        assert client.sample_inputs(now=200.0) == config.MAX_CATCHUP_TICKS
+
+        msg = client.build_input_message()
+        assert msg.tick == client.input_tick
+        assert msg.throttle == 1.0
+        assert len(msg.inputs) == config.INPUT_REDUNDANCY - 1
+        assert [entry[0] for entry in msg.inputs] == list(
+            range(msg.tick - len(msg.inputs), msg.tick)
+        )
+        client.disconnect()
+
+    def test_network_thread_hands_newest_snapshots_to_game_thread(self):
+        """Test decoding runs off the game thread and a backlog coalesces."""
+        import threading
+        from types import SimpleNamespace
+        from game import config
+        from game.net.client import NetworkClient
+
+        client = NetworkClient("127.0.0.1", 1, "TestPlayer", None, autoconnect=False)
+        client.connected = True
+        threads = set()
+        decode = client.decode_snapshot
+
+        def recording_decode(msg_data):
+            threads.add(threading.current_thread())
+            return decode(msg_data)
+
+        client.decode_snapshot = recording_decode
+
+        async def deliver():
+            for seq in range(1, 21):
+                entity = {"id": "a", "name": "A", "position": [float(seq), 1.0, 0.0]}
+                state = {"seq": seq, "baseline": -1, "timestamp": seq * 0.1, "players": [entity]}
+                await client.handle_message({"type": "state", "data": state})
+            await client.handle_message({"type": "race_event", "data": {"kind": "lap"}})
+
+        client.network.submit(deliver()).result(1.0)
+        assert threads == {client.network.thread}
+        assert client.snapshots_received == 20
+        assert not client.snapshots  # Nothing crosses until the game thread asks
+
+        client.world = SimpleNamespace(player_car=None)
+        client.update()
+        assert list(client.snapshots.times) == [
+            seq * 0.1 for seq in range(21 - config.CLIENT_SNAPSHOT_QUEUE, 21)
+        ]
+        assert client.take_race_events() == [{"kind": "lap"}]
+        assert client.take_race_events() == []
+
+        client.disconnect()
+        assert not client.network.running
+
+    def test_only_newest_queued_input_is_sent(self):
+        """Test the network thread sends the newest of several queued input packets."""
+        from game.net.client import NetworkClient
+        from game.net.messages import InputMessage, deserialize_message
+
+        class FakeSocket:
+            def __init__(self):
+                self.sent = []
+
+            async def send(self, data):
+                self.sent.append(deserialize_message(data))
+
+        client = NetworkClient("127.0.0.1", 1, "TestPlayer", None, autoconnect=False)
+        client.websocket = FakeSocket()
+        client.player_id = "player_0"
+        client.flush_pending = True  # Hold the flush until everything is queued
+        for tick in (1, 2, 3):
+            message = InputMessage("player_0", 1.0, 0.0, False, False, False, 0.0, tick=tick)
+            client.queue_send("input", message)
+        client.outbound.append(("ping", None))
+        client.network.submit(client.flush_outbound()).result(1.0)
+
+        assert [(m["type"], m["data"].get("tick")) for m in client.websocket.sent] == [
+            ("input", 3),
+            ("ping", None),
+        ]
+        client.disconnect()
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -63,6 +63,252 @@ class TestPhysics:
         assert physics.is_drifting is False
 
 
+class RotatingEntity(MockEntity):
+    """Mock entity whose direction vectors follow rotation_y."""
+
+    @property
+    def forward(self):
+        import math
+
+        rad = math.radians(self.rotation_y)
+        return Vec3(math.sin(rad), 0, math.cos(rad))
+
+    @forward.setter
+    def forward(self, value):
+        pass
+
+    @property
+    def right(self):
+        import math
+
+        rad = math.radians(self.rotation_y)
+        return Vec3(math.cos(rad), 0, -math.sin(rad))
+
+    @right.setter
+    def right(self, value):
+        pass
+
+
+class TestHeadlessPhysics:
+    """Test renderer-free simulation core."""
+
+    def test_simulation_does_not_import_ursina(self):
+        """Test that the headless core is importable without a renderer."""
+        import subprocess
+        import sys
+
+        code = (
+            "import sys, game.core.simulation; "
+            "sys.exit(1 if 'ursina' in sys.modules else 0)"
+        )
+        assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+    def test_acceleration_from_rest(self):
+        """Test throttle accelerates the car forward."""
+        from game.core.simulation import CarInput, CarState, HeadlessPhysics
+
+        physics = HeadlessPhysics()
+        state = CarState()
+
+        for _ in range(60):
+            physics.step(state, CarInput(throttle=1.0), 1 / 60)
+
+        assert state.velocity[2] > 0
+        assert state.position[2] > 0
+        assert state.position[1] == 1.0
+
+    def test_matches_physics_rules(self):
+        """Test headless stepping matches Physics.apply_input/update."""
+        import time
+        from game.core.physics import Physics
+        from game.core.simulation import CarInput, CarState, HeadlessPhysics
+
+        dt = 1 / 60
+        time.dt = dt
+
+        entity = RotatingEntity()
+        physics = Physics(entity)
+        headless = HeadlessPhysics()
+        state = CarState()
+
+        script = (
+            [CarInput(throttle=1.0)] * 60
+            + [CarInput(throttle=1.0, steer=1.0, boost=True)] * 30
+            + [CarInput(throttle=1.0, steer=-1.0, handbrake=True)] * 30
+            + [CarInput(throttle=-1.0, brake=True)] * 20
+        )
+
+        for inputs in script:
+            physics.apply_input(
+                inputs.throttle, inputs.steer, inputs.brake, inputs.handbrake, inputs.boost
+            )
+            physics.update()
+            headless.step(state, inputs, dt)
+
+            assert state.is_drifting == physics.is_drifting
+            assert state.boost_active == physics.boost_active
+
+        assert abs(state.yaw - entity.rotation_y) < 1e-2
+        for i in range(3):
+            assert abs(state.position[i] - entity.position[i]) < 1e-2
+            assert abs(state.velocity[i] - physics.velocity[i]) < 1e-2
+
+
+class TestBatchPhysics:
+    """Test vectorized batch simulation."""
+
+    def test_batch_grows_and_reuses_slots(self):
+        """Test slot allocation and release."""
+        from game.core.batch_physics import CarBatch
+
+        cars = CarBatch(capacity=2)
+        slots = [cars.allocate() for _ in range(5)]
+
+        assert slots == [0, 1, 2, 3, 4]
+        assert cars.capacity >= 5
+
+        cars.release(1)
+        assert len(cars) == 4
+        assert cars.allocate() == 1
+
+    def test_free_slots_are_not_stepped(self):
+        """Test released and unused slots stay put even with stale inputs."""
+        from game.core.batch_physics import BatchPhysics, CarBatch
+
+        cars = CarBatch(capacity=4)
+        live = cars.allocate()
+        gone = cars.allocate()
+        cars.release(gone)
+        cars.throttle[:] = 1.0  # Stale inputs in free rows too
+        cars.position[gone] = (5.0, 3.0, 5.0)
+
+        physics = BatchPhysics()
+        for _ in range(10):
+            physics.step(cars, 1 / 60)
+
+        assert cars.position[live, 2] > 0
+        assert cars.position[gone].tolist() == [5.0, 3.0, 5.0]
+        assert not cars.velocity[gone:].any()
+
+    def test_matches_headless_physics(self):
+        """Test a batch step matches stepping each car on its own."""
+        from game.core.batch_physics import BatchPhysics, CarBatch
+        from game.core.simulation import CarInput, CarState, HeadlessPhysics
+
+        dt = 1 / 60
+        inputs = [
+            CarInput(throttle=1.0),
+            CarInput(throttle=1.0, steer=1.0, boost=True),
+            CarInput(throttle=1.0, steer=-0.5, handbrake=True),
+            CarInput(throttle=-1.0, brake=True),
+            CarInput(),
+        ]
+
+        cars = CarBatch(capacity=len(inputs))
+        physics = BatchPhysics()
+        headless = HeadlessPhysics()
+        states = []
+
+        for i in range(len(inputs)):
+            cars.allocate(position=(i * 10.0, 1.0, 0.0), yaw=i * 30.0)
+            states.append(CarState(position=[i * 10.0, 1.0, 0.0], yaw=i * 30.0))
+
+        for _ in range(120):
+            for slot, car_input in enumerate(inputs):
+                cars.set_car_input(slot, car_input)
+                headless.step(states[slot], car_input, dt)
+            physics.step(cars, dt)
+
+        for slot, state in enumerate(states):
+            assert abs(cars.yaw[slot] - state.yaw) < 1e-6
+            assert cars.is_drifting[slot] == state.is_drifting
+            for i in range(3):
+                assert abs(cars.position[slot, i] - state.position[i]) < 1e-6
+                assert abs(cars.velocity[slot, i] - state.velocity[i]) < 1e-6
+
+
+class TestDeterministicSimulation:
+    """Test the fixed-point simulation and replays."""
+
+    def inputs(self):
+        """Get one input per car, covering every control."""
+        from game.core.simulation import CarInput
+
+        return [
+            CarInput(throttle=1.0),
+            CarInput(throttle=1.0, steer=1.0, boost=True),
+            CarInput(throttle=1.0, steer=-0.5, handbrake=True),
+            CarInput(throttle=-1.0, brake=True),
+        ]
+
+    def run(self, inputs, ticks=120, replay=None):
+        """Step one car per input from staggered starts."""
+        from game.core.deterministic import DeterministicSimulation, FixedInput
+
+        sim = DeterministicSimulation(seed=7, replay=replay)
+        for slot, car_input in enumerate(inputs):
+            sim.add_car(slot, (slot * 10.0, 1.0, 0.0), slot * 30.0)
+            sim.set_input(slot, FixedInput.from_input(car_input))
+        for _ in range(ticks):
+            sim.step()
+        return sim
+
+    def test_tracks_headless_physics(self):
+        """Test fixed-point results stay close to the float rules."""
+        from game.core.simulation import CarState, HeadlessPhysics
+
+        inputs = self.inputs()
+        sim = self.run(inputs)
+        physics = HeadlessPhysics()
+        for slot, car_input in enumerate(inputs):
+            state = CarState(position=[slot * 10.0, 1.0, 0.0], yaw=slot * 30.0)
+            for _ in range(120):
+                physics.step(state, car_input, 1 / 60)
+
+            fixed = sim.cars[slot].to_car_state()
+            assert fixed.is_drifting == state.is_drifting
+            assert abs(fixed.yaw - state.yaw) < 0.01
+            for i in range(3):
+                assert abs(fixed.position[i] - state.position[i]) < 0.05
+
+    def test_same_inputs_same_hash(self):
+        """Test runs are bit-identical and sensitive to any input change."""
+        from game.core.simulation import CarInput
+
+        first = self.run(self.inputs())
+        second = self.run(self.inputs())
+        changed = self.run(self.inputs()[:-1] + [CarInput(throttle=-1.0)])
+
+        assert first.state_hash() == second.state_hash()
+        assert first.state_hash() != changed.state_hash()
+
+    def test_replay_round_trip_and_desync(self, tmp_path):
+        """Test a saved replay re-simulates to the recorded hashes."""
+        from game.core.deterministic import FixedInput, Replay
+        from game.core.simulation import CarInput
+
+        replay = Replay(seed=7, hash_interval=30)
+        sim = self.run(self.inputs(), ticks=60, replay=replay)
+        sim.set_input(0, FixedInput.from_input(CarInput(steer=1.0)))
+        sim.remove_car(3)
+        for _ in range(60):
+            sim.step()
+        replay.end_tick = sim.tick
+
+        path = tmp_path / "race.replay"
+        replay.save(path)
+        loaded = Replay.load(path)
+        result, divergence = loaded.run()
+
+        assert divergence is None
+        assert sorted(loaded.hashes) == [30, 60, 90, 120]
+        assert result.state_hash() == sim.state_hash()
+
+        # Tampering with one recorded input is caught at the next checkpoint
+        loaded.events[-2][4] //= 2
+        assert loaded.run()[1] == 90
+
+
 class TestCheckpoints:
     """Test checkpoint system."""
 
@@ -108,6 +354,42 @@ class TestCheckpoints:
         assert system.lap_complete is True
 
 
+class TestRaceManager:
+    """Test race flow."""
+
+    def test_server_events_drive_laps_online(self):
+        """Test a connected race follows the server's checkpoint and lap events."""
+        from types import SimpleNamespace
+        from game.core.checkpoints import CheckpointSystem
+        from game.core.race import RaceManager
+
+        system = CheckpointSystem()
+        world = SimpleNamespace(
+            track=SimpleNamespace(checkpoint_system=system),
+            player_car=SimpleNamespace(get_position=lambda: system.checkpoints[0].position),
+        )
+        events = [
+            {"kind": "checkpoint", "player_id": "other", "index": 0},
+            {"kind": "checkpoint", "player_id": "me", "index": 1},
+            {"kind": "lap", "player_id": "other", "lap": 2},
+        ]
+        client = SimpleNamespace(
+            connected=True, player_id="me", take_race_events=lambda: events
+        )
+        race = RaceManager(world, client)
+        race.state = "racing"
+        race.update_racing()
+
+        # Standing in checkpoint 0 does not count; the server's word does
+        assert system.current_checkpoint == 2
+        assert race.current_lap == 1
+
+        events = [{"kind": "lap", "player_id": "me", "lap": race.total_laps + 1}]
+        race.update_racing()
+        assert race.current_lap == race.total_laps + 1
+        assert race.state == "finished"
+
+
 class TestMathUtils:
     """Test math utilities."""
 
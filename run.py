@@ -17,6 +17,9 @@ def main():
     )
     parser.add_argument("--name", type=str, default="Player1", help="Player name")
     parser.add_argument("--offline", action="store_true", help="Run in offline mode")
+    parser.add_argument(
+        "--room", type=str, default="", help="Room to join (default: any open room)"
+    )
 
     args = parser.parse_args()
 
@@ -34,6 +37,7 @@ def main():
         server_host=host,
         server_port=port,
         offline_mode=args.offline,
+        room_id=args.room,
     )
     app.run()
 